@@ -3,17 +3,29 @@ from __future__ import annotations
 import ast
 import logging
 from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable
 
-from skippy_cov.diff_handler import DiffHandler
-from skippy_cov.tests_finder import ASTTestsFinder
-from skippy_cov.utils import CoverageMap, FileTestCandidate, is_test_file
+from skippy_cov.utils import (
+    CoverageMap,
+    FileTestCandidate,
+    collapse_parametrized,
+    filter_collected,
+    is_test_file,
+)
+
+if TYPE_CHECKING:
+    # only needed for annotations, importing them pulls `unidiff` and `coverage`
+    from skippy_cov.diff_handler import DiffHandler
+    from skippy_cov.utils import CoverageLookup
 
 logger = logging.getLogger(__name__)
 
 __version__ = "0.2.2"
 
 
-def discover_tests_in_file(file_path: Path) -> FileTestCandidate | None:
+def discover_tests_in_file(
+    file_path: Path, source: str | None = None
+) -> FileTestCandidate | None:
     """
     Discovers tests within a given Python file using AST parsing.
     Finds top-level functions (sync/async) starting with 'test_' and
@@ -22,6 +34,7 @@ def discover_tests_in_file(file_path: Path) -> FileTestCandidate | None:
 
     Args:
         file_path: The path to the Python file.
+        source: The content of the file, read from `file_path` if not given.
 
     Returns:
         A list of test identifiers in pytest format 'file::[Class::]test_name'.
@@ -35,14 +48,16 @@ def discover_tests_in_file(file_path: Path) -> FileTestCandidate | None:
             "doesn't match test file pattern."
         )
         return None
-    if not file_path.exists() or not file_path.is_file():
+    if source is None and (not file_path.exists() or not file_path.is_file()):
         logger.debug(
             f"Skipping AST discovery: File path '{file_path}' "
             "does not exist or is not a file."
         )
         return None
     try:
-        tree = ast.parse(file_path.read_text(), filename=file_path.name)
+        if source is None:
+            source = file_path.read_text()
+        tree = ast.parse(source, filename=file_path.name)
 
     except Exception as e:
         logger.warning(
@@ -51,6 +66,8 @@ def discover_tests_in_file(file_path: Path) -> FileTestCandidate | None:
         )
         return None
 
+    from skippy_cov.tests_finder import ASTTestsFinder
+
     try:
         finder = ASTTestsFinder(file_path)
         finder.visit(tree)
@@ -71,13 +88,54 @@ def discover_tests_in_file(file_path: Path) -> FileTestCandidate | None:
     return FileTestCandidate(path=file_path, tests=finder.tests)
 
 
+def get_covering_tests(
+    diff_handler: DiffHandler,
+    coverage_map: CoverageLookup,
+    file_path: Path,
+    arcs: bool = False,
+) -> list[FileTestCandidate]:
+    """
+    The tests covering a changed file. With `arcs`, only the ones that ran the
+    changed lines, if the coverage has branch data (see `CoverageMap.get_arc_tests`).
+
+    Renamed files are looked up by their original path, and the line numbers of
+    the diff are already relative to it. Moving a module changes how it's
+    imported, so it selects all of its tests even with `arcs`. Test files moved
+    by the diff are returned under their new path.
+    """
+    original_path = diff_handler.original_path(file_path)
+    candidates = None
+    if arcs and original_path == file_path and isinstance(coverage_map, CoverageMap):
+        candidates = coverage_map.get_arc_tests(
+            file_path, diff_handler.source_changes(file_path)
+        )
+        if candidates is None:
+            logger.debug("The coverage has no arcs, selecting by file instead")
+    if candidates is None:
+        candidates = coverage_map.get_tests(original_path)
+    for candidate in candidates:
+        candidate.path = diff_handler.new_path(candidate.path)
+    return candidates
+
+
 def select_tests_to_run(
     diff_handler: DiffHandler,
-    coverage_map: CoverageMap,
+    coverage_map: CoverageLookup,
+    arcs: bool = False,
+    discover: Callable[[Path], FileTestCandidate | None] = discover_tests_in_file,
 ) -> list[FileTestCandidate]:
     """
     Determines the set of tests to run based on changed files and coverage.
+
+    With `arcs`, source files select the tests that ran their changed lines
+    instead of all the tests that ran the file.
+
+    `discover` finds the tests of a changed test file, `Selector` replaces it
+    with a cached version.
     """
+    from skippy_cov.compact_map import CompactMap
+    from skippy_cov.dependencies import select_dependency_tests
+
     tests_to_run: list[FileTestCandidate] = []
 
     logger.debug(f"Processing {len(diff_handler.changed_files)} changed file(s)...")
@@ -85,7 +143,8 @@ def select_tests_to_run(
 
     for file_path in diff_handler.changed_files:
         # 1. If the changed file is a source file with known coverage
-        if candidates := coverage_map.get_tests(file_path):
+        candidates = get_covering_tests(diff_handler, coverage_map, file_path, arcs)
+        if candidates := filter_collected(candidates):
             for candidate in candidates:
                 logger.debug(
                     f"Source file '{candidate.path}' changed. Adding {len(candidate.tests)}"
@@ -97,7 +156,7 @@ def select_tests_to_run(
         # Use the discovery function, which internally checks if it's a test file
         # This handles added/modified test files.
         # If a test file is changed, all tests in it will be run
-        tests_in_file = discover_tests_in_file(file_path)
+        tests_in_file = discover(file_path)
         if tests_in_file:
             logger.debug(
                 f"Test file '{file_path}' changed or contains tests."
@@ -118,4 +177,20 @@ def select_tests_to_run(
                 " No direct tests added for it.",
             )
 
+    # 4. If a dependency file changed, the tests using the changed distributions
+    tests_to_run.extend(select_dependency_tests(diff_handler, coverage_map))
+
+    # 5. Parametrized tests run only the affected cases, unless all of them are
+    if isinstance(coverage_map, (CoverageMap, CompactMap)):
+        collapse_parametrized(tests_to_run, coverage_map.node_ids())
+
     return tests_to_run
+
+
+def __getattr__(name: str) -> Any:
+    # `Selector` pulls `unidiff` and `coverage`, it's only imported when used
+    if name == "Selector":
+        from skippy_cov.selector import Selector
+
+        return Selector
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")  # noqa: TRY003
@@ -1,19 +1,46 @@
 from __future__ import annotations
 
 import argparse
+import importlib
 import json
 import logging
 import subprocess
 import sys
 from enum import Enum
 from pathlib import Path
+from typing import TYPE_CHECKING, TextIO
 
 from skippy_cov import __version__, select_tests_to_run
 from skippy_cov.diff_handler import DiffHandler
-from skippy_cov.utils import CoverageMap, filter_by_path
+from skippy_cov.server import DEFAULT_SOCKET, query_server
+from skippy_cov.utils import (
+    FileTestCandidate,
+    filter_by_path,
+    is_test_file,
+    load_coverage_map,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from skippy_cov.canary import CanarySampler
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_COVERAGE_FILE = Path(".coverage")
+
+# sub-commands, as `skippy-cov <command> ...`, mapped to the module implementing them
+COMMANDS = {
+    "analyze": "skippy_cov.analyze",
+    "audit": "skippy_cov.audit",
+    "fingerprint": "skippy_cov.fingerprints",
+    "select-range": "skippy_cov.batch",
+    "serve": "skippy_cov.server",
+    "stale": "skippy_cov.rotation",
+    "store": "skippy_cov.store",
+    "watch": "skippy_cov.watcher",
+}
+
 
 class Format(Enum):
     pytest = "pytest"
@@ -40,13 +67,166 @@ def run(
     keep_prefix: bool,
     fmt: Format = Format.pytest,
     display: bool = False,
+    socket_path: Path | None = None,
+    output_file: Path | None = None,
+    manifest: Path | None = None,
+    check_fingerprints: bool = False,
+    validate: bool = False,
+    arcs: bool = False,
+    canary: CanarySampler | None = None,
+    path_prefixes: list[str] | None = None,
+    env: str | None = None,
 ) -> set[str]:
     """
-    Run the test filter. If `display` = True will also print the output to stdout
+    Run the test filter. If `display` = True will also print the output to stdout,
+    if `output_file` is given the output is written there instead
+
+    See `select_tests` for the rest of the arguments.
+    """
+    selected_tests = select_tests(
+        diff,
+        coverage_file,
+        socket_path,
+        manifest,
+        check_fingerprints,
+        arcs,
+        canary,
+        path_prefixes,
+        env,
+    )
+    return process_selection(
+        selected_tests, relative_to, keep_prefix, fmt, display, output_file, validate
+    )
+
+
+def select_tests(
+    diff: str,
+    coverage_file: Path,
+    socket_path: Path | None = None,
+    manifest: Path | None = None,
+    check_fingerprints: bool = False,
+    arcs: bool = False,
+    canary: CanarySampler | None = None,
+    path_prefixes: list[str] | None = None,
+    env: str | None = None,
+) -> list[FileTestCandidate]:
+    """
+    If `socket_path` points to a running `skippy-cov serve` daemon the selection
+    is delegated to it, otherwise the coverage map is loaded from `coverage_file`.
+    With a `manifest`, each changed file is looked up in the coverage file of its
+    package instead.
+
+    With `check_fingerprints`, files that changed since the coverage was collected
+    are handled as if they were part of the diff.
+
+    With `arcs`, the branch coverage data narrows the selection to the tests
+    that ran the changed lines (see `select_tests_to_run`).
+
+    With a `canary` sampler, a sample of the tests left out is added to the
+    selection (see `CanarySampler`).
+
+    `path_prefixes` are removed from the paths recorded in a coverage.py database
+    collected on another machine, and with an `env` only the coverage of that
+    environment is used (see `CoverageMap`).
     """
+    if manifest:
+        from skippy_cov.fingerprints import get_index_fingerprints
+        from skippy_cov.manifest import CoverageManifest, SelectionOptions
+
+        if canary:
+            logger.warning("Canary sampling isn't supported with a coverage manifest")
+        options = SelectionOptions(
+            arcs=arcs,
+            path_prefixes=tuple(path_prefixes or ()),
+            env=env,
+            current_fingerprints=get_index_fingerprints()
+            if check_fingerprints
+            else None,
+        )
+        return CoverageManifest(manifest).select_tests(
+            DiffHandler(diff), options=options
+        )
+
+    if socket_path and not (
+        check_fingerprints or arcs or canary or path_prefixes or env
+    ):
+        selected_tests = query_server(socket_path, diff, coverage_file)
+        if selected_tests is not None:
+            return selected_tests
+
     diff_handler = DiffHandler(diff)
-    coverage_map = CoverageMap(coverage_file)
-    selected_tests = select_tests_to_run(diff_handler, coverage_map)
+    coverage_map = load_coverage_map(coverage_file, path_prefixes or (), env)
+    selected_tests = select_tests_to_run(diff_handler, coverage_map, arcs)
+    if check_fingerprints:
+        from skippy_cov.fingerprints import select_stale_tests
+
+        selected_tests += select_stale_tests(
+            coverage_file, coverage_map, diff_handler.changed_files
+        )
+    if canary:
+        selected_tests += canary.sample(
+            coverage_map, diff_handler.changed_files, selected_tests
+        )
+    return selected_tests
+
+
+def run_pipelined(
+    diff_arg: str | None,
+    coverage_file: Path,
+    relative_to: list[Path] | None,
+    keep_prefix: bool,
+    fmt: Format = Format.pytest,
+    display: bool = False,
+    output_file: Path | None = None,
+    validate: bool = False,
+    arcs: bool = False,
+    path_prefixes: list[str] | None = None,
+    env: str | None = None,
+    check_fingerprints: bool = False,
+) -> set[str]:
+    """
+    Same as `run`, but overlapping the git diff, the coverage map loading and the
+    per-file selection instead of running them one after the other.
+    `diff_arg` takes the same values as in `get_diff_content`.
+    """
+    from skippy_cov.pipeline import PipelineError, select_tests_pipelined
+
+    try:
+        selected_tests = select_tests_pipelined(
+            diff_arg,
+            coverage_file,
+            arcs=arcs,
+            path_prefixes=path_prefixes or (),
+            env=env,
+            check_fingerprints=check_fingerprints,
+        )
+    except PipelineError as e:
+        print(f"skippy-cov: {e}", file=sys.stderr)
+        sys.exit(1)
+    return process_selection(
+        selected_tests, relative_to, keep_prefix, fmt, display, output_file, validate
+    )
+
+
+def process_selection(
+    selected_tests: list[FileTestCandidate],
+    relative_to: list[Path] | None,
+    keep_prefix: bool,
+    fmt: Format = Format.pytest,
+    display: bool = False,
+    output_file: Path | None = None,
+    validate: bool = False,
+) -> set[str]:
+    """
+    Filter the selected tests by path and turn them into pytest node ids.
+    If `display` = True will also print the output to stdout.
+
+    With `validate`, tests that no longer exist are dropped (see `NodeIndex`).
+
+    If `output_file` is given the output is written there instead. The pytest
+    format is then written one node id per line, which is what pytest expects in
+    an argument file (`pytest @file`) and avoids hitting the shell's ARG_MAX.
+    """
     tests = sorted(selected_tests)
     if not tests:
         logger.info("No specific tests selected to run based on changes and coverage.")
@@ -57,24 +237,51 @@ def run(
         )
         keep_prefix = True
 
+    if validate:
+        from skippy_cov.node_index import NodeIndex
+
+        selected_tests = NodeIndex().validate(selected_tests)
+
     if relative_to:
         selected_tests = filter_by_path(selected_tests, relative_to, keep_prefix)
 
-    output = set()
-    for test in selected_tests:
-        output |= test.as_set()
-
+    if output_file:
+        with output_file.open("w") as stream:
+            file_fmt = Format.lines if fmt == Format.pytest else fmt
+            return display_tests(selected_tests, file_fmt, stream)
     if display:
-        if fmt == Format.pytest:
-            print(" ".join(output))
-        elif fmt == Format.lines:
-            print("\n".join(output))
-        elif fmt == Format.json:
-            obj = {}
-            for test in selected_tests:
-                obj[test.path.as_posix()] = list(test.tests)
-            print(json.dumps(obj))
+        return display_tests(selected_tests, fmt)
+    return {node_id for test in selected_tests for node_id in test.as_set()}
 
+
+def display_tests(
+    selected_tests: Iterable[FileTestCandidate],
+    fmt: Format,
+    stream: TextIO | None = None,
+) -> set[str]:
+    """
+    Write the selected tests to `stream` (default: stdout) in the requested format,
+    and return their node ids. Node ids are written as each file is processed,
+    instead of joining them in a single string; the JSON object is written whole.
+    """
+    stream = stream or sys.stdout
+    output: set[str] = set()
+    if fmt == Format.json:
+        obj = {}
+        for test in selected_tests:
+            obj[test.path.as_posix()] = list(test.tests)
+            output |= test.as_set()
+        json.dump(obj, stream)
+        stream.write("\n")
+        return output
+    separator = " " if fmt == Format.pytest else "\n"
+    for test in selected_tests:
+        for node_id in sorted(test.as_set() - output):
+            if output:
+                stream.write(separator)
+            stream.write(node_id)
+            output.add(node_id)
+    stream.write("\n")
     return output
 
 
@@ -116,7 +323,7 @@ def get_diff_content(diff_arg: str | None = None) -> str:
     diff_ref = diff_arg if diff_arg else f"{get_default_branch()}...HEAD"
     try:
         diff = subprocess.check_output(
-            ["git", "diff", diff_ref], stderr=subprocess.DEVNULL, text=True
+            ["git", "diff", "-M", diff_ref], stderr=subprocess.DEVNULL, text=True
         )
     except Exception as e:
         print(
@@ -127,7 +334,94 @@ def get_diff_content(diff_arg: str | None = None) -> str:
         return diff
 
 
+def get_untracked_files() -> list[Path]:
+    """
+    Untracked (and not ignored) files, from `git status --porcelain -z`
+    """
+    output = subprocess.check_output(
+        ["git", "status", "--porcelain", "-z", "--untracked-files=all"],
+        stderr=subprocess.DEVNULL,
+        text=True,
+    )
+    untracked = []
+    entries = iter(output.split("\0"))
+    for entry in entries:
+        if entry.startswith("?? "):
+            untracked.append(Path(entry[3:]))
+        elif entry[:1] in ("R", "C"):
+            next(entries, None)  # the original path of a rename or copy
+    return untracked
+
+
+def get_working_tree_diff() -> str:
+    """
+    All the local changes as a single diff: staged and unstaged changes to
+    tracked files (`git diff HEAD`) plus the untracked files.
+
+    Only the untracked files the selection can use are read: test files (all
+    their tests are selected) and dependency files. New source files have no
+    coverage yet, so they're skipped.
+    """
+    from skippy_cov.dependencies import is_dependency_file
+    from skippy_cov.watcher import make_file_diff
+
+    try:
+        diffs = [
+            subprocess.check_output(
+                ["git", "diff", "-M", "HEAD"], stderr=subprocess.DEVNULL, text=True
+            )
+        ]
+        untracked = get_untracked_files()
+    except Exception as e:
+        print(
+            f"skippy-cov: failed to get the working tree changes: {e}", file=sys.stderr
+        )
+        sys.exit(1)
+    for path in untracked:
+        if not (is_test_file(path) or is_dependency_file(path)):
+            continue
+        try:
+            diffs.append(make_file_diff(path, None, path.read_text()) + "\n")
+        except (OSError, UnicodeDecodeError):
+            logger.debug(f"Skipping untracked file '{path}', it can't be read")
+    return "".join(diffs)
+
+
+def resolve_coverage_file(
+    coverage_file: Path | None, coverage_store: str | None, diff_arg: str | None
+) -> tuple[Path, str | None]:
+    """
+    The coverage file to use and what to diff against (see `get_diff_content`).
+    Without a `coverage_file`, the map is taken from `coverage_store` if given
+    (see `store.resolve_coverage`), and the diff starts at its commit unless
+    `diff_arg` is given.
+    """
+    if coverage_file is not None:
+        return coverage_file, diff_arg
+    if not coverage_store:
+        return DEFAULT_COVERAGE_FILE, diff_arg
+    from skippy_cov.store import StoreError, resolve_coverage
+
+    try:
+        map_file, diff_ref = resolve_coverage(coverage_store)
+    except StoreError as e:
+        print(f"skippy-cov: {e}", file=sys.stderr)
+        sys.exit(1)
+    return map_file, diff_ref if diff_arg is None else diff_arg
+
+
 def main(argv=None):
+    """
+    Entry point of `skippy-cov`. The first argument may name a subcommand of
+    `COMMANDS`, which gets the rest of them. Otherwise the tests for the diff are
+    selected and printed: from a map of the coverage store if one is given,
+    pipelined when possible, and with the canary tests written apart if asked.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in COMMANDS:
+        command = importlib.import_module(COMMANDS[argv[0]])
+        return command.main(argv[1:])
+
     parser = argparse.ArgumentParser(
         description="Select pytest tests based on diff and coverage."
     )
@@ -137,12 +431,109 @@ def main(argv=None):
         help="Path to a diff file or a git ref/branch to diff against (default: main branch).",
         default=None,
     )
+    parser.add_argument(
+        "--working-tree",
+        action="store_true",
+        help="Select for the local changes (staged, unstaged and untracked files) "
+        "instead of --diff.",
+        default=False,
+    )
     parser.add_argument(
         "--coverage-file",
         required=False,
-        help="Path to the coverage file (.coverage sqlite database).",
+        help="Path to the coverage file (.coverage sqlite database, the default).",
+        type=Path,
+        default=None,
+    )
+    parser.add_argument(
+        "--coverage-store",
+        required=False,
+        help="Map store (a directory) to take the coverage from when --coverage-file "
+        "isn't given: the map of the nearest ancestor of the merge-base, diffing "
+        "from its commit.",
+        default=None,
+    )
+    parser.add_argument(
+        "--path-prefix",
+        dest="path_prefixes",
+        required=False,
+        help="Prefix to remove from the paths recorded in the coverage file, when it "
+        "was collected somewhere else (e.g. '/builds/*/'). Can be repeated. The "
+        "[paths] aliases of the coverage.py config are applied too.",
+        action="append",
+        default=None,
+    )
+    parser.add_argument(
+        "--env",
+        required=False,
+        help="Only use the coverage recorded in this environment, for coverage files "
+        "combining several ones tagged with a static context (default: all of them).",
+        default=None,
+    )
+    parser.add_argument(
+        "--coverage-manifest",
+        required=False,
+        help="Path to a TOML manifest mapping path prefixes to coverage files, "
+        "for monorepos. Takes precedence over --coverage-file.",
         type=Path,
-        default=Path(".coverage"),
+        default=None,
+    )
+    parser.add_argument(
+        "--check-fingerprints",
+        action="store_true",
+        help="Also select the tests of files that changed since the coverage was collected.",
+        default=False,
+    )
+    parser.add_argument(
+        "--validate",
+        action="store_true",
+        help="Drop the selected tests that no longer exist (renamed or removed "
+        "since the coverage was collected).",
+        default=False,
+    )
+    parser.add_argument(
+        "--arcs",
+        action="store_true",
+        help="Only select the tests that ran the changed lines, according to the "
+        "branch coverage arcs (coverage collected with `branch = true`).",
+        default=False,
+    )
+    parser.add_argument(
+        "--canary",
+        required=False,
+        help="Also run this fraction (e.g. 0.05) of the tests the selection left out, "
+        "a random sample favouring the tests near the changed files.",
+        type=float,
+        default=None,
+    )
+    parser.add_argument(
+        "--canary-max-tests",
+        required=False,
+        help="Maximum number of canary tests.",
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "--canary-max-duration",
+        required=False,
+        help="Maximum recorded duration of the canary tests, in seconds "
+        "(skippy-cov maps only).",
+        type=float,
+        default=None,
+    )
+    parser.add_argument(
+        "--canary-seed",
+        required=False,
+        help="Seed of the canary sample (default: derived from the changed files).",
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "--canary-output",
+        required=False,
+        help="Write the canary tests to this file, one per line.",
+        type=Path,
+        default=None,
     )
     parser.add_argument(
         "--relative-to",
@@ -165,6 +556,26 @@ def main(argv=None):
         action="store_false",
         help="When using --relative-to, determine if the original path should be kept or removed",
     )
+    parser.add_argument(
+        "--socket",
+        required=False,
+        help="Unix socket of a `skippy-cov serve` daemon, used when it's running.",
+        type=Path,
+        default=DEFAULT_SOCKET,
+    )
+    parser.add_argument(
+        "--output",
+        required=False,
+        help="Write the selected tests to this file (one per line) instead of stdout.",
+        type=Path,
+        default=None,
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="Overlap the git diff, the coverage loading and the selection of each changed file.",
+        default=False,
+    )
     parser.add_argument(
         "--debug", action="store_true", help="Enable debug logging.", default=False
     )
@@ -182,10 +593,47 @@ def main(argv=None):
     if args.debug:
         logging.basicConfig(level=logging.DEBUG)
 
-    diff_content = (
-        get_diff_content(args.diff) if args.diff is not None else get_diff_content(None)
+    args.coverage_file, args.diff = resolve_coverage_file(
+        args.coverage_file, args.coverage_store, args.diff
     )
 
+    canary = None
+    if args.canary:
+        from skippy_cov.canary import CanarySampler
+
+        canary = CanarySampler(
+            args.canary,
+            args.canary_max_tests,
+            args.canary_max_duration,
+            args.canary_seed,
+        )
+
+    if args.pipeline and not (args.coverage_manifest or args.working_tree or canary):
+        run_pipelined(
+            args.diff,
+            args.coverage_file,
+            args.relative_to,
+            args.keep_prefix,
+            args.format,
+            display=True,
+            output_file=args.output,
+            validate=args.validate,
+            arcs=args.arcs,
+            path_prefixes=args.path_prefixes,
+            env=args.env,
+            check_fingerprints=args.check_fingerprints,
+        )
+        return
+
+    if args.working_tree:
+        diff_content = get_working_tree_diff()
+    else:
+        diff_content = (
+            get_diff_content(args.diff)
+            if args.diff is not None
+            else get_diff_content(None)
+        )
+
     run(
         diff_content,
         args.coverage_file,
@@ -193,4 +641,17 @@ def main(argv=None):
         args.keep_prefix,
         args.format,
         display=True,
+        socket_path=args.socket,
+        output_file=args.output,
+        manifest=args.coverage_manifest,
+        check_fingerprints=args.check_fingerprints,
+        validate=args.validate,
+        arcs=args.arcs,
+        canary=canary,
+        path_prefixes=args.path_prefixes,
+        env=args.env,
     )
+    if canary and args.canary_output:
+        args.canary_output.write_text(
+            "".join(f"{test}\n" for test in sorted(canary.sampled))
+        )
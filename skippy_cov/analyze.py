@@ -0,0 +1,304 @@
+from __future__ import annotations
+
+import argparse
+import sqlite3
+from pathlib import Path
+
+from skippy_cov.compact_map import CompactMap
+from skippy_cov.utils import _fix_test_name, load_coverage_map
+
+try:
+    import numpy as np
+except ImportError as e:  # pragma: no cover
+    raise ImportError(  # noqa: TRY003
+        "`skippy-cov analyze` needs numpy, install it with `pip install skippy-cov[analyze]`"
+    ) from e
+
+# bits set in every byte value
+POPCOUNT = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.uint8)
+
+# MinHash signatures are split in BANDS of ROWS: tests sharing a whole band are
+# compared. 16 bands of 4 find most pairs above ~0.5 similarity.
+BANDS = 16
+ROWS = 4
+
+
+class CoverageMatrix:
+    """
+    Test by line coverage matrix. Every row is a test and every column a measured
+    line (a function, for skippy-cov maps), bit-packed so a row of 100k lines
+    takes 12.5kB and set operations between tests are vectorized.
+    """
+
+    def __init__(
+        self,
+        tests: list[str],
+        files: list[str],
+        test_ids: np.ndarray,
+        file_ids: np.ndarray,
+        lines: np.ndarray,
+    ):
+        """
+        Args:
+            tests: The test node ids.
+            files: The measured files.
+            test_ids, file_ids, lines: One entry per covered line: the index of
+                the test in `tests`, the index of the file in `files` and the line.
+        """
+        self.tests = tests
+        self.files = files
+        stride = int(lines.max(initial=0)) + 1
+        columns, cols = np.unique(file_ids * stride + lines, return_inverse=True)
+        self.column_file = columns // stride
+        self.column_line = columns % stride
+
+        width = len(columns)
+        entries = np.unique(test_ids * width + cols.reshape(-1))
+        self.rows = entries // width
+        self.cols = entries % width
+        self.bits = np.zeros((len(tests), (width + 7) // 8), dtype=np.uint8)
+        masks = np.left_shift(1, self.cols & 7).astype(np.uint8)
+        np.bitwise_or.at(self.bits, (self.rows, self.cols >> 3), masks)
+        # lines covered by each test, tests covering each line
+        self.sizes = np.bincount(self.rows, minlength=len(tests))
+        self.line_counts = np.bincount(self.cols, minlength=width)
+
+    @classmethod
+    def load(cls, filepath: Path) -> CoverageMatrix:
+        coverage_map = load_coverage_map(filepath)
+        if isinstance(coverage_map, CompactMap):
+            return cls.from_compact_map(coverage_map)
+        return cls.from_coverage_db(filepath)
+
+    @classmethod
+    def from_compact_map(cls, compact_map: CompactMap) -> CoverageMatrix:
+        files = list(compact_map.files)
+        entries = [
+            (test, file_id, first)
+            for file_id, entry in enumerate(compact_map.files.values())
+            for _, first, _, tests in entry["functions"]
+            for test in tests
+        ]
+        test_ids, file_ids, lines = np.array(entries, dtype=np.int64).reshape(-1, 3).T
+        return cls(compact_map.tests, files, test_ids, file_ids, lines)
+
+    @classmethod
+    def from_coverage_db(cls, filepath: Path) -> CoverageMatrix:
+        """
+        Reads the coverage.py database directly: going through `CoverageData` means
+        a query and a python set per file and context, too slow for large suites.
+        """
+        with sqlite3.connect(f"file:{filepath}?mode=ro", uri=True) as connection:
+            files = dict(connection.execute("SELECT id, path FROM file"))
+            contexts = dict(connection.execute("SELECT id, context FROM context"))
+            records = connection.execute(
+                "SELECT context_id, file_id, numbits FROM line_bits"
+            ).fetchall()
+            if records:
+                context_ids, file_ids, lines = _unpack_numbits(records)
+            else:
+                # branch coverage only stores arcs, their ends are the lines
+                arcs = connection.execute(
+                    "SELECT context_id, file_id, fromno FROM arc WHERE fromno > 0 "
+                    "UNION SELECT context_id, file_id, tono FROM arc WHERE tono > 0"
+                ).fetchall()
+                context_ids, file_ids, lines = (
+                    np.array(arcs, dtype=np.int64).reshape(-1, 3).T
+                )
+
+        # every phase (setup, call, teardown) of a test is a different context
+        tests: dict[str, int] = {}
+        context_tests = np.full(max(contexts, default=0) + 1, -1, dtype=np.int64)
+        for context_id, context in contexts.items():
+            if "::" in context:
+                test_file, test = _fix_test_name(context)
+                node_id = f"{test_file}::{test}"
+                context_tests[context_id] = tests.setdefault(node_id, len(tests))
+
+        file_index = {file_id: index for index, file_id in enumerate(files)}
+        file_lookup = np.zeros(max(files, default=0) + 1, dtype=np.int64)
+        file_lookup[list(file_index)] = list(file_index.values())
+
+        test_ids = context_tests[context_ids]
+        measured = test_ids >= 0
+        return cls(
+            list(tests),
+            list(files.values()),
+            test_ids[measured],
+            file_lookup[file_ids[measured]],
+            lines[measured],
+        )
+
+    def column_label(self, column: int) -> str:
+        return f"{self.files[self.column_file[column]]}:{self.column_line[column]}"
+
+    def _overlap(self, test: int, others: np.ndarray) -> np.ndarray:
+        """
+        Number of lines covered by both `test` and each of `others`
+        """
+        return POPCOUNT[self.bits[others] & self.bits[test]].sum(axis=1, dtype=np.int64)
+
+    def strict_subsets(self) -> list[tuple[int, int]]:
+        """
+        (test, superset) pairs where the lines covered by `test` are a strict subset
+        of the ones covered by `superset`, the smallest one if there are several.
+
+        A superset has to cover the least covered line of the test, so only the
+        tests covering it are compared.
+        """
+        by_rarity = np.lexsort((self.line_counts[self.cols], self.rows))
+        first = np.ones(len(by_rarity), dtype=bool)
+        first[1:] = self.rows[by_rarity][1:] != self.rows[by_rarity][:-1]
+        rarest = dict(
+            zip(
+                self.rows[by_rarity][first].tolist(),
+                self.cols[by_rarity][first].tolist(),
+            )
+        )
+
+        by_column = np.argsort(self.cols, kind="stable")
+        column_tests = self.rows[by_column]
+        column_starts = np.searchsorted(
+            self.cols[by_column], np.arange(len(self.line_counts) + 1)
+        )
+
+        subsets = []
+        for test, column in rarest.items():
+            candidates = column_tests[column_starts[column] : column_starts[column + 1]]
+            candidates = candidates[self.sizes[candidates] > self.sizes[test]]
+            if not candidates.size:
+                continue
+            supersets = candidates[self._overlap(test, candidates) == self.sizes[test]]
+            if supersets.size:
+                smallest = supersets[np.argmin(self.sizes[supersets])]
+                subsets.append((test, int(smallest)))
+        return subsets
+
+    def near_duplicates(self, threshold: float, seed: int = 0) -> list[list[int]]:
+        """
+        Clusters of tests whose Jaccard similarity (shared lines / lines covered by
+        either) is at least `threshold`, largest clusters first.
+
+        Candidates are found with MinHash locality sensitive hashing instead of
+        comparing every pair of tests, then checked against the exact similarity.
+        """
+        active = np.flatnonzero(self.sizes)
+        if not active.size:
+            return []
+        order = np.argsort(self.rows, kind="stable")
+        cols = self.cols[order]
+        starts = np.searchsorted(self.rows[order], active)
+
+        rng = np.random.default_rng(seed)
+        signatures = np.empty((len(active), BANDS * ROWS), dtype=np.int64)
+        for k in range(BANDS * ROWS):
+            permutation = rng.permutation(len(self.line_counts))
+            signatures[:, k] = np.minimum.reduceat(permutation[cols], starts)
+
+        parents = list(range(len(self.tests)))
+
+        def find(test: int) -> int:
+            while parents[test] != test:
+                parents[test] = parents[parents[test]]
+                test = parents[test]
+            return test
+
+        for band in range(BANDS):
+            band_signatures = signatures[:, band * ROWS : (band + 1) * ROWS]
+            _, buckets = np.unique(band_signatures, axis=0, return_inverse=True)
+            buckets = buckets.reshape(-1)
+            by_bucket = np.argsort(buckets, kind="stable")
+            boundaries = np.flatnonzero(np.diff(buckets[by_bucket])) + 1
+            for members in np.split(active[by_bucket], boundaries):
+                if len(members) < 2:
+                    continue
+                test, others = int(members[0]), members[1:]
+                shared = self._overlap(test, others)
+                similarity = shared / (self.sizes[test] + self.sizes[others] - shared)
+                for other in others[similarity >= threshold].tolist():
+                    parents[find(other)] = find(test)
+
+        clusters: dict[int, list[int]] = {}
+        for test in active.tolist():
+            clusters.setdefault(find(test), []).append(test)
+        return sorted(
+            (cluster for cluster in clusters.values() if len(cluster) > 1),
+            key=len,
+            reverse=True,
+        )
+
+    def hot_lines(self, limit: int) -> list[tuple[int, int]]:
+        """
+        (column, number of tests) of the `limit` lines covered by the most tests
+        """
+        columns = np.argsort(-self.line_counts, kind="stable")[:limit]
+        return [
+            (int(column), int(self.line_counts[column]))
+            for column in columns
+            if self.line_counts[column]
+        ]
+
+
+def _unpack_numbits(
+    records: list[tuple[int, int, bytes]],
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Unpacks the `line_bits` rows of a coverage.py database in one go, see
+    `coverage.numbits`: bit `i` of byte `j` is set if line `j * 8 + i` ran.
+    """
+    blobs = [numbits for *_, numbits in records]
+    ids = np.array([record[:2] for record in records], dtype=np.int64)
+    lengths = np.array([len(blob) for blob in blobs], dtype=np.int64)
+    bits = np.unpackbits(
+        np.frombuffer(b"".join(blobs), dtype=np.uint8), bitorder="little"
+    )
+    positions = np.flatnonzero(bits)
+    starts = (np.cumsum(lengths) - lengths) * 8
+    record = np.searchsorted(starts, positions, side="right") - 1
+    return ids[record, 0], ids[record, 1], positions - starts[record]
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="skippy-cov analyze",
+        description="Find redundant tests, near-duplicates and lines covered by "
+        "most of the suite.",
+    )
+    parser.add_argument(
+        "--coverage-file",
+        required=False,
+        help="Path to the coverage file (.coverage sqlite database or skippy-cov map).",
+        type=Path,
+        default=Path(".coverage"),
+    )
+    parser.add_argument(
+        "--similarity",
+        required=False,
+        help="Minimum Jaccard similarity of the coverage of near-duplicate tests.",
+        type=float,
+        default=0.9,
+    )
+    parser.add_argument(
+        "--hot-lines",
+        required=False,
+        help="How many of the lines covered by the most tests to report.",
+        type=int,
+        default=20,
+    )
+    args = parser.parse_args(argv)
+
+    matrix = CoverageMatrix.load(args.coverage_file)
+    tests = matrix.tests
+    print(f"{len(tests)} tests, {len(matrix.line_counts)} lines")
+
+    print("\nTests covering a strict subset of another test:")
+    for test, superset in matrix.strict_subsets():
+        print(f"{tests[test]}\t{tests[superset]}")
+
+    print(f"\nNear-duplicate tests (similarity >= {args.similarity}):")
+    for cluster in matrix.near_duplicates(args.similarity):
+        print("\t".join(tests[test] for test in cluster))
+
+    print("\nHot lines:")
+    for column, count in matrix.hot_lines(args.hot_lines):
+        print(f"{matrix.column_label(column)}\t{count} tests")
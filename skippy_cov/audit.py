@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from skippy_cov import select_tests_to_run
+from skippy_cov.__main__ import get_diff_content
+from skippy_cov.canary import covered_files
+from skippy_cov.compact_map import CompactMap
+from skippy_cov.dependencies import is_dependency_file
+from skippy_cov.diff_handler import DiffHandler
+from skippy_cov.fingerprints import select_stale_tests
+from skippy_cov.utils import (
+    CoverageLookup,
+    FileTestCandidate,
+    get_collection_scope,
+    load_coverage_map,
+)
+
+# why a failing test wasn't selected, from the most to the least specific
+NOT_IN_MAP = "not in map"
+NOT_ON_CHANGED_LINES = "not on the changed lines"
+UNTRACKED_FILE_TYPE = "untracked file type"
+UNEXPLAINED = "unexplained"
+
+
+def _junit_node_id(classname: str, name: str) -> str:
+    """
+    pytest node id of a junit test case. The `classname` is the dotted path of
+    the test file followed by the test classes, the file is the longest existing
+    prefix (or the prefix before the test classes, if it doesn't exist anymore).
+    """
+    parts = classname.split(".")
+    for index in range(len(parts), 0, -1):
+        if Path(*parts[:index]).with_suffix(".py").exists():
+            break
+    else:
+        is_test_class = get_collection_scope().is_test_class
+        index = len(parts)
+        while index > 1 and is_test_class(parts[index - 1]):
+            index -= 1
+    path = Path(*parts[:index]).with_suffix(".py").as_posix()
+    return "::".join([path, *parts[index:], name])
+
+
+def read_failures(report: Path) -> set[str]:
+    """
+    Node ids of the tests that failed, from a junit XML report (`--junitxml`) or
+    pytest's `lastfailed` cache (`.pytest_cache/v/cache/lastfailed`)
+    """
+    content = report.read_text()
+    if content.lstrip().startswith("{"):
+        return set(json.loads(content))
+    failures = set()
+    root = ET.fromstring(content)  # noqa: S314 the report of our own test run
+    for testcase in root.iter("testcase"):
+        if testcase.find("failure") is not None or testcase.find("error") is not None:
+            failures.add(
+                _junit_node_id(testcase.get("classname", ""), testcase.get("name", ""))
+            )
+    return failures
+
+
+def _without_parameters(node_id: str) -> str:
+    """
+    >>> _without_parameters("tests/test_a.py::test_x[1-2]")
+    'tests/test_a.py::test_x'
+    """
+    return node_id.split("[", 1)[0]
+
+
+def _node_ids(candidates: list[FileTestCandidate]) -> set[str]:
+    return {node_id for candidate in candidates for node_id in candidate.as_set()}
+
+
+def untracked_files(
+    diff_handler: DiffHandler, coverage_map: CoverageLookup
+) -> set[Path]:
+    """
+    Changed files the selection has no information about: not Python, and neither
+    in the map (as a data file) nor a dependency file the map can attribute
+    """
+    return {
+        file_path
+        for file_path in diff_handler.changed_files
+        if file_path.suffix != ".py"
+        and not coverage_map.get_tests(file_path)
+        and not (is_dependency_file(file_path) and isinstance(coverage_map, CompactMap))
+    }
+
+
+def audit(
+    diff_handler: DiffHandler,
+    coverage_file: Path,
+    failures: set[str],
+    arcs: bool = False,
+    check_fingerprints: bool = False,
+) -> tuple[set[str], dict[str, str]]:
+    """
+    The node ids skippy-cov would have selected, and the failing tests it would
+    have missed with the reason why
+    """
+    coverage_map = load_coverage_map(coverage_file)
+    selected_tests = select_tests_to_run(diff_handler, coverage_map, arcs)
+
+    if check_fingerprints:
+        selected_tests += select_stale_tests(
+            coverage_file, coverage_map, diff_handler.changed_files
+        )
+    selected = _node_ids(selected_tests)
+
+    known = covered_files(coverage_map)
+    changed_lines_tests = set()
+    if arcs:
+        for file_path in diff_handler.changed_files:
+            changed_lines_tests |= _node_ids(coverage_map.get_tests(file_path))
+    untracked = untracked_files(diff_handler, coverage_map)
+
+    escaped = {}
+    for failure in sorted(failures):
+        # tests found by parsing the test files come without their parameters
+        ids = {failure, _without_parameters(failure)}
+        if ids & selected:
+            continue
+        if not ids & known.keys():
+            escaped[failure] = NOT_IN_MAP
+        elif ids & changed_lines_tests:
+            escaped[failure] = NOT_ON_CHANGED_LINES
+        elif untracked:
+            escaped[failure] = UNTRACKED_FILE_TYPE
+        else:
+            escaped[failure] = UNEXPLAINED
+    return selected, escaped
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="skippy-cov audit",
+        description="Compare the selection with the failures of a full test run, "
+        "reporting the failing tests it would have missed and why. Run it from a "
+        "checkout of the commit the tests ran on.",
+    )
+    parser.add_argument(
+        "report",
+        help="junit XML report (pytest --junitxml) or pytest's lastfailed cache.",
+        type=Path,
+    )
+    parser.add_argument(
+        "--diff",
+        required=False,
+        help="Path to a diff file or a git ref/branch to diff against (default: main branch).",
+        default=None,
+    )
+    parser.add_argument(
+        "--coverage-file",
+        required=False,
+        help="Path to the coverage file (.coverage sqlite database or skippy-cov map).",
+        type=Path,
+        default=Path(".coverage"),
+    )
+    parser.add_argument(
+        "--arcs",
+        action="store_true",
+        help="Audit the selection made with --arcs.",
+        default=False,
+    )
+    parser.add_argument(
+        "--check-fingerprints",
+        action="store_true",
+        help="Audit the selection made with --check-fingerprints.",
+        default=False,
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Write the result as JSON.",
+        default=False,
+    )
+    args = parser.parse_args(argv)
+
+    failures = read_failures(args.report)
+    diff_handler = DiffHandler(get_diff_content(args.diff))
+    selected, escaped = audit(
+        diff_handler,
+        args.coverage_file,
+        failures,
+        args.arcs,
+        args.check_fingerprints,
+    )
+    if args.json:
+        result = {
+            "failed": len(failures),
+            "selected": len(selected),
+            "missed": [
+                {"test": test, "reason": reason} for test, reason in escaped.items()
+            ],
+        }
+        json.dump(result, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+        return
+    print(
+        f"{len(failures)} failed tests, {len(selected)} selected tests, "
+        f"{len(escaped)} failures missed"
+    )
+    for test, reason in escaped.items():
+        print(f"{test}\t{reason}")
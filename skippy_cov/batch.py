@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import argparse
+import functools
+import json
+import subprocess
+import sys
+from collections.abc import Iterator
+from pathlib import Path
+
+from skippy_cov import discover_tests_in_file, select_tests_to_run
+from skippy_cov.__main__ import process_selection
+from skippy_cov.diff_handler import DiffHandler
+from skippy_cov.utils import (
+    CoverageLookup,
+    FileTestCandidate,
+    is_test_file,
+    load_coverage_map,
+)
+
+# starts the output of every commit in `git log`, can't be confused with a diff line
+COMMIT_MARKER = "skippy-cov-commit "
+
+
+class BatchError(Exception):
+    pass
+
+
+def iter_commit_diffs(revision_range: str) -> Iterator[tuple[str, str]]:
+    """
+    (commit sha, diff) for every commit in `revision_range`, oldest first, read from
+    a single `git log -p` stream. Merge commits come with an empty diff.
+    """
+    with subprocess.Popen(
+        [
+            "git",
+            "log",
+            "-p",
+            "-M",
+            "--reverse",
+            "--no-color",
+            f"--format={COMMIT_MARKER}%H",
+            revision_range,
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+    ) as process:
+        commit = None
+        lines: list[str] = []
+        for line in process.stdout or []:
+            if line.startswith(COMMIT_MARKER):
+                if commit:
+                    yield commit, "".join(lines)
+                commit = line[len(COMMIT_MARKER) :].strip()
+                lines = []
+            else:
+                lines.append(line)
+        if commit:
+            yield commit, "".join(lines)
+    if process.returncode:
+        raise BatchError(  # noqa: TRY003
+            f"failed to get git log for '{revision_range}': "
+            f"exit status {process.returncode}"
+        )
+
+
+def discover_tests_at_commit(commit: str, file_path: Path) -> FileTestCandidate | None:
+    """
+    Same as `discover_tests_in_file`, for the file as of `commit` instead of the
+    working tree
+    """
+    if not is_test_file(file_path):
+        return None
+    result = subprocess.run(
+        ["git", "show", f"{commit}:{file_path.as_posix()}"],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode:  # deleted by the commit
+        return None
+    return discover_tests_in_file(file_path, result.stdout)
+
+
+def select_range(
+    revision_range: str, coverage_map: CoverageLookup
+) -> Iterator[tuple[str, list[FileTestCandidate]]]:
+    """
+    The tests to run for every commit in `revision_range`, with the coverage map
+    loaded only once for all of them. The changed test files are read as of each
+    commit, not from the working tree.
+    """
+    for commit, diff in iter_commit_diffs(revision_range):
+        discover = functools.partial(discover_tests_at_commit, commit)
+        yield (
+            commit,
+            select_tests_to_run(DiffHandler(diff), coverage_map, discover=discover),
+        )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="skippy-cov select-range",
+        description="Select the tests to run for every commit of a range, as JSON.",
+    )
+    parser.add_argument(
+        "revision_range",
+        help="Commits to select tests for, in `git log` syntax (e.g. main..HEAD).",
+    )
+    parser.add_argument(
+        "--coverage-file",
+        required=False,
+        help="Path to the coverage file (.coverage sqlite database).",
+        type=Path,
+        default=Path(".coverage"),
+    )
+    parser.add_argument(
+        "--relative-to",
+        required=False,
+        help="Display only tests contained in a folder",
+        type=Path,
+        nargs="+",
+        default=None,
+    )
+    parser.add_argument(
+        "--strip-prefix",
+        dest="keep_prefix",
+        action="store_false",
+        help="When using --relative-to, remove the folder from the tests paths",
+    )
+    args = parser.parse_args(argv)
+
+    coverage_map = load_coverage_map(args.coverage_file)
+    commits = []
+    cumulative: set[str] = set()
+    try:
+        for commit, selected_tests in select_range(args.revision_range, coverage_map):
+            tests = process_selection(selected_tests, args.relative_to, args.keep_prefix)
+            commits.append({"commit": commit, "tests": sorted(tests)})
+            cumulative |= tests
+    except BatchError as e:
+        print(f"skippy-cov: {e}", file=sys.stderr)
+        sys.exit(1)
+    json.dump({"commits": commits, "tests": sorted(cumulative)}, sys.stdout, indent=2)
+    sys.stdout.write("\n")
@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import logging
+import math
+import os
+import sqlite3
+import zlib
+from collections import defaultdict
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from skippy_cov.compact_map import CompactMap, split_node_id
+from skippy_cov.utils import (
+    CoverageLookup,
+    CoverageMap,
+    FileTestCandidate,
+    _fix_test_name,
+    split_parameters,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+logger = logging.getLogger(__name__)
+
+
+def covered_files(coverage_map: CoverageLookup) -> dict[str, set[str]]:
+    """
+    The files covered by every test of the map, by node id
+    """
+    files: defaultdict[str, set[str]] = defaultdict(set)
+    if isinstance(coverage_map, CompactMap):
+        tests_by_path = [
+            *(
+                (path, indexes)
+                for path, entry in coverage_map.files.items()
+                for *_, indexes in entry["functions"]
+            ),
+            # only used for the files no test executed a function of
+            *(
+                (path, indexes)
+                for path, indexes in coverage_map.imports.items()
+                if path not in coverage_map.files
+            ),
+            *coverage_map.data_files.items(),
+        ]
+        for path, indexes in tests_by_path:
+            for index in indexes:
+                files[coverage_map.tests[index]].add(path)
+    elif isinstance(coverage_map, CoverageMap):
+        uri = f"file:{coverage_map.filepath}?mode=ro"
+        with sqlite3.connect(uri, uri=True) as connection:
+            rows = connection.execute(
+                "SELECT DISTINCT context.context, file.path FROM line_bits "
+                "JOIN file ON file.id = line_bits.file_id "
+                "JOIN context ON context.id = line_bits.context_id "
+                "UNION SELECT DISTINCT context.context, file.path FROM arc "
+                "JOIN file ON file.id = arc.file_id "
+                "JOIN context ON context.id = arc.context_id"
+            ).fetchall()
+        for context, path in rows:
+            if "::" in context and coverage_map.in_env(context):
+                src, test = _fix_test_name(context)
+                files[f"{src}::{test}"].add(coverage_map.canonical_paths.get(path, path))
+    return files
+
+
+def recorded_durations(coverage_map: CoverageLookup) -> dict[str, float]:
+    """
+    How long each test took when it was collected, if known (skippy-cov maps only)
+    """
+    if not isinstance(coverage_map, CompactMap):
+        return {}
+    return {
+        test: collected[2]
+        for test, collected in zip(coverage_map.tests, coverage_map.collected)
+        if len(collected) > 2 and collected[2] is not None
+    }
+
+
+def proximity(path: str, changed_dirs: Iterable[tuple[str, ...]]) -> int:
+    """
+    Number of leading directories `path` shares with the closest changed file
+
+    >>> proximity("src/app/models.py", [("src", "app"), ("docs",)])
+    2
+    """
+    file_path = Path(path)
+    if file_path.is_absolute():  # coverage.py stores absolute paths by default
+        file_path = Path(os.path.relpath(file_path))
+    parts = file_path.parent.parts
+    shared = 0
+    for changed in changed_dirs:
+        common = 0
+        for part, changed_part in zip(parts, changed):
+            if part != changed_part:
+                break
+            common += 1
+        shared = max(shared, common)
+    return shared
+
+
+class CanarySampler:
+    """
+    Adds a random sample of the tests the selection left out, as a safety net for
+    aggressive selection: a failing canary is a test the selection missed, so the
+    miss rate can be estimated at a fraction of the cost of running everything.
+
+    The sample is a weighted random sample without replacement (Efraimidis and
+    Spirakis): each test gets a key `log(u) / weight`, with `u` a uniform number
+    derived from the seed and its node id, and the highest keys are taken. A test
+    weighs `2 ** n`, `n` being the number of leading directories one of the files
+    it covers shares with a changed file, so tests near the change are favoured.
+
+    The sample size is `rate` of the unselected tests, capped by `max_tests` and
+    by `max_duration` seconds of recorded test durations.
+
+    Without an explicit `seed`, it's derived from the changed files: the same
+    change always gets the same sample, and different changes sample differently.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        max_tests: int | None = None,
+        max_duration: float | None = None,
+        seed: int | None = None,
+    ):
+        self.rate = rate
+        self.max_tests = max_tests
+        self.max_duration = max_duration
+        self.seed = seed
+        self.sampled: set[str] = set()
+
+    def _key(self, seed: int, node_id: str, weight: int) -> float:
+        u = (zlib.crc32(f"{seed}:{node_id}".encode()) + 1) / (2**32 + 1)
+        return math.log(u) / weight
+
+    def sample(
+        self,
+        coverage_map: CoverageLookup,
+        changed_files: set[Path],
+        selected_tests: list[FileTestCandidate],
+    ) -> list[FileTestCandidate]:
+        """
+        The canary tests to add to `selected_tests`, also kept in `sampled`
+        """
+        selected = {node_id for test in selected_tests for node_id in test.as_set()}
+        tests = covered_files(coverage_map)
+        # a selected test without parameters runs all of its cases
+        population = sorted(
+            test
+            for test in tests
+            if test not in selected and split_parameters(test)[0] not in selected
+        )
+        size = math.ceil(self.rate * len(population))
+        if self.max_tests is not None:
+            size = min(size, self.max_tests)
+
+        seed = self.seed
+        if seed is None:
+            seed = zlib.crc32(
+                " ".join(sorted(p.as_posix() for p in changed_files)).encode()
+            )
+        changed_dirs = [path.parent.parts for path in changed_files]
+        paths = {path for covered in tests.values() for path in covered}
+        weights = {path: 2 ** proximity(path, changed_dirs) for path in paths}
+        keys = {
+            test: self._key(seed, test, max(weights[path] for path in tests[test]))
+            for test in population
+        }
+
+        durations = recorded_durations(coverage_map)
+        if self.max_duration is not None and not durations:
+            logger.warning(
+                "No test durations recorded, the canary duration cap is ignored"
+            )
+        # tests without a recorded duration are assumed to take the average
+        default_duration = sum(durations.values()) / len(durations) if durations else 0
+        budget = self.max_duration if durations else None
+
+        sampled: list[str] = []
+        for test in sorted(population, key=keys.__getitem__, reverse=True):
+            if len(sampled) >= size:
+                break
+            if budget is not None:
+                duration = durations.get(test, default_duration)
+                if duration > budget:
+                    continue
+                budget -= duration
+            sampled.append(test)
+
+        logger.info(
+            f"{len(sampled)} canary test(s) sampled out of {len(population)} "
+            f"unselected (seed {seed})"
+        )
+        self.sampled = set(sampled)
+        return self.candidates()
+
+    def candidates(self) -> list[FileTestCandidate]:
+        """
+        The `sampled` tests, by file
+        """
+        found_tests: defaultdict[Path, set[str]] = defaultdict(set)
+        for node_id in sorted(self.sampled):
+            src, test = split_node_id(node_id)
+            found_tests[Path(src)].add(test)
+        return [
+            FileTestCandidate(path=path, tests=tests)
+            for (path, tests) in found_tests.items()
+        ]
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import os
+import re
+import shlex
+from fnmatch import translate
+from pathlib import Path
+
+from skippy_cov.config_handler import ConfigHandler
+
+# pytest's defaults
+# SEE: https://docs.pytest.org/en/stable/reference/reference.html#ini-options-ref
+DEFAULT_PYTHON_FILES = ["test_*.py", "*_test.py"]
+DEFAULT_PYTHON_CLASSES = ["Test"]
+DEFAULT_PYTHON_FUNCTIONS = ["test"]
+DEFAULT_NORECURSEDIRS = [
+    "*.egg",
+    ".*",
+    "_darcs",
+    "build",
+    "CVS",
+    "dist",
+    "node_modules",
+    "venv",
+    "{arch}",
+]
+
+
+def _glob_regex(patterns: list[str]) -> re.Pattern[str] | None:
+    """
+    A single regex matching any of the `fnmatch` patterns
+    """
+    if not patterns:
+        return None
+    return re.compile("|".join(translate(pattern) for pattern in patterns))
+
+
+def _is_glob(pattern: str) -> bool:
+    return any(char in pattern for char in "*?[")
+
+
+def _split(value: str | int | list[str] | None, default: list[str]) -> list[str]:
+    """
+    ini values are whitespace separated strings, toml values already are lists
+    """
+    if value is None:
+        return default
+    if isinstance(value, list):
+        return [str(item) for item in value]
+    return str(value).split()
+
+
+class NameMatcher:
+    """
+    pytest's `python_classes`/`python_functions` semantics: every entry is a
+    prefix, or a glob pattern if it contains glob characters.
+    """
+
+    def __init__(self, patterns: list[str]):
+        self.prefixes = tuple(pattern for pattern in patterns if not _is_glob(pattern))
+        self.globs = _glob_regex([pattern for pattern in patterns if _is_glob(pattern)])
+
+    def __call__(self, name: str) -> bool:
+        return name.startswith(self.prefixes) or bool(
+            self.globs and self.globs.match(name)
+        )
+
+
+class CollectionScope:
+    """
+    The test files, classes and functions pytest collects according to its
+    configuration (`python_files`, `python_classes`, `python_functions`,
+    `testpaths`, `norecursedirs` and the `--ignore`/`--ignore-glob` options in
+    `addopts`), compiled once so every check is a few regex matches.
+
+    Paths are checked as given, relative to `base` (the current directory).
+    """
+
+    def __init__(self, config: ConfigHandler | None, base: Path | None = None):
+        base = base or Path.cwd()
+        self.base = base
+        rootdir = base
+        if config and config.handler:
+            rootdir = config.handler.config_path.parent
+
+        def get(key: str, default: list[str]) -> list[str]:
+            return _split(config.get_value(key) if config else None, default)
+
+        def relative(path: str) -> str:
+            return Path(os.path.relpath(rootdir / path, base)).as_posix()
+
+        def below(path: str) -> str:
+            path = relative(path)
+            return "*" if path == "." else f"{path}/*"
+
+        python_files = get("python_files", DEFAULT_PYTHON_FILES)
+        # patterns with a separator match the end of the path, the rest the name
+        self.file_names = _glob_regex([p for p in python_files if "/" not in p])
+        self.file_paths = _glob_regex([
+            glob for p in python_files if "/" in p for glob in (p, f"*/{p}")
+        ])
+        self.is_test_class = NameMatcher(get("python_classes", DEFAULT_PYTHON_CLASSES))
+        self.is_test_function = NameMatcher(
+            get("python_functions", DEFAULT_PYTHON_FUNCTIONS)
+        )
+        self.norecursedirs = _glob_regex(get("norecursedirs", DEFAULT_NORECURSEDIRS))
+        self.testpaths = _glob_regex([below(path) for path in get("testpaths", [])])
+
+        ignore, ignore_glob = _parse_ignore_options(get("addopts", []))
+        self.ignore = tuple(relative(path) for path in ignore)
+        self.ignore_glob = _glob_regex([relative(path) for path in ignore_glob])
+
+    def is_collected(self, file_path: Path) -> bool:
+        """
+        Whether pytest would look for tests in `file_path` when run without
+        arguments, regardless of its name
+        """
+        if file_path.is_absolute():
+            file_path = Path(os.path.relpath(file_path, self.base))
+        path = file_path.as_posix()
+        if self.testpaths and not self.testpaths.match(path):
+            return False
+        if any(
+            path == ignored or path.startswith(f"{ignored}/") for ignored in self.ignore
+        ):
+            return False
+        if self.ignore_glob and self.ignore_glob.match(path):
+            return False
+        return not (
+            self.norecursedirs
+            and any(
+                self.norecursedirs.match(part)
+                for part in file_path.parent.parts
+                if part != ".."
+            )
+        )
+
+    def is_test_file(self, file_path: Path) -> bool:
+        name_matches = bool(self.file_names and self.file_names.match(file_path.name))
+        path_matches = bool(
+            self.file_paths and self.file_paths.match(file_path.as_posix())
+        )
+        return (name_matches or path_matches) and self.is_collected(file_path)
+
+
+def _parse_ignore_options(addopts: list[str]) -> tuple[list[str], list[str]]:
+    """
+    The values of the `--ignore` and `--ignore-glob` options
+    """
+    options: dict[str, list[str]] = {"--ignore": [], "--ignore-glob": []}
+    args = iter(shlex.split(" ".join(addopts)))
+    for arg in args:
+        option, has_value, value = arg.partition("=")
+        if option in options:
+            if not has_value:
+                value = next(args, "")
+            options[option].append(value)
+    return options["--ignore"], options["--ignore-glob"]
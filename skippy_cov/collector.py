@@ -0,0 +1,381 @@
+from __future__ import annotations
+
+import abc
+import dis
+import logging
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Iterable
+from pathlib import Path
+from types import CodeType, FrameType
+from typing import Any, Tuple
+
+import pytest
+
+from skippy_cov.compact_map import CompactMap
+from skippy_cov.dependencies import normalize_name, package_distributions
+from skippy_cov.fingerprints import fingerprint_files, get_commit
+from skippy_cov.rotation import in_slice
+
+logger = logging.getLogger(__name__)
+
+# (file relative to the rootdir, qualified name, first line, last line)
+FunctionKey = Tuple[str, str, int, int]
+
+SITE_PACKAGES = ("site-packages", "dist-packages")
+# opened by the imports, their changes are already tracked by function
+SOURCE_SUFFIXES = (".py", ".pyc")
+
+
+class CollectorError(Exception):
+    pass
+
+
+class Tracer(abc.ABC):
+    """
+    Records the code objects executed between `start()` and `stop()`.
+    Subclasses only have to report every code object at least once per test.
+    """
+
+    def __init__(self) -> None:
+        self.executed: set[CodeType] = set()
+
+    @abc.abstractmethod
+    def install(self) -> None: ...
+
+    @abc.abstractmethod
+    def uninstall(self) -> None: ...
+
+    def start(self) -> None:
+        self.executed = set()
+
+    def stop(self) -> set[CodeType]:
+        executed, self.executed = self.executed, set()
+        return executed
+
+
+class MonitoringTracer(Tracer):
+    """
+    Uses `sys.monitoring` (python 3.12+): only `PY_START` events are requested and
+    each one is disabled right after its first hit, so a function costs a single
+    callback per test no matter how many times it's called.
+    `restart_events()` re-enables them when the next test starts.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.tool_id: int | None = None
+
+    def install(self) -> None:
+        monitoring = sys.monitoring  # type: ignore[attr-defined]
+        for tool_id in (4, 3):  # not reserved for debuggers, coverage or profilers
+            if monitoring.get_tool(tool_id) is None:
+                self.tool_id = tool_id
+                break
+        else:
+            raise CollectorError("no free sys.monitoring tool id")  # noqa: TRY003
+        monitoring.use_tool_id(self.tool_id, "skippy-cov")
+        monitoring.register_callback(
+            self.tool_id, monitoring.events.PY_START, self._on_start
+        )
+
+    def uninstall(self) -> None:
+        monitoring = sys.monitoring  # type: ignore[attr-defined]
+        monitoring.set_events(self.tool_id, monitoring.events.NO_EVENTS)
+        monitoring.register_callback(self.tool_id, monitoring.events.PY_START, None)
+        monitoring.free_tool_id(self.tool_id)
+
+    def _on_start(self, code: CodeType, instruction_offset: int) -> object:
+        self.executed.add(code)
+        return sys.monitoring.DISABLE  # type: ignore[attr-defined]
+
+    def start(self) -> None:
+        super().start()
+        monitoring = sys.monitoring  # type: ignore[attr-defined]
+        monitoring.restart_events()
+        monitoring.set_events(self.tool_id, monitoring.events.PY_START)
+
+    def stop(self) -> set[CodeType]:
+        monitoring = sys.monitoring  # type: ignore[attr-defined]
+        monitoring.set_events(self.tool_id, monitoring.events.NO_EVENTS)
+        return super().stop()
+
+
+class SettraceTracer(Tracer):
+    """
+    Fallback for python < 3.12: a global trace function that only looks at `call`
+    events and never asks for line events.
+    """
+
+    def install(self) -> None:
+        if sys.gettrace() is not None:
+            raise CollectorError(  # noqa: TRY003
+                "another trace function is installed (is coverage running?), "
+                "the collector needs python 3.12+ to run alongside it"
+            )
+
+    def uninstall(self) -> None:
+        self.stop()
+
+    def _on_call(self, frame: FrameType, event: str, arg: Any) -> None:
+        self.executed.add(frame.f_code)
+
+    def start(self) -> None:
+        super().start()
+        sys.settrace(self._on_call)
+        threading.settrace(self._on_call)
+
+    def stop(self) -> set[CodeType]:
+        sys.settrace(None)
+        threading.settrace(None)  # type: ignore[arg-type]
+        return super().stop()
+
+
+class OpenedFilesHook:
+    """
+    Records the files opened between `start()` and `stop()`, through an audit hook
+    on the `open` event. Audit hooks can't be removed, so it's installed once and
+    does nothing while not recording.
+    """
+
+    def __init__(self) -> None:
+        self.opened: set[str] | None = None
+        self._installed = False
+
+    def install(self) -> None:
+        if not self._installed:
+            sys.addaudithook(self._on_event)
+            self._installed = True
+
+    def _on_event(self, event: str, args: tuple[Any, ...]) -> None:
+        if event != "open" or self.opened is None:
+            return
+        path = args[0]
+        if isinstance(path, (str, bytes, os.PathLike)):  # not a file descriptor
+            self.opened.add(os.path.abspath(os.fsdecode(path)))
+
+    def start(self) -> None:
+        self.opened = set()
+
+    def stop(self) -> set[str]:
+        opened, self.opened = self.opened or set(), None
+        return opened
+
+
+def make_tracer() -> Tracer:
+    if sys.version_info >= (3, 12):
+        return MonitoringTracer()
+    return SettraceTracer()
+
+
+class Collector:
+    """
+    pytest plugin recording, for every test, the project functions it executed
+    (during setup, call and teardown) and the third-party distributions whose
+    code it ran. The result is written as a `CompactMap` at the end of the session.
+
+    With a `slice_` (see `rotation.parse_slice`) only the tests in that slice are
+    traced, and they are merged into the existing map, replacing their previous
+    rows. Rotating the slice on every run keeps the whole map fresh within N runs
+    while paying the collection overhead on 1/N of the suite.
+
+    With `data_files`, the project files each test opens (templates, fixtures,
+    SQL, ...) are recorded too, so changes to them select the tests reading them.
+
+    The project files imported while collecting each test file are recorded too,
+    so modules whose code only runs when they're imported (constants,
+    dataclasses, ...) select the tests of the test files importing them (see
+    `CompactMap`). A module is only imported once per session, so it's only
+    attributed to the first test file importing it, and not to the ones importing
+    it through a `conftest.py`.
+    """
+
+    def __init__(
+        self,
+        output: Path,
+        rootdir: Path,
+        slice_: tuple[int, int] | None = None,
+        data_files: bool = False,
+    ):
+        self.output = output
+        self.rootdir = rootdir.resolve()
+        self.slice = slice_
+        self.tracer = make_tracer()
+        self.opened_files = OpenedFilesHook() if data_files else None
+        self.commit: str | None = None
+        self.tests: list[str] = []
+        self.collected: list[list[Any]] = []
+        self.functions: defaultdict[FunctionKey, set[int]] = defaultdict(set)
+        self.distributions: defaultdict[str, set[int]] = defaultdict(set)
+        self.data_files: defaultdict[str, set[int]] = defaultdict(set)
+        # test file -> project files executed while importing it
+        self.imported: defaultdict[str, set[str]] = defaultdict(set)
+        self._keys: dict[CodeType, FunctionKey | None] = {}
+        self._project_files: dict[str, str | None] = {}
+        self._third_party_files: dict[str, list[str]] = {}
+        self._package_distributions: dict[str, list[str]] | None = None
+
+    def _relative_path(self, filename: str) -> str | None:
+        """
+        Path of `filename` relative to the rootdir, or None for files outside the
+        project (the standard library, installed packages, ...)
+        """
+        if filename not in self._project_files:
+            path = Path(filename).resolve()
+            relative = None
+            if self.rootdir in path.parents and not set(SITE_PACKAGES) & set(path.parts):
+                relative = path.relative_to(self.rootdir).as_posix()
+            self._project_files[filename] = relative
+        return self._project_files[filename]
+
+    def _distributions(self, filename: str) -> list[str]:
+        """
+        Distributions providing `filename`, if it's in an installed package
+        """
+        if filename not in self._third_party_files:
+            parts = Path(filename).parts
+            distributions = []
+            for index, part in enumerate(parts[:-1]):
+                if part in SITE_PACKAGES:
+                    package = parts[index + 1].split(".")[0]
+                    if self._package_distributions is None:
+                        self._package_distributions = package_distributions()
+                    distributions = self._package_distributions.get(
+                        package, [normalize_name(package)]
+                    )
+            self._third_party_files[filename] = distributions
+        return self._third_party_files[filename]
+
+    def _function_key(self, code: CodeType) -> FunctionKey | None:
+        if code not in self._keys:
+            key = None
+            filename = code.co_filename
+            # not `<frozen os>`, `<string>` or other code without a source file
+            if (
+                not filename.startswith("<")
+                and os.path.isfile(filename)
+                and (path := self._relative_path(filename)) is not None
+            ):
+                lines = [line for _, line in dis.findlinestarts(code) if line]
+                key = (
+                    path,
+                    getattr(code, "co_qualname", code.co_name),
+                    code.co_firstlineno,
+                    max(lines, default=code.co_firstlineno),
+                )
+            self._keys[code] = key
+        return self._keys[code]
+
+    def record(
+        self,
+        node_id: str,
+        executed: set[CodeType],
+        opened: Iterable[str] = (),
+        duration: float | None = None,
+    ) -> None:
+        """
+        Records what the test `node_id` used: the project functions it `executed`,
+        the third-party distributions of the other code it executed, and the files
+        it `opened` that aren't python sources. Its collected row keeps when it
+        ran, at which commit, and its `duration`.
+        """
+        index = len(self.tests)
+        self.tests.append(node_id)
+        if duration is not None:
+            duration = round(duration, 3)
+        self.collected.append([int(time.time()), self.commit, duration])
+        for code in executed:
+            if (key := self._function_key(code)) is not None:
+                self.functions[key].add(index)
+            else:
+                for distribution in self._distributions(code.co_filename):
+                    self.distributions[distribution].add(index)
+        for filename in opened:
+            path = self._relative_path(filename)
+            if path is not None and not path.endswith(SOURCE_SUFFIXES):
+                self.data_files[path].add(index)
+
+    def record_import(self, test_file: str, executed: set[CodeType]) -> None:
+        for code in executed:
+            if (key := self._function_key(code)) is not None:
+                self.imported[test_file].add(key[0])
+
+    def _imports(self) -> dict[str, list[int]]:
+        """
+        The project files imported by every test file, with its tests
+        """
+        file_tests: defaultdict[str, set[int]] = defaultdict(set)
+        for index, node_id in enumerate(self.tests):
+            file_tests[node_id.split("::", 1)[0]].add(index)
+        imports: defaultdict[str, set[int]] = defaultdict(set)
+        for test_file, paths in self.imported.items():
+            for path in paths:
+                imports[path] |= file_tests[test_file]
+        return {path: sorted(tests) for path, tests in sorted(imports.items()) if tests}
+
+    def build_map(self) -> CompactMap:
+        compact_map = CompactMap()
+        compact_map.tests = self.tests
+        compact_map.collected = self.collected
+        for (path, qualname, first, last), tests in sorted(self.functions.items()):
+            entry = compact_map.files.setdefault(path, {"functions": []})
+            entry["functions"].append([qualname, first, last, sorted(tests)])
+        compact_map.distributions = {
+            name: sorted(tests) for name, tests in sorted(self.distributions.items())
+        }
+        compact_map.data_files = {
+            path: sorted(tests) for path, tests in sorted(self.data_files.items())
+        }
+        compact_map.imports = self._imports()
+        fingerprints = fingerprint_files(compact_map.files, self.rootdir)
+        for path, sha in fingerprints.items():
+            compact_map.files[path]["sha"] = sha
+        return compact_map
+
+    def pytest_sessionstart(self, session: pytest.Session) -> None:
+        self.commit = get_commit(self.rootdir)
+        self.tracer.install()
+        if self.opened_files:
+            self.opened_files.install()
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_protocol(
+        self, item: pytest.Item, nextitem: pytest.Item | None
+    ) -> Any:
+        if self.slice and not in_slice(item.nodeid, self.slice):
+            yield
+            return
+        self.tracer.start()
+        if self.opened_files:
+            self.opened_files.start()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            opened = self.opened_files.stop() if self.opened_files else set()
+            self.record(item.nodeid, self.tracer.stop(), opened, duration)
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_make_collect_report(self, collector: pytest.Collector) -> Any:
+        if not isinstance(collector, pytest.Module):
+            yield
+            return
+        self.tracer.start()
+        try:
+            yield
+        finally:
+            self.record_import(collector.nodeid, self.tracer.stop())
+
+    def pytest_sessionfinish(self, session: pytest.Session) -> None:
+        self.tracer.uninstall()
+        compact_map = self.build_map()
+        if self.slice and self.output.exists():
+            merged = CompactMap(self.output)
+            merged.merge(compact_map)
+            compact_map = merged
+        compact_map.save(self.output)
+        logger.info(f"skippy-cov map for {len(self.tests)} tests saved in {self.output}")
@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import json
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from skippy_cov.utils import FileTestCandidate
+
+FORMAT_NAME = "skippy-cov"
+FORMAT_VERSION = 1
+
+# (qualname, first line, last line) -> test indexes, for the functions of a file
+FunctionEntries = Dict[Tuple[str, int, int], List[int]]
+
+
+class CompactMapError(ValueError):
+    pass
+
+
+def split_node_id(node_id: str) -> tuple[str, str]:
+    """
+    Splits a pytest node id in the test file and the test name
+
+    >>> split_node_id("tests/test_file.py::TestClass::test_name")
+    ('tests/test_file.py', 'TestClass::test_name')
+    """
+    path, test = node_id.split("::", 1)
+    return (path, test)
+
+
+def _merge_indexes(
+    sources: tuple[dict[str, list[int]], ...], mappings: list[dict[int, int]]
+) -> dict[str, list[int]]:
+    """
+    Merges `{key: [test_index, ...]}` dicts, remapping every source's indexes
+    """
+    merged: defaultdict[str, list[int]] = defaultdict(list)
+    for source, mapping in zip(sources, mappings):
+        for key, indexes in source.items():
+            merged[key].extend(mapping[i] for i in indexes if i in mapping)
+    return {key: sorted(indexes) for key, indexes in sorted(merged.items()) if indexes}
+
+
+class CompactMap:
+    """
+    skippy-cov's own map format, as written by the collector plugin
+    (`pytest --skippy-cov-collect PATH`).
+
+    Instead of a line bitmap per test, it records which functions each test
+    executed. It's a JSON document:
+
+        {
+          "format": "skippy-cov",
+          "version": 1,
+          "tests": ["tests/test_a.py::test_x", ...],
+          "collected": [[timestamp, "commit sha", duration], ...],
+          "files": {
+            "src/a.py": {
+              "sha": "git blob sha of the file when it was collected",
+              "functions": [["qualname", first_line, last_line, [test_index, ...]]]
+            }
+          },
+          "distributions": {"requests": [test_index, ...]},
+          "data_files": {"templates/a.html": [test_index, ...]},
+          "imports": {"src/constants.py": [test_index, ...]}
+        }
+
+    `collected` records when (and at which commit, if known) each test was last
+    collected, so maps built over several partial runs can report stale tests,
+    and how many seconds it took (maps written by older versions don't have it).
+    `distributions` records the third-party distributions each test executed and
+    `data_files` the non-Python project files it opened, if they were collected.
+    `imports` records the project files imported while collecting the test files,
+    with their tests: it's only used for the files no test executed a function
+    of, whose code only runs on import (constants, dataclasses, ...).
+    """
+
+    tests: list[str]
+    collected: list[list[Any]]
+    files: dict[str, dict[str, Any]]
+    distributions: dict[str, list[int]]
+    data_files: dict[str, list[int]]
+    imports: dict[str, list[int]]
+
+    def __init__(self, filepath: Path | None = None):
+        self.tests = []
+        self.collected = []
+        self.files = {}
+        self.distributions = {}
+        self.data_files = {}
+        self.imports = {}
+        if filepath is not None:
+            self.load(filepath)
+
+    def load(self, filepath: Path) -> None:
+        try:
+            data = json.loads(filepath.read_text())
+        except ValueError as e:
+            # e.g. a coverage.py database, which isn't even text
+            raise CompactMapError(  # noqa: TRY003
+                f"'{filepath}' is not a skippy-cov map: {e}"
+            ) from e
+        if (
+            not isinstance(data, dict)
+            or data.get("format") != FORMAT_NAME
+            or data.get("version") != FORMAT_VERSION
+        ):
+            raise CompactMapError(  # noqa: TRY003
+                f"'{filepath}' is not a skippy-cov map (version {FORMAT_VERSION})"
+            )
+        self.tests = data["tests"]
+        self.collected = data.get("collected") or [[None, None] for _ in self.tests]
+        self.files = data["files"]
+        self.distributions = data.get("distributions", {})
+        self.data_files = data.get("data_files", {})
+        self.imports = data.get("imports", {})
+
+    def save(self, filepath: Path) -> None:
+        data = {
+            "format": FORMAT_NAME,
+            "version": FORMAT_VERSION,
+            "tests": self.tests,
+            "collected": self.collected,
+            "files": self.files,
+            "distributions": self.distributions,
+            "data_files": self.data_files,
+            "imports": self.imports,
+        }
+        filepath.write_text(json.dumps(data, separators=(",", ":")))
+
+    def get_tests(self, filepath: Path) -> list[FileTestCandidate]:
+        path = filepath.as_posix()
+        test_indexes = set(self.data_files.get(path, []))
+        if entry := self.files.get(path):
+            for *_, tests in entry["functions"]:
+                test_indexes.update(tests)
+        else:
+            test_indexes.update(self.imports.get(path, []))
+        return self._candidates(test_indexes)
+
+    def node_ids(self) -> set[str]:
+        return set(self.tests)
+
+    def get_distribution_tests(self, names: set[str]) -> list[FileTestCandidate]:
+        """
+        Tests that executed code of any of the given (normalized) distributions
+        """
+        test_indexes: set[int] = set()
+        for name in names:
+            test_indexes.update(self.distributions.get(name, []))
+        return self._candidates(test_indexes)
+
+    def _candidates(self, test_indexes: set[int]) -> list[FileTestCandidate]:
+        found_tests: defaultdict[Path, set[str]] = defaultdict(set)
+        for index in test_indexes:
+            src, test = split_node_id(self.tests[index])
+            found_tests[Path(src)].add(test)
+        return [
+            FileTestCandidate(path=filepath, tests=tests)
+            for (filepath, tests) in found_tests.items()
+        ]
+
+    def fingerprints(self) -> dict[str, str]:
+        return {
+            path: entry["sha"] for path, entry in self.files.items() if "sha" in entry
+        }
+
+    def merge(self, other: CompactMap) -> None:
+        """
+        Merges a map collected for a subset of the tests into this one.
+        The tests in `other` replace their previous rows, the rest are kept.
+        """
+        replaced = set(other.tests)
+        tests: list[str] = []
+        collected: list[list[Any]] = []
+        mappings: list[dict[int, int]] = []
+        for source in (self, other):
+            mapping = {}
+            for index, test in enumerate(source.tests):
+                if source is self and test in replaced:
+                    continue
+                mapping[index] = len(tests)
+                tests.append(test)
+                collected.append(source.collected[index])
+            mappings.append(mapping)
+
+        self.files = self._merge_files(other, mappings)
+        self.distributions = _merge_indexes(
+            (self.distributions, other.distributions), mappings
+        )
+        self.data_files = _merge_indexes((self.data_files, other.data_files), mappings)
+        self.imports = _merge_indexes((self.imports, other.imports), mappings)
+        self.tests = tests
+        self.collected = collected
+
+    def _merge_files(
+        self, other: CompactMap, mappings: list[dict[int, int]]
+    ) -> dict[str, dict[str, Any]]:
+        functions: defaultdict[str, FunctionEntries] = defaultdict(dict)
+        for source, mapping in zip((self, other), mappings):
+            for path, entry in source.files.items():
+                for qualname, first, last, indexes in entry["functions"]:
+                    remapped = [mapping[i] for i in indexes if i in mapping]
+                    if remapped:
+                        key = (qualname, first, last)
+                        functions[path].setdefault(key, []).extend(remapped)
+
+        # the latest fingerprint wins, it's the one matching the latest rows
+        fingerprints = {**self.fingerprints(), **other.fingerprints()}
+
+        files: dict[str, dict[str, Any]] = {}
+        for path, entries in sorted(functions.items()):
+            files[path] = {
+                "functions": [
+                    [qualname, first, last, sorted(indexes)]
+                    for (qualname, first, last), indexes in sorted(entries.items())
+                ]
+            }
+            if path in fingerprints:
+                files[path]["sha"] = fingerprints[path]
+        return files
+
+    def stale_tests(
+        self, max_age: float, now: float | None = None
+    ) -> list[tuple[str, float | None]]:
+        """
+        Tests collected more than `max_age` seconds ago (or never), with their age
+        """
+        now = time.time() if now is None else now
+        stale = []
+        for test, (timestamp, *_) in zip(self.tests, self.collected):
+            age = None if timestamp is None else now - timestamp
+            if age is None or age > max_age:
+                stale.append((test, age))
+        return stale
@@ -23,12 +23,15 @@ else:
 
 
 _config: ConfigHandler | None = None
+_config_base: Path | None = None
 
 
 def get_config() -> ConfigHandler:
-    global _config
-    if not _config:
-        _config = ConfigHandler(Path.cwd())
+    global _config, _config_base
+    base = Path.cwd()
+    if _config is None or base != _config_base:
+        _config = ConfigHandler(base)
+        _config_base = base
     return _config
 
 
@@ -127,12 +130,9 @@ class ConfigHandler:
             see: https://docs.pytest.org/en/stable/reference/customize.html#configuration-file-formats
         """
         for current in [base, *base.absolute().parents]:
-            config = {
-                path.name for path in current.iterdir() if path.name in self.configs
-            }
-            if config:
-                top_config = sorted(config, key=self.config_priority.index)[0]
-                cls = self.configs[top_config]
-                cfg_path = current / top_config
-                return cls(cfg_path)
+            # a stat per candidate is cheaper than listing large directories
+            for name in self.config_priority:
+                cfg_path = current / name
+                if cfg_path.is_file():
+                    return self.configs[name](cfg_path)
         return None
@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+import importlib.metadata
+import logging
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from skippy_cov.compact_map import CompactMap
+from skippy_cov.utils import CoverageLookup, FileTestCandidate
+
+if sys.version_info >= (3, 11):
+    import tomllib
+else:
+    import tomli as tomllib
+
+if TYPE_CHECKING:
+    from skippy_cov.diff_handler import DiffHandler
+
+logger = logging.getLogger(__name__)
+
+# lockfiles made of `[[package]]` tables starting with `name = "..."`
+LOCKFILES = {"uv.lock", "poetry.lock", "pdm.lock"}
+
+HUNK_HEADER = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)(?:,\d+)? @@")
+# blobs of the file before and after the change, in a git diff
+INDEX_LINE = re.compile(r"^index ([0-9a-f]+)\.\.([0-9a-f]+)", re.MULTILINE)
+LOCK_PACKAGE_NAME = re.compile(r'^name = "([^"]+)"')
+REQUIREMENT_NAME = re.compile(r"^\s*([A-Za-z0-9][A-Za-z0-9._-]*)")
+
+
+def normalize_name(name: str) -> str:
+    """
+    Normalized distribution name, as in PEP 503
+
+    >>> normalize_name("Typing_Extensions")
+    'typing-extensions'
+    """
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def is_dependency_file(file_path: Path) -> bool:
+    name = file_path.name
+    if name in LOCKFILES or name == "pyproject.toml":
+        return True
+    return file_path.suffix in (".txt", ".in") and (
+        name.startswith(("requirements", "constraints"))
+        or file_path.parent.name == "requirements"
+    )
+
+
+def package_distributions() -> dict[str, list[str]]:
+    """
+    Maps top-level import names to the (normalized) distributions providing them
+    """
+    mapping: defaultdict[str, list[str]] = defaultdict(list)
+    for distribution in importlib.metadata.distributions():
+        name = distribution.metadata["Name"]
+        if not name:
+            continue
+        top_level = (distribution.read_text("top_level.txt") or "").split()
+        if not top_level:
+            top_level = list({
+                file.parts[0] if len(file.parts) > 1 else file.stem
+                for file in distribution.files or []
+                if file.suffix == ".py"
+            })
+        for package in top_level:
+            mapping[package].append(normalize_name(name))
+    return mapping
+
+
+def _enclosing_lock_package(lines: list[str], line_no: int) -> str | None:
+    """
+    Name of the `[[package]]` table containing `line_no` in the lines of the
+    changed lockfile, for hunks that don't show it in their context
+    """
+    for line in reversed(lines[:line_no]):
+        if match := LOCK_PACKAGE_NAME.match(line):
+            return match.group(1)
+        if line.startswith("[") and not line.startswith(("[package", "[[package")):
+            return None
+    return None
+
+
+def _changed_lines(diff: str) -> list[tuple[str, str, int]]:
+    """
+    (origin, content, target line number) for every line in the hunks of a diff
+    """
+    lines = []
+    line_no = 0
+    in_hunk = False
+    for line in diff.splitlines():
+        if match := HUNK_HEADER.match(line):
+            in_hunk = True
+            line_no = int(match.group(1))
+            lines.append(("@", "", line_no))
+        elif in_hunk and line[:1] in ("", " ", "+", "-"):
+            origin = line[:1] or " "  # some tools strip the blank context lines
+            lines.append((origin, line[1:], line_no))
+            if origin != "-":
+                line_no += 1
+    return lines
+
+
+def _read_blob(sha: str) -> str | None:
+    if not sha.strip("0"):
+        return ""  # the file didn't exist on that side
+    try:
+        return subprocess.check_output(
+            ["git", "cat-file", "blob", sha], stderr=subprocess.DEVNULL, text=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _revert(new: str, diff: str) -> str:
+    """
+    The contents of a file before the change, from its contents after it
+    """
+    new_lines = new.splitlines()
+    old_lines = []
+    position = 0
+    for origin, content, line_no in _changed_lines(diff):
+        if origin == "@":
+            old_lines.extend(new_lines[position : max(line_no - 1, position)])
+            position = max(line_no - 1, position)
+            continue
+        if origin != "+":
+            old_lines.append(content)
+        if origin != "-":
+            position += 1
+    old_lines.extend(new_lines[position:])
+    return "\n".join(old_lines)
+
+
+def _revisions(file_path: Path, diff: str) -> tuple[str, str]:
+    """
+    The contents of the changed file before and after the diff: the blobs of its
+    `index` line when git has them, otherwise the working tree file (what a diff
+    against the working tree changed) and its contents with the diff reverted
+    """
+    old = new = None
+    if match := INDEX_LINE.search(diff):
+        old, new = _read_blob(match.group(1)), _read_blob(match.group(2))
+    if new is None:
+        try:
+            new = file_path.read_text()
+        except OSError:
+            new = ""
+    if old is None:
+        old = _revert(new, diff)
+    return old, new
+
+
+def _changed_lock_packages(file_path: Path, diff: str) -> set[str]:
+    _, new = _revisions(file_path, diff)
+    lines = new.splitlines()
+    changed = set()
+    package = None
+    for origin, content, line_no in _changed_lines(diff):
+        if origin == "@" or content.startswith("[[package]]"):
+            package = None
+        elif match := LOCK_PACKAGE_NAME.match(content):
+            package = match.group(1)
+        if origin in "+-":
+            package = package or _enclosing_lock_package(lines, line_no)
+            if package:
+                changed.add(package)
+    return changed
+
+
+def _changed_requirements(diff: str) -> set[str]:
+    changed = set()
+    for origin, content, _ in _changed_lines(diff):
+        if origin not in "+-" or content.lstrip().startswith(("#", "-")):
+            continue
+        if match := REQUIREMENT_NAME.match(content):
+            changed.add(match.group(1))
+    return changed
+
+
+def _pyproject_requirements(content: str) -> set[str]:
+    """
+    The requirements of the `[project]` dependencies and optional dependencies,
+    and of the `[dependency-groups]`
+    """
+    try:
+        pyproject = tomllib.loads(content)
+    except tomllib.TOMLDecodeError:
+        logger.warning("Failed to parse a version of pyproject.toml")
+        return set()
+    project = pyproject.get("project", {})
+    groups = [
+        project.get("dependencies", []),
+        *project.get("optional-dependencies", {}).values(),
+        *pyproject.get("dependency-groups", {}).values(),
+    ]
+    # `{include-group = "..."}` entries only repeat the requirements of a group
+    return {
+        requirement
+        for group in groups
+        for requirement in group
+        if isinstance(requirement, str)
+    }
+
+
+def _changed_pyproject_requirements(file_path: Path, diff: str) -> set[str]:
+    old, new = _revisions(file_path, diff)
+    changed = set()
+    for requirement in _pyproject_requirements(old) ^ _pyproject_requirements(new):
+        if match := REQUIREMENT_NAME.match(requirement):
+            changed.add(match.group(1))
+    return changed
+
+
+def changed_distributions(file_path: Path, diff: str) -> set[str]:
+    """
+    Normalized names of the distributions added, removed or updated by the diff
+    of a dependency file.
+
+    Lockfiles are attributed by `[[package]]` table, requirement files by line.
+    For `pyproject.toml` the requirements of both versions are compared.
+    """
+    if file_path.name in LOCKFILES:
+        names = _changed_lock_packages(file_path, diff)
+    elif file_path.name == "pyproject.toml":
+        names = _changed_pyproject_requirements(file_path, diff)
+    else:
+        names = _changed_requirements(diff)
+    return {normalize_name(name) for name in names}
+
+
+def select_dependency_tests(
+    diff_handler: DiffHandler, coverage_map: CoverageLookup
+) -> list[FileTestCandidate]:
+    """
+    Tests that used a third-party distribution changed in a dependency file
+    """
+    changed: set[str] = set()
+    for file_path in diff_handler.changed_files:
+        if is_dependency_file(file_path):
+            changed |= changed_distributions(file_path, diff_handler[file_path])
+    if not changed:
+        return []
+    logger.debug(f"Changed distributions: {sorted(changed)}")
+    if not isinstance(coverage_map, CompactMap):
+        logger.warning(
+            "Dependencies changed, but only skippy-cov maps "
+            "(--skippy-cov-collect) record which tests use them"
+        )
+        return []
+    return coverage_map.get_distribution_tests(changed)
@@ -2,18 +2,35 @@ from __future__ import annotations
 
 import io
 import logging
+import re
 from collections import defaultdict
+from dataclasses import dataclass, field
 from pathlib import Path
 
 from unidiff import PatchSet
 
 logger = logging.getLogger(__name__)
 
+HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,\d+)? \+\d+(?:,\d+)? @@")
+
 
 class DiffHandlerError(Exception):
     pass
 
 
+@dataclass
+class SourceChanges:
+    """
+    The changes of a file in terms of its original (pre-diff) line numbers, the
+    ones the coverage was measured on
+    """
+
+    # lines removed or replaced
+    removed: set[int] = field(default_factory=set)
+    # lines followed by added lines (0 when adding at the top of the file)
+    inserted_after: set[int] = field(default_factory=set)
+
+
 class DiffHandler:
     def __init__(self, contents: str):
         """
@@ -23,6 +40,9 @@ class DiffHandler:
         Raises:
             FileNotFoundError: If the specified diff file does not exist.
         """
+        # renamed or moved files, original path -> new path
+        self.renames: dict[Path, Path] = {}
+        self._original_paths: dict[Path, Path] = {}
         self.changes = self.parse_diff(contents)
 
     @property
@@ -32,6 +52,40 @@ class DiffHandler:
     def __getitem__(self, key: Path) -> str:
         return self.changes[key]
 
+    def original_path(self, key: Path) -> Path:
+        """
+        The path of a changed file before the diff, which is the one the coverage
+        knows it by if it was renamed
+        """
+        return self._original_paths.get(key, key)
+
+    def new_path(self, path: Path) -> Path:
+        """
+        Where a file is after the diff, if it was renamed
+        """
+        return self.renames.get(path, path)
+
+    def source_changes(self, key: Path) -> SourceChanges:
+        """
+        The lines of the original file removed by the diff of `key`, and the ones
+        new lines were added after
+        """
+        changes = SourceChanges()
+        # the stored diff is stripped, so the hunk lengths can't be trusted
+        previous = 0
+        in_hunk = False
+        for line in self.changes[key].splitlines():
+            if match := HUNK_HEADER.match(line):
+                in_hunk = True
+                previous = int(match.group(1)) - 1
+            elif in_hunk and line.startswith("+"):
+                changes.inserted_after.add(previous)
+            elif in_hunk and line[:1] in ("", " ", "-"):
+                previous += 1
+                if line.startswith("-"):
+                    changes.removed.add(previous)
+        return changes
+
     def parse_diff(self, diff_text: str) -> defaultdict[Path, str]:
         """
         Parses the full text output of 'git diff' using the 'unidiff' library.
@@ -55,6 +109,12 @@ class DiffHandler:
                     path = patched_file.target_file
                     if path.startswith("b/"):
                         path = path[2:]
+                if patched_file.is_rename:
+                    source = patched_file.source_file
+                    if source.startswith("a/"):
+                        source = source[2:]
+                    self.renames[Path(source)] = Path(path)
+                    self._original_paths[Path(path)] = Path(source)
                 mapped_changes[Path(path)] = str(patched_file).strip()
         except Exception as e:
             logger.exception("Failed to parse diff using unidiff")
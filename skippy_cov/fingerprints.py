@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import logging
+import subprocess
+from collections.abc import Iterable
+from pathlib import Path
+
+from skippy_cov.compact_map import CompactMap
+from skippy_cov.utils import CoverageLookup, CoverageMap, FileTestCandidate
+
+logger = logging.getLogger(__name__)
+
+
+def blob_sha(content: bytes) -> str:
+    """
+    The SHA git gives to a blob with this content, so fingerprints can be compared
+    with `git ls-files -s` without reading the files again
+    """
+    header = f"blob {len(content)}\0".encode()
+    return hashlib.sha1(header + content).hexdigest()  # noqa: S324 not for security
+
+
+def fingerprint_files(paths: Iterable[str], root: Path) -> dict[str, str]:
+    fingerprints = {}
+    for path in paths:
+        try:
+            fingerprints[path] = blob_sha((root / path).read_bytes())
+        except OSError:
+            logger.debug(f"Can't fingerprint '{path}', it doesn't exist")
+    return fingerprints
+
+
+def sidecar_path(coverage_file: Path) -> Path:
+    """
+    Where the fingerprints of a coverage.py database are stored
+    """
+    return coverage_file.with_name(f"{coverage_file.name}.fingerprints.json")
+
+
+def load_fingerprints(
+    coverage_file: Path, coverage_map: CoverageLookup
+) -> dict[str, str]:
+    """
+    skippy-cov maps carry their fingerprints, coverage.py databases have them in
+    a sidecar file written by `skippy-cov fingerprint`
+    """
+    if isinstance(coverage_map, CompactMap):
+        return coverage_map.fingerprints()
+    sidecar = sidecar_path(coverage_file)
+    if not sidecar.exists():
+        logger.warning(f"No fingerprints found for '{coverage_file}' (see '{sidecar}')")
+        return {}
+    fingerprints: dict[str, str] = json.loads(sidecar.read_text())["files"]
+    return fingerprints
+
+
+def get_commit(cwd: Path) -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=cwd, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def get_index_fingerprints() -> dict[str, str]:
+    """
+    Blob SHAs of every file in the git index, in a single cheap git call. Outside
+    of a git checkout there are none, so no file is considered drifted.
+    """
+    try:
+        output = subprocess.check_output(
+            ["git", "ls-files", "-s", "-z"], stderr=subprocess.DEVNULL, text=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        logger.warning(
+            "Not in a git checkout, the fingerprints are unavailable: "
+            "skipping the staleness check"
+        )
+        return {}
+    fingerprints = {}
+    for entry in output.split("\0"):
+        if entry:
+            info, path = entry.split("\t", 1)
+            fingerprints[path] = info.split()[1]
+    return fingerprints
+
+
+def find_drifted_files(
+    recorded: dict[str, str], current: dict[str, str] | None = None
+) -> set[Path]:
+    """
+    Files whose content changed since the map was collected
+    """
+    current = get_index_fingerprints() if current is None else current
+    return {
+        Path(path) for path, sha in recorded.items() if current.get(path, sha) != sha
+    }
+
+
+def select_drifted_tests(
+    coverage_map: CoverageLookup, drifted_files: set[Path]
+) -> list[FileTestCandidate]:
+    """
+    The coverage of a drifted file can't be trusted line by line anymore, so every
+    test related to it is selected
+    """
+    tests_to_run = []
+    for file_path in drifted_files:
+        if candidates := coverage_map.get_tests(file_path):
+            logger.debug(
+                f"'{file_path}' changed since the coverage was collected. "
+                f"Adding {sum(len(c.tests) for c in candidates)} related test(s)."
+            )
+            tests_to_run.extend(candidates)
+    return tests_to_run
+
+
+def select_stale_tests(
+    coverage_file: Path, coverage_map: CoverageLookup, changed_files: set[Path]
+) -> list[FileTestCandidate]:
+    """
+    The tests of the files that changed since the map was collected, besides
+    `changed_files` (already handled by the selection)
+    """
+    fingerprints = load_fingerprints(coverage_file, coverage_map)
+    drifted_files = find_drifted_files(fingerprints) if fingerprints else set()
+    return select_drifted_tests(coverage_map, drifted_files - changed_files)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="skippy-cov fingerprint",
+        description="Record the fingerprints of the files measured in a coverage database.",
+    )
+    parser.add_argument(
+        "--coverage-file",
+        required=False,
+        help="Path to the coverage file (.coverage sqlite database).",
+        type=Path,
+        default=Path(".coverage"),
+    )
+    args = parser.parse_args(argv)
+
+    root = Path.cwd().resolve()
+    coverage_map = CoverageMap(args.coverage_file)
+    # files outside the project keep their absolute path
+    paths = [
+        path
+        for path in coverage_map.canonical_paths.values()
+        if not Path(path).is_absolute()
+    ]
+    fingerprints = fingerprint_files(paths, root)
+    sidecar = {"commit": get_commit(root), "files": fingerprints}
+    sidecar_path(args.coverage_file).write_text(
+        json.dumps(sidecar, indent=2, sort_keys=True)
+    )
@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+import logging
+import sys
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from skippy_cov import discover_tests_in_file
+from skippy_cov.compact_map import CompactMap
+from skippy_cov.dependencies import is_dependency_file, select_dependency_tests
+from skippy_cov.diff_handler import DiffHandler
+from skippy_cov.fingerprints import find_drifted_files, load_fingerprints
+from skippy_cov.utils import (
+    CoverageLookup,
+    CoverageMap,
+    FileTestCandidate,
+    collapse_parametrized,
+    filter_collected,
+    load_coverage_map,
+)
+
+if sys.version_info >= (3, 11):
+    import tomllib
+else:
+    import tomli as tomllib
+
+logger = logging.getLogger(__name__)
+
+
+class ManifestError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class SelectionOptions:
+    """
+    The selection options applied to every coverage file of a manifest, see
+    `select_tests` in `skippy_cov.__main__`. `current_fingerprints` are the ones of
+    the files in the git index, if the fingerprints are checked.
+    """
+
+    arcs: bool = False
+    path_prefixes: tuple[str, ...] = ()
+    env: str | None = None
+    current_fingerprints: dict[str, str] | None = None
+
+
+@dataclass(frozen=True)
+class ManifestEntry:
+    """
+    A coverage file and the part of the repository it covers.
+
+    `root` is the directory the coverage was collected from (default: the
+    repository root). Changed files are made relative to it before looking
+    them up, and the tests found are prefixed with it.
+    """
+
+    prefix: Path
+    coverage_file: Path
+    root: Path | None = None
+
+    def _lookup_path(self, file_path: Path) -> Path:
+        if self.root and self.root in file_path.parents:
+            return file_path.relative_to(self.root)
+        return file_path
+
+    def _drifted_files(
+        self, coverage_map: CoverageLookup, current: dict[str, str]
+    ) -> set[Path]:
+        """
+        The files that changed since the coverage was collected, relative to the
+        repository root
+        """
+        fingerprints = load_fingerprints(self.coverage_file, coverage_map)
+        if self.root:
+            fingerprints = {
+                (self.root / path).as_posix(): sha for path, sha in fingerprints.items()
+            }
+        return find_drifted_files(fingerprints, current)
+
+    def _covering_tests(
+        self,
+        coverage_map: CoverageLookup,
+        file_path: Path,
+        arcs: bool = False,
+        diff_handler: DiffHandler | None = None,
+    ) -> list[FileTestCandidate]:
+        lookup = self._lookup_path(file_path)
+        candidates = None
+        # renamed files are looked up by file, like in `get_covering_tests`
+        if (
+            arcs
+            and diff_handler is not None
+            and file_path in diff_handler.changed_files
+            and isinstance(coverage_map, CoverageMap)
+        ):
+            candidates = coverage_map.get_arc_tests(
+                lookup, diff_handler.source_changes(file_path)
+            )
+        if candidates is None:
+            candidates = coverage_map.get_tests(lookup)
+        return self._from_root(candidates)
+
+    def _from_root(self, candidates: list[FileTestCandidate]) -> list[FileTestCandidate]:
+        if self.root:
+            for candidate in candidates:
+                candidate.path = self.root / candidate.path
+        return candidates
+
+    def get_tests(
+        self,
+        file_paths: list[Path],
+        options: SelectionOptions | None = None,
+        diff_handler: DiffHandler | None = None,
+    ) -> tuple[list[FileTestCandidate], set[str]]:
+        """
+        The tests of the changed `file_paths` (by their original path) in this
+        coverage file. With `options.arcs` and the `diff_handler`, only the ones
+        that ran the changed lines (see `CoverageMap.get_arc_tests`), and with
+        `options.current_fingerprints` the tests of the files that changed since
+        the coverage was collected too. The `diff_handler` also selects the tests
+        using the distributions changed in dependency files.
+
+        The node ids of the map are returned with them, the parametrized tests
+        are collapsed once the tests of every entry are known.
+        """
+        options = options or SelectionOptions()
+        coverage_map = load_coverage_map(
+            self.coverage_file, options.path_prefixes, options.env
+        )
+        candidates = []
+        for file_path in file_paths:
+            candidates += self._covering_tests(
+                coverage_map, file_path, options.arcs, diff_handler
+            )
+        if options.current_fingerprints is not None:
+            drifted = self._drifted_files(coverage_map, options.current_fingerprints)
+            if diff_handler is not None:
+                drifted -= diff_handler.changed_files
+            for file_path in drifted - set(file_paths):
+                candidates += self._covering_tests(coverage_map, file_path)
+        if diff_handler is not None:
+            candidates += self._from_root(
+                select_dependency_tests(diff_handler, coverage_map)
+            )
+        node_ids: set[str] = set()
+        if isinstance(coverage_map, (CoverageMap, CompactMap)):
+            node_ids = coverage_map.node_ids()
+            if self.root:
+                node_ids = {f"{self.root.as_posix()}/{node_id}" for node_id in node_ids}
+        return candidates, node_ids
+
+
+class CoverageManifest:
+    """
+    Routes changed files to the coverage file of the package they belong to.
+
+    The manifest is a TOML file with one `[[coverage]]` table per coverage file:
+
+        [[coverage]]
+        prefix = "packages/billing"
+        file = "packages/billing/.coverage"
+        root = "packages/billing"  # optional
+
+    `file` is relative to the manifest, `prefix` and `root` to the repository root.
+    When several prefixes match a changed file, the longest one wins.
+    """
+
+    def __init__(self, manifest_path: Path):
+        self.manifest_path = manifest_path
+        self.entries = self._parse(manifest_path)
+
+    @staticmethod
+    def _parse(manifest_path: Path) -> list[ManifestEntry]:
+        manifest = tomllib.loads(manifest_path.read_text())
+        entries = []
+        for entry in manifest.get("coverage", []):
+            try:
+                entries.append(
+                    ManifestEntry(
+                        prefix=Path(entry["prefix"]),
+                        coverage_file=manifest_path.parent / entry["file"],
+                        root=Path(entry["root"]) if entry.get("root") else None,
+                    )
+                )
+            except KeyError as e:
+                raise ManifestError(  # noqa: TRY003
+                    f"'{manifest_path}': coverage entry {entry} is missing {e}"
+                ) from e
+        # longest prefixes first, so the most specific entry wins
+        return sorted(entries, key=lambda entry: len(entry.prefix.parts), reverse=True)
+
+    def route(self, file_path: Path) -> ManifestEntry | None:
+        for entry in self.entries:
+            if entry.prefix in (file_path, *file_path.parents):
+                return entry
+        return None
+
+    def select_tests(
+        self,
+        diff_handler: DiffHandler,
+        max_workers: int | None = None,
+        options: SelectionOptions | None = None,
+    ) -> list[FileTestCandidate]:
+        """
+        Equivalent of `select_tests_to_run` for a whole monorepo.
+
+        Only the coverage files of the packages with changes are loaded (all of
+        them when the fingerprints are checked or a dependency file changed), and
+        they are loaded and queried in parallel. Renamed files are routed and looked
+        up by their original path.
+        """
+        routes: defaultdict[ManifestEntry, list[Path]] = defaultdict(list)
+        if (options and options.current_fingerprints is not None) or any(
+            is_dependency_file(file_path) for file_path in diff_handler.changed_files
+        ):
+            routes.update(
+                (entry, []) for entry in self.entries if entry.coverage_file.exists()
+            )
+        for file_path in diff_handler.changed_files:
+            original_path = diff_handler.original_path(file_path)
+            if (entry := self.route(original_path)) is not None:
+                routes[entry].append(original_path)
+            else:
+                logger.debug(f"Changed file '{file_path}' has no coverage file.")
+
+        tests_to_run: list[FileTestCandidate] = []
+        node_ids: set[str] = set()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(entry.get_tests, file_paths, options, diff_handler)
+                for entry, file_paths in routes.items()
+            ]
+            for file_path in diff_handler.changed_files:
+                if tests_in_file := discover_tests_in_file(file_path):
+                    tests_to_run.append(tests_in_file)
+            for future in futures:
+                candidates, entry_node_ids = future.result()
+                for candidate in candidates:
+                    candidate.path = diff_handler.new_path(candidate.path)
+                tests_to_run += filter_collected(candidates)
+                node_ids |= entry_node_ids
+        # after the tests of the changed test files, like in `select_tests_to_run`
+        return collapse_parametrized(tests_to_run, node_ids)
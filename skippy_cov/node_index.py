@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import ast
+import json
+import logging
+import re
+from pathlib import Path
+from typing import Any
+
+from skippy_cov.fingerprints import blob_sha
+from skippy_cov.tests_finder import ASTTestsFinder
+from skippy_cov.utils import FileTestCandidate
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_FILE = Path(".skippy-cov-index.json")
+INDEX_VERSION = 2
+
+PARAMETERS = re.compile(r"\[.*\]$")
+
+
+class NodeIndex:
+    """
+    The tests currently defined in every test file, found with the AST discovery
+    and cached by file content, so selections can be checked against the current
+    tree without a pytest collection pass.
+
+    The cache is a JSON file:
+
+        {
+          "version": 2,
+          "files": {
+            "tests/test_a.py": {
+              "sha": "git blob sha of the file",
+              "tests": ["test_x", "TestA::test_y"],
+              "inheriting_classes": ["TestB"],
+              "bound": ["pytest", "test_x", "TestA", "TestA::test_y", ...]
+            }
+          }
+        }
+
+    `bound` are the names bound at module or class level (`Class::name`), or
+    `*` if the module has a star import: tests the discovery can't see (imported,
+    assigned, ...) are only dropped if their name isn't bound anywhere.
+    """
+
+    def __init__(self, index_file: Path = DEFAULT_INDEX_FILE):
+        self.index_file = index_file
+        self.files: dict[str, dict[str, Any]] = {}
+        self._changed = False
+        try:
+            data = json.loads(index_file.read_text())
+        except (OSError, ValueError):
+            return
+        if data.get("version") == INDEX_VERSION:
+            self.files = data["files"]
+
+    def save(self) -> None:
+        if self._changed:
+            data = {"version": INDEX_VERSION, "files": self.files}
+            self.index_file.write_text(json.dumps(data, separators=(",", ":")))
+            self._changed = False
+
+    def get(self, file_path: Path) -> dict[str, Any] | None:
+        """
+        The index entry of a test file, None if it doesn't exist or can't be parsed
+        """
+        try:
+            content = file_path.read_bytes()
+        except OSError:
+            return None
+        key = file_path.as_posix()
+        sha = blob_sha(content)
+        entry = self.files.get(key)
+        if entry is None or entry["sha"] != sha:
+            try:
+                tree = ast.parse(content, filename=file_path.name)
+            except (SyntaxError, ValueError):
+                return None
+            finder = ASTTestsFinder(file_path)
+            finder.visit(tree)
+            entry = {
+                "sha": sha,
+                "tests": sorted(finder.tests),
+                "inheriting_classes": sorted(finder.inheriting_classes),
+                "bound": sorted(_bound_names(tree.body)),
+            }
+            self.files[key] = entry
+            self._changed = True
+        return entry
+
+    def validate(self, candidates: list[FileTestCandidate]) -> list[FileTestCandidate]:
+        """
+        Drops the selected tests that don't exist anymore, and remaps the ones that
+        moved in or out of a class in the same file.
+
+        Tests of classes with base classes are kept, they may be inherited, and so
+        are tests of files that can't be parsed: pytest will report those.
+        """
+        validated = []
+        for candidate in candidates:
+            if not candidate.path.exists():
+                logger.info(f"Dropping the tests of '{candidate.path}', it was removed")
+                continue
+            entry = self.get(candidate.path)
+            if entry is None:
+                validated.append(candidate)
+                continue
+            tests = set()
+            for test in candidate.tests:
+                if (current := _current_test_id(test, entry)) is not None:
+                    tests.add(current)
+                else:
+                    logger.info(f"Dropping '{candidate.path}::{test}', it doesn't exist")
+            if tests:
+                validated.append(FileTestCandidate(path=candidate.path, tests=tests))
+        self.save()
+        return validated
+
+
+def _current_test_id(test: str, entry: dict[str, Any]) -> str | None:
+    """
+    `test` as it is currently defined, according to an index entry
+    """
+    current_tests = entry["tests"]
+    # parametrized ids aren't known without collecting, check the function
+    name = PARAMETERS.sub("", test)
+    if name in current_tests or name in entry["bound"] or "*" in entry["bound"]:
+        return test
+    *classes, function = name.split("::")
+    if classes and classes[-1] in entry["inheriting_classes"]:
+        return test
+    moved = [current for current in current_tests if current.split("::")[-1] == function]
+    if len(moved) == 1:
+        return moved[0] + test[len(name) :]
+    return None
+
+
+def _assigned_names(node: ast.stmt) -> list[str]:
+    """
+    The names an import or an assignment binds, `*` for a star import
+    """
+    if isinstance(node, (ast.Import, ast.ImportFrom)):
+        return [alias.asname or alias.name.split(".")[0] for alias in node.names]
+    if isinstance(node, ast.Assign):
+        targets = node.targets
+    elif isinstance(node, (ast.AnnAssign, ast.AugAssign)):
+        targets = [node.target]
+    else:
+        return []
+    return [
+        child.id
+        for target in targets
+        for child in ast.walk(target)
+        if isinstance(child, ast.Name)
+    ]
+
+
+def _bound_names(body: list[ast.stmt], prefix: str = "") -> set[str]:
+    """
+    The names bound by the statements of a module or class body (including the
+    ones in `if`, `try` and `with` blocks), and those of its classes as
+    `Class::name`. A star import binds `*`.
+    """
+    names = set()
+    for node in body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(prefix + node.name)
+            if isinstance(node, ast.ClassDef):
+                names |= _bound_names(node.body, f"{prefix}{node.name}::")
+        elif assigned := _assigned_names(node):
+            names.update("*" if name == "*" else prefix + name for name in assigned)
+        else:
+            for field in ("body", "orelse", "finalbody", "handlers"):
+                names |= _bound_names(getattr(node, field, []), prefix)
+    return names
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import logging
+import subprocess
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+from skippy_cov import discover_tests_in_file, get_covering_tests
+from skippy_cov.__main__ import get_default_branch
+from skippy_cov.compact_map import CompactMap
+from skippy_cov.dependencies import is_dependency_file, select_dependency_tests
+from skippy_cov.diff_handler import DiffHandler
+from skippy_cov.fingerprints import select_stale_tests
+from skippy_cov.utils import (
+    CoverageMap,
+    FileTestCandidate,
+    collapse_parametrized,
+    filter_collected,
+    load_coverage_map,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineError(Exception):
+    pass
+
+
+def split_file_diffs(lines: Iterable[str]) -> Iterator[str]:
+    """
+    Splits the output of `git diff` in one chunk per file, yielding every chunk
+    as soon as the next one starts so files can be processed while the diff is
+    still being produced.
+    """
+    chunk: list[str] = []
+    for line in lines:
+        if line.startswith("diff --git ") and chunk:
+            yield "".join(chunk)
+            chunk = []
+        chunk.append(line)
+    if chunk:
+        yield "".join(chunk)
+
+
+def iter_file_diffs(diff_arg: str | None) -> Iterator[str]:
+    """
+    Same inputs as `get_diff_content`: a diff file, a git ref/branch to diff against
+    or None for the default branch. Git's output is streamed instead of buffered.
+    """
+    if diff_arg and Path(diff_arg).exists():
+        with open(diff_arg) as diff_file:
+            yield from split_file_diffs(diff_file)
+        return
+    diff_ref = diff_arg if diff_arg else f"{get_default_branch()}...HEAD"
+    with subprocess.Popen(
+        ["git", "diff", "-M", diff_ref],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+    ) as process:
+        yield from split_file_diffs(process.stdout or [])
+    if process.returncode:
+        raise PipelineError(  # noqa: TRY003
+            f"failed to get git diff for '{diff_ref}': exit status {process.returncode}"
+        )
+
+
+def select_tests_pipelined(
+    diff_arg: str | None,
+    coverage_file: Path,
+    max_workers: int | None = None,
+    arcs: bool = False,
+    path_prefixes: Iterable[str] = (),
+    env: str | None = None,
+    check_fingerprints: bool = False,
+) -> list[FileTestCandidate]:
+    """
+    Pipelined equivalent of `select_tests_to_run`.
+
+    The coverage map starts loading while git is still producing the diff, and
+    every changed file is queried and discovered as soon as its chunk of the diff
+    is known, so the total time approaches that of the slowest stage instead of
+    the sum of all of them.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        coverage_map_future = executor.submit(
+            load_coverage_map, coverage_file, path_prefixes, env
+        )
+
+        def query_coverage(
+            diff_handler: DiffHandler, file_path: Path
+        ) -> list[FileTestCandidate]:
+            coverage_map = coverage_map_future.result()
+            return filter_collected(
+                get_covering_tests(diff_handler, coverage_map, file_path, arcs)
+            )
+
+        def discover(file_path: Path) -> list[FileTestCandidate]:
+            tests_in_file = discover_tests_in_file(file_path)
+            return [tests_in_file] if tests_in_file else []
+
+        def query_dependencies(diff_handler: DiffHandler) -> list[FileTestCandidate]:
+            return select_dependency_tests(diff_handler, coverage_map_future.result())
+
+        futures: list[Future[list[FileTestCandidate]]] = []
+        changed_files: set[Path] = set()
+        for chunk in iter_file_diffs(diff_arg):
+            diff_handler = DiffHandler(chunk)
+            changed_files |= diff_handler.changed_files
+            for file_path in diff_handler.changed_files:
+                logger.debug(f"Changed file '{file_path}' queued for selection")
+                futures.append(executor.submit(query_coverage, diff_handler, file_path))
+                futures.append(executor.submit(discover, file_path))
+                if is_dependency_file(file_path):
+                    futures.append(executor.submit(query_dependencies, diff_handler))
+
+        tests_to_run: list[FileTestCandidate] = []
+        for future in futures:
+            tests_to_run.extend(future.result())
+        coverage_map = coverage_map_future.result()
+        if check_fingerprints:
+            tests_to_run += select_stale_tests(
+                coverage_file, coverage_map, changed_files
+            )
+        if isinstance(coverage_map, (CoverageMap, CompactMap)):
+            collapse_parametrized(tests_to_run, coverage_map.node_ids())
+        return tests_to_run
@@ -1,9 +1,12 @@
+from __future__ import annotations
+
 import logging
 from pathlib import Path
 
 import pytest
 
-from skippy_cov.__main__ import run
+# This plugin is loaded on every pytest session through the `pytest11` entry point,
+# so anything heavier than pytest itself is imported only once skippy-cov is enabled.
 
 logger = logging.getLogger(__name__)
 
@@ -28,9 +31,102 @@ def pytest_addoption(parser):
     group.addoption(
         "--skippy-cov-coverage-file",
         required=False,
-        help="Path to the coverage file (.coverage sqlite database).",
+        help="Path to the coverage file (.coverage sqlite database, the default).",
         type=Path,
-        default=Path(".coverage"),
+        default=None,
+    )
+    group.addoption(
+        "--skippy-cov-coverage-store",
+        required=False,
+        help="Map store (a directory) to take the coverage from when "
+        "--skippy-cov-coverage-file isn't given: the map of the nearest ancestor of "
+        "the merge-base, diffing from its commit.",
+        default=None,
+    )
+    group.addoption(
+        "--skippy-cov-path-prefix",
+        required=False,
+        dest="skippy_cov_path_prefixes",
+        help="Prefix to remove from the paths recorded in the coverage file, when it "
+        "was collected somewhere else (e.g. '/builds/*/'). Can be repeated.",
+        action="append",
+        default=None,
+    )
+    group.addoption(
+        "--skippy-cov-env",
+        required=False,
+        help="Only use the coverage recorded in this environment, for coverage files "
+        "combining several ones tagged with a static context (default: all of them).",
+        default=None,
+    )
+    group.addoption(
+        "--skippy-cov-coverage-manifest",
+        required=False,
+        help="Path to a TOML manifest mapping path prefixes to coverage files, "
+        "for monorepos. Takes precedence over --skippy-cov-coverage-file.",
+        type=Path,
+        default=None,
+    )
+    group.addoption(
+        "--skippy-cov-working-tree",
+        required=False,
+        dest="skippy_cov_working_tree",
+        action="store_true",
+        help="Select for the local changes (staged, unstaged and untracked files) "
+        "instead of --skippy-cov-diff",
+    )
+    group.addoption(
+        "--skippy-cov-validate",
+        required=False,
+        dest="skippy_cov_validate",
+        action="store_true",
+        help="Drop the selected tests that no longer exist (renamed or removed "
+        "since the coverage was collected)",
+    )
+    group.addoption(
+        "--skippy-cov-check-fingerprints",
+        required=False,
+        dest="skippy_cov_check_fingerprints",
+        action="store_true",
+        help="Also select the tests of files that changed since the coverage was collected",
+    )
+    group.addoption(
+        "--skippy-cov-arcs",
+        required=False,
+        dest="skippy_cov_arcs",
+        action="store_true",
+        help="Only select the tests that ran the changed lines, according to the "
+        "branch coverage arcs",
+    )
+    group.addoption(
+        "--skippy-cov-canary",
+        required=False,
+        help="Also run this fraction (e.g. 0.05) of the tests the selection left out, "
+        "reported separately: a failing canary is a test the selection missed.",
+        type=float,
+        default=None,
+    )
+    group.addoption(
+        "--skippy-cov-canary-max-tests",
+        required=False,
+        help="Maximum number of canary tests.",
+        type=int,
+        default=None,
+    )
+    group.addoption(
+        "--skippy-cov-canary-max-duration",
+        required=False,
+        help="Maximum recorded duration of the canary tests, in seconds "
+        "(skippy-cov maps only).",
+        type=float,
+        default=None,
+    )
+    group.addoption(
+        "--skippy-cov-canary-seed",
+        required=False,
+        help="Seed of the canary sample (default: derived from the changed files).",
+        type=int,
+        default=None,
     )
     group.addoption(
         "--skippy-cov-keep-prefix",
@@ -46,6 +142,52 @@ def pytest_addoption(parser):
         action="store_false",
         help="When using --skippy-cov-relative-to, determine if the original path should be kept or removed",
     )
+    group.addoption(
+        "--skippy-cov-socket",
+        required=False,
+        help="Unix socket of a `skippy-cov serve` daemon, used when it's running "
+        "(default: .skippy-cov.sock).",
+        type=Path,
+        default=None,
+    )
+    group.addoption(
+        "--skippy-cov-pipeline",
+        required=False,
+        dest="skippy_cov_pipeline",
+        action="store_true",
+        help="Overlap the git diff, the coverage loading and the selection of each changed file",
+    )
+    group.addoption(
+        "--skippy-cov-selection-file",
+        required=False,
+        help="Run the tests listed in this file (as written by `skippy-cov --output`) "
+        "instead of computing the selection.",
+        type=Path,
+        default=None,
+    )
+    group.addoption(
+        "--skippy-cov-collect",
+        required=False,
+        help="Record the functions executed by each test and save them as a "
+        "skippy-cov map in this file (a lighter alternative to --cov-context=test).",
+        type=Path,
+        default=None,
+    )
+    group.addoption(
+        "--skippy-cov-collect-slice",
+        required=False,
+        help="RUN/N: only collect the RUN-th (modulo N) slice of the tests, merging "
+        "them into the existing --skippy-cov-collect map.",
+        default=None,
+    )
+    group.addoption(
+        "--skippy-cov-collect-data-files",
+        required=False,
+        dest="skippy_cov_collect_data_files",
+        action="store_true",
+        help="Also record the project files (templates, fixtures, ...) each test "
+        "opens in the --skippy-cov-collect map.",
+    )
 
 
 @pytest.hookimpl(tryfirst=True)
@@ -57,24 +199,141 @@ def pytest_configure(config):
     diff_arg = config.getoption("skippy_cov_diff")
     cov_file = config.getoption("skippy_cov_coverage_file")
     keep_prefix = config.getoption("skippy_cov_keep_prefix")
+    manifest = config.getoption("skippy_cov_coverage_manifest")
+    check_fingerprints = config.getoption("skippy_cov_check_fingerprints")
+    working_tree = config.getoption("skippy_cov_working_tree")
+    validate = config.getoption("skippy_cov_validate")
+    arcs = config.getoption("skippy_cov_arcs")
+    path_prefixes = config.getoption("skippy_cov_path_prefixes")
+    env = config.getoption("skippy_cov_env")
+    socket_path = config.getoption("skippy_cov_socket")
+    pipeline = config.getoption("skippy_cov_pipeline")
+    selection_file = config.getoption("skippy_cov_selection_file")
+    collect = config.getoption("skippy_cov_collect")
+    collect_slice = config.getoption("skippy_cov_collect_slice")
+    if collect:
+        from skippy_cov.collector import Collector
+        from skippy_cov.rotation import parse_slice
+
+        slice_ = parse_slice(collect_slice) if collect_slice else None
+        data_files = config.getoption("skippy_cov_collect_data_files")
+        config.pluginmanager.register(
+            Collector(collect, config.rootpath, slice_, data_files),
+            "skippy-cov-collector",
+        )
     if not skippy_cov:
         return
 
+    if selection_file:
+        selected_tests = read_selection_file(selection_file)
+        if not selected_tests:
+            pytest.exit("skippy-cov: couldn't find any tests to filter.", returncode=5)
+        config.args = selected_tests
+        return
+
     # Import get_diff_content from __main__ to match CLI logic
-    from skippy_cov.__main__ import get_diff_content
+    from skippy_cov.__main__ import (
+        get_diff_content,
+        get_working_tree_diff,
+        process_selection,
+        resolve_coverage_file,
+        run,
+        run_pipelined,
+    )
+    from skippy_cov.server import DEFAULT_SOCKET
 
-    diff_content = (
-        get_diff_content(diff_arg) if diff_arg is not None else get_diff_content(None)
+    cov_file, diff_arg = resolve_coverage_file(
+        cov_file, config.getoption("skippy_cov_coverage_store"), diff_arg
     )
 
+    canary = make_canary_sampler(config)
     relative_to = [Path(x) for x in config.args if x]
-    selected_tests = run(
-        diff_content,
-        cov_file,
-        relative_to,
-        keep_prefix,
-    )
+    if pipeline and not (manifest or working_tree or canary):
+        selected_tests = run_pipelined(
+            diff_arg,
+            cov_file,
+            relative_to,
+            keep_prefix,
+            validate=validate,
+            arcs=arcs,
+            path_prefixes=path_prefixes,
+            env=env,
+            check_fingerprints=check_fingerprints,
+        )
+    else:
+        if working_tree:
+            diff_content = get_working_tree_diff()
+        else:
+            diff_content = get_diff_content(diff_arg)
+        selected_tests = run(
+            diff_content,
+            cov_file,
+            relative_to,
+            keep_prefix,
+            socket_path=socket_path or DEFAULT_SOCKET,
+            manifest=manifest,
+            check_fingerprints=check_fingerprints,
+            validate=validate,
+            arcs=arcs,
+            canary=canary,
+            path_prefixes=path_prefixes,
+            env=env,
+        )
+    if canary and canary.sampled:
+        # the node ids pytest reports, with the same `--strip-prefix` as the selection
+        canaries = process_selection(canary.candidates(), relative_to, keep_prefix)
+        config.pluginmanager.register(
+            CanaryReporter(canaries), "skippy-cov-canary-reporter"
+        )
     if selected_tests:
         config.args = selected_tests
     else:
         pytest.exit("skippy-cov: couldn't find any tests to filter.", returncode=5)
+
+
+def make_canary_sampler(config):
+    rate = config.getoption("skippy_cov_canary")
+    if not rate:
+        return None
+    from skippy_cov.canary import CanarySampler
+
+    return CanarySampler(
+        rate,
+        config.getoption("skippy_cov_canary_max_tests"),
+        config.getoption("skippy_cov_canary_max_duration"),
+        config.getoption("skippy_cov_canary_seed"),
+    )
+
+
+class CanaryReporter:
+    """
+    Reports the canary tests separately at the end of the session. They weren't
+    selected by the diff, so every failing one is a miss of the selection.
+    """
+
+    def __init__(self, canaries: set[str]):
+        self.canaries = canaries
+        self.ran: set[str] = set()
+        self.failed: set[str] = set()
+
+    def pytest_runtest_logreport(self, report: pytest.TestReport) -> None:
+        if report.nodeid in self.canaries:
+            self.ran.add(report.nodeid)
+            if report.failed:
+                self.failed.add(report.nodeid)
+
+    def pytest_terminal_summary(self, terminalreporter) -> None:
+        terminalreporter.write_sep("-", "skippy-cov canaries")
+        terminalreporter.write_line(
+            f"{len(self.ran)} canary test(s) ran, {len(self.failed)} failed"
+        )
+        for node_id in sorted(self.failed):
+            terminalreporter.write_line(f"MISSED {node_id}")
+
+
+def read_selection_file(path: Path) -> list[str]:
+    """
+    Reads the node ids written by `skippy-cov --output`, one per line
+    """
+    with path.open() as selection:
+        return [line.strip() for line in selection if line.strip()]
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import argparse
+import sys
+import zlib
+from pathlib import Path
+
+from skippy_cov.compact_map import CompactMap, CompactMapError
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+class SliceError(ValueError):
+    pass
+
+
+def parse_slice(value: str) -> tuple[int, int]:
+    """
+    Parses a `RUN/N` slice specification. `RUN` can be any integer (e.g. the CI
+    run number), it's taken modulo `N` so consecutive runs rotate over the slices.
+
+    >>> parse_slice("17/8")
+    (1, 8)
+    """
+    try:
+        run, total = (int(part) for part in value.split("/"))
+    except ValueError as e:
+        raise SliceError(f"{value!r} is not a valid RUN/N slice") from e  # noqa: TRY003
+    if total < 1:
+        raise SliceError(f"{value!r}: N must be a positive number")  # noqa: TRY003
+    return (run % total, total)
+
+
+def in_slice(node_id: str, slice_: tuple[int, int]) -> bool:
+    """
+    Deterministically assigns each test to one of the N slices. It only depends
+    on the node id, so a test stays in the same slice across runs and machines.
+    """
+    index, total = slice_
+    return zlib.crc32(node_id.encode()) % total == index
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="skippy-cov stale",
+        description="List the tests of a skippy-cov map that weren't collected recently.",
+    )
+    parser.add_argument(
+        "--coverage-file",
+        required=True,
+        help="Path to the skippy-cov map (as written by --skippy-cov-collect).",
+        type=Path,
+    )
+    parser.add_argument(
+        "--max-age",
+        required=False,
+        help="Maximum age, in days, of the collected data of a test.",
+        type=float,
+        default=7.0,
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        compact_map = CompactMap(args.coverage_file)
+    except (OSError, CompactMapError) as e:
+        print(f"skippy-cov: {e}", file=sys.stderr)
+        sys.exit(1)
+    for test, age in compact_map.stale_tests(args.max_age * SECONDS_PER_DAY):
+        days = "never" if age is None else f"{age / SECONDS_PER_DAY:.1f} days"
+        print(f"{test}\t{days}")
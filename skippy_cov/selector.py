@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import logging
+from collections import defaultdict
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+from skippy_cov import select_tests_to_run
+from skippy_cov.diff_handler import DiffHandler
+from skippy_cov.node_index import DEFAULT_INDEX_FILE, NodeIndex
+from skippy_cov.server import CoverageMapCache
+from skippy_cov.utils import FileTestCandidate, filter_by_path, is_test_file
+
+logger = logging.getLogger(__name__)
+
+
+class Selector:
+    """
+    Library API for tools answering many selections in the same process.
+
+    The coverage map is loaded once (and again only when its file changes), and
+    the tests of changed test files are found through a `NodeIndex` kept in
+    memory, so a test file is only parsed again when its content changes.
+
+        selector = Selector(Path(".coverage"), arcs=True)
+        for node_id in selector.select(diff_text):
+            ...
+
+    The options have the same meaning as in the CLI.
+    """
+
+    def __init__(
+        self,
+        coverage_file: Path = Path(".coverage"),
+        arcs: bool = False,
+        check_fingerprints: bool = False,
+        validate: bool = False,
+        path_prefixes: Iterable[str] = (),
+        env: str | None = None,
+        index_file: Path = DEFAULT_INDEX_FILE,
+    ):
+        self.coverage_file = coverage_file
+        self.arcs = arcs
+        self.check_fingerprints = check_fingerprints
+        self.validate = validate
+        self.cache = CoverageMapCache(coverage_file, tuple(path_prefixes), env)
+        self.index = NodeIndex(index_file)
+
+    def discover(self, file_path: Path) -> FileTestCandidate | None:
+        """
+        Same as `discover_tests_in_file`, cached by file content
+        """
+        if not is_test_file(file_path):
+            return None
+        entry = self.index.get(file_path)
+        if entry is None:
+            return None
+        return FileTestCandidate(path=file_path, tests=set(entry["tests"]))
+
+    def select_candidates(self, diff: str | DiffHandler) -> list[FileTestCandidate]:
+        """
+        The tests to run for `diff`, its text or an already parsed `DiffHandler`
+        """
+        diff_handler = diff if isinstance(diff, DiffHandler) else DiffHandler(diff)
+        coverage_map = self.cache.get()
+        candidates = select_tests_to_run(
+            diff_handler, coverage_map, self.arcs, self.discover
+        )
+        if self.check_fingerprints:
+            from skippy_cov.fingerprints import select_stale_tests
+
+            candidates += select_stale_tests(
+                self.coverage_file, coverage_map, diff_handler.changed_files
+            )
+        if self.validate:
+            candidates = self.index.validate(candidates)
+        return candidates
+
+    def select(
+        self, diff: str | DiffHandler, relative_to: list[Path] | None = None
+    ) -> Iterator[str]:
+        """
+        The node ids of the tests to run for `diff`, one at a time and sorted,
+        without building the whole list of them. With `relative_to`, only the
+        tests in those folders.
+        """
+        candidates = self.select_candidates(diff)
+        if relative_to:
+            candidates = filter_by_path(candidates, relative_to)
+        tests_by_file: defaultdict[Path, set[str]] = defaultdict(set)
+        for candidate in candidates:
+            tests_by_file[candidate.path] |= candidate.tests
+        for path, tests in sorted(tests_by_file.items()):
+            for test in sorted(tests):
+                yield f"{path.as_posix()}::{test}"
+
+    def save(self) -> None:
+        """
+        Writes the test file index, for the next process to start warm
+        """
+        self.index.save()
@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import socket
+import socketserver
+from collections.abc import Iterable
+from pathlib import Path
+
+from skippy_cov import select_tests_to_run
+from skippy_cov.diff_handler import DiffHandler
+from skippy_cov.utils import CoverageLookup, FileTestCandidate, load_coverage_map
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET = Path(".skippy-cov.sock")
+
+
+class CoverageMapCache:
+    """
+    Keeps a coverage map loaded in memory and reloads it whenever the
+    underlying coverage file changes on disk.
+    """
+
+    def __init__(
+        self,
+        filepath: Path,
+        path_prefixes: Iterable[str] = (),
+        env: str | None = None,
+    ):
+        self.filepath = filepath
+        self.path_prefixes = path_prefixes
+        self.env = env
+        self._stamp: tuple[int, int] | None = None
+        self._coverage_map: CoverageLookup | None = None
+
+    def _current_stamp(self) -> tuple[int, int] | None:
+        try:
+            stat = self.filepath.stat()
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def get(self) -> CoverageLookup:
+        stamp = self._current_stamp()
+        if self._coverage_map is None or stamp != self._stamp:
+            logger.info(f"Loading coverage map from '{self.filepath}'")
+            self._coverage_map = load_coverage_map(
+                self.filepath, self.path_prefixes, self.env
+            )
+            self._stamp = stamp
+        return self._coverage_map
+
+
+class SelectionRequestHandler(socketserver.StreamRequestHandler):
+    server: SelectionServer
+
+    def handle(self) -> None:
+        """
+        Answers a single selection query.
+
+        The request is one JSON line with the client `cwd`, the `coverage_file`
+        it expects to be used and the `diff` contents. The response is one JSON
+        line with either the selected `candidates` (test file -> tests) or an
+        `error` message.
+        """
+        line = self.rfile.readline()
+        try:
+            request = json.loads(line)
+            response = self.server.select(request)
+        except Exception as e:
+            logger.exception("Failed to answer selection request")
+            response = {"error": str(e)}
+        self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+class SelectionServer(socketserver.UnixStreamServer):
+    def __init__(self, socket_path: Path, coverage_file: Path):
+        self.socket_path = socket_path
+        self.coverage_file = coverage_file.resolve()
+        self.cwd = Path.cwd().resolve()
+        self.cache = CoverageMapCache(coverage_file)
+        super().__init__(str(socket_path), SelectionRequestHandler)
+
+    def select(self, request: dict) -> dict:
+        if Path(request["cwd"]).resolve() != self.cwd:
+            return {"error": f"server is running in '{self.cwd}'"}
+        if Path(request["coverage_file"]).resolve() != self.coverage_file:
+            return {"error": f"server is using '{self.coverage_file}'"}
+        candidates = select_tests_to_run(DiffHandler(request["diff"]), self.cache.get())
+        return {
+            "candidates": [
+                [candidate.path.as_posix(), sorted(candidate.tests)]
+                for candidate in candidates
+            ]
+        }
+
+
+def query_server(
+    socket_path: Path,
+    diff: str,
+    coverage_file: Path,
+    timeout: float = 30.0,
+) -> list[FileTestCandidate] | None:
+    """
+    Asks a running `skippy-cov serve` daemon for the tests to run.
+
+    Returns None when there's no server listening on `socket_path` or it can't
+    answer for this working directory and coverage file, so the caller can fall
+    back to computing the selection itself.
+    """
+    if not hasattr(socket, "AF_UNIX") or not socket_path.exists():
+        return None
+    request = {
+        "cwd": str(Path.cwd()),
+        "coverage_file": str(coverage_file),
+        "diff": diff,
+    }
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(str(socket_path))
+            sock.sendall(json.dumps(request).encode() + b"\n")
+            with sock.makefile("rb") as stream:
+                response = json.loads(stream.readline())
+    except (OSError, ValueError) as e:
+        logger.info(f"Could not query skippy-cov server at '{socket_path}': {e}")
+        return None
+    if "error" in response:
+        logger.info(f"skippy-cov server refused the query: {response['error']}")
+        return None
+    logger.debug(f"Selection answered by skippy-cov server at '{socket_path}'")
+    return [
+        FileTestCandidate(path=Path(path), tests=set(tests))
+        for path, tests in response["candidates"]
+    ]
+
+
+def _remove_stale_socket(socket_path: Path) -> None:
+    if not socket_path.exists():
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(str(socket_path))
+        except OSError:
+            socket_path.unlink()
+            return
+    raise RuntimeError(  # noqa: TRY003
+        f"another skippy-cov server is already listening on '{socket_path}'"
+    )
+
+
+def serve(socket_path: Path, coverage_file: Path) -> None:
+    _remove_stale_socket(socket_path)
+    with SelectionServer(socket_path, coverage_file) as server:
+        server.cache.get()  # warm up before accepting queries
+        logger.info(f"skippy-cov server listening on '{socket_path}'")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(socket_path)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="skippy-cov serve",
+        description="Keep the coverage map loaded and answer selections over a Unix socket.",
+    )
+    parser.add_argument(
+        "--coverage-file",
+        required=False,
+        help="Path to the coverage file (.coverage sqlite database).",
+        type=Path,
+        default=Path(".coverage"),
+    )
+    parser.add_argument(
+        "--socket",
+        required=False,
+        help="Path of the Unix socket to listen on.",
+        type=Path,
+        default=DEFAULT_SOCKET,
+    )
+    parser.add_argument(
+        "--debug", action="store_true", help="Enable debug logging.", default=False
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO)
+    serve(args.socket, args.coverage_file)
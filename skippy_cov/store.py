@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import abc
+import argparse
+import logging
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+from urllib.parse import urlparse
+
+from skippy_cov.__main__ import get_default_branch
+from skippy_cov.fingerprints import sidecar_path
+
+logger = logging.getLogger(__name__)
+
+# name of the maps in a store, whatever their original name
+MAP_NAME = "coverage"
+# how many ancestors of the merge-base are looked up
+MAX_ANCESTORS = 100
+
+
+class StoreError(Exception):
+    pass
+
+
+class MapStore(abc.ABC):
+    """
+    Coverage maps (`.coverage` databases or skippy-cov maps) filed under the
+    commit they were collected at. Subclasses implement a storage backend.
+    """
+
+    @abc.abstractmethod
+    def has(self, commit: str) -> bool: ...
+
+    @abc.abstractmethod
+    def fetch(self, commit: str) -> Path:
+        """
+        A local path of the map of `commit`
+        """
+
+    @abc.abstractmethod
+    def put(self, commit: str, map_file: Path) -> None: ...
+
+
+class DirectoryStore(MapStore):
+    """
+    A local (or mounted) directory, with one `<commit>/coverage` file per map
+    and its fingerprints next to it, if any
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    def _map_path(self, commit: str) -> Path:
+        return self.root / commit / MAP_NAME
+
+    def has(self, commit: str) -> bool:
+        return self._map_path(commit).is_file()
+
+    def fetch(self, commit: str) -> Path:
+        # already local, no need to copy it
+        return self._map_path(commit)
+
+    def put(self, commit: str, map_file: Path) -> None:
+        destination = self._map_path(commit)
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(map_file, destination)
+        if sidecar_path(map_file).exists():
+            shutil.copyfile(sidecar_path(map_file), sidecar_path(destination))
+
+
+# store backends by URL scheme, a plain path is a directory
+STORES = {"": DirectoryStore, "file": DirectoryStore}
+
+
+def open_store(location: str) -> MapStore:
+    url = urlparse(location)
+    # windows drive letters look like a scheme
+    scheme = "" if len(url.scheme) == 1 else url.scheme
+    if scheme not in STORES:
+        raise StoreError(f"unsupported map store '{location}'")  # noqa: TRY003
+    return STORES[scheme](Path(url.path if scheme else location))
+
+
+def _git(*args: str) -> str:
+    return subprocess.check_output(
+        ["git", *args], stderr=subprocess.DEVNULL, text=True
+    ).strip()
+
+
+def get_merge_base(branch: str) -> str:
+    """
+    The commit HEAD branched from `branch` at, or HEAD itself if unknown
+    """
+    try:
+        return _git("merge-base", "HEAD", branch)
+    except subprocess.CalledProcessError:
+        logger.info(f"No merge-base with '{branch}', looking up from HEAD")
+        return _git("rev-parse", "HEAD")
+
+
+def find_nearest_commit(
+    store: MapStore, base: str, max_ancestors: int = MAX_ANCESTORS
+) -> str | None:
+    """
+    The most recent commit with a map among `base` and its ancestors
+    """
+    ancestors = _git("rev-list", f"--max-count={max_ancestors}", base).split()
+    return next((commit for commit in ancestors if store.has(commit)), None)
+
+
+def resolve_coverage(location: str) -> tuple[Path, str]:
+    """
+    The map of the nearest ancestor of the merge-base with the default branch
+    found in the store, and the diff to select tests for: from that commit.
+    """
+    store = open_store(location)
+    try:
+        base = get_merge_base(get_default_branch())
+        commit = find_nearest_commit(store, base)
+    except subprocess.CalledProcessError as e:
+        raise StoreError(f"failed to read the git history: {e}") from e  # noqa: TRY003
+    if commit is None:
+        raise StoreError(  # noqa: TRY003
+            f"no map found in '{location}' for the last {MAX_ANCESTORS} commits "
+            f"before {base[:12]}"
+        )
+    logger.info(f"Using the map of {commit[:12]} from '{location}'")
+    return store.fetch(commit), f"{commit}...HEAD"
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="skippy-cov store",
+        description="File a coverage map in a map store under the commit it was "
+        "collected at.",
+    )
+    parser.add_argument("store", help="Map store location (a directory).")
+    parser.add_argument(
+        "--coverage-file",
+        required=False,
+        help="Path to the coverage file (.coverage sqlite database or skippy-cov map).",
+        type=Path,
+        default=Path(".coverage"),
+    )
+    parser.add_argument(
+        "--commit",
+        required=False,
+        help="Commit the coverage was collected at (default: HEAD).",
+        default="HEAD",
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        store = open_store(args.store)
+        commit = _git("rev-parse", args.commit)
+    except (StoreError, subprocess.CalledProcessError) as e:
+        print(f"skippy-cov: {e}", file=sys.stderr)
+        sys.exit(1)
+    store.put(commit, args.coverage_file)
@@ -3,31 +3,38 @@ from __future__ import annotations
 import ast
 from pathlib import Path
 
+from skippy_cov.collection_scope import CollectionScope
+from skippy_cov.utils import get_collection_scope
+
 
 class ASTTestsFinder(ast.NodeVisitor):
     """
     Visits an AST tree and collects test functions and methods
-    following basic pytest discovery conventions:
-    - Top-level functions `test_*`
-    - Classes `Test*` containing methods `test_*`
+    following pytest discovery conventions:
+    - Top-level functions matching `python_functions` (default: `test*`)
+    - Classes matching `python_classes` (default: `Test*`) containing methods
+      matching `python_functions`
         - Classes with an `__init__` method are ignored
     See: https://docs.pytest.org/en/latest/explanation/goodpractices.html#conventions-for-python-test-discovery
     """
 
-    def __init__(self, file_path: Path):
+    def __init__(self, file_path: Path, scope: CollectionScope | None = None):
         self.file_path = file_path
+        self.scope = scope or get_collection_scope()
         self.tests: set[str] = set()
+        # test classes with base classes, they may inherit tests not visible here
+        self.inheriting_classes: set[str] = set()
         self.current_class_name: str | None = None
 
     def visit_ClassDef(self, node: ast.ClassDef) -> None:
         """Visit Class Definitions."""
 
-        # TODO: consider python_classes and python_functions parameters on config
-        # SEE: https://docs.pytest.org/en/stable/example/pythoncollection.html#changing-naming-conventions
         class_has_init_method = any(
             hasattr(method, "name") and method.name == "__init__" for method in node.body
         )
-        if node.name.startswith("Test") and not class_has_init_method:
+        if self.scope.is_test_class(node.name) and not class_has_init_method:
+            if node.bases:
+                self.inheriting_classes.add(node.name)
             original_class_name = self.current_class_name
             self.current_class_name = node.name
             self.generic_visit(node)
@@ -38,9 +45,7 @@ class ASTTestsFinder(ast.NodeVisitor):
     def visit_FunctionDef(self, node: ast.FunctionDef | ast.AsyncFunctionDef) -> None:
         """Visit Function (and Method) Definitions."""
 
-        # TODO: consider python_classes and python_functions parameters on config
-        # SEE: https://docs.pytest.org/en/stable/example/pythoncollection.html#changing-naming-conventions
-        if node.name.startswith("test_"):
+        if self.scope.is_test_function(node.name):
             if self.current_class_name:
                 test_id = f"{self.current_class_name}::{node.name}"
                 self.tests.add(test_id)
@@ -1,15 +1,26 @@
 from __future__ import annotations
 
+import logging
+import re
 from collections import defaultdict
 from dataclasses import dataclass
-from fnmatch import fnmatch
 from pathlib import Path
+from typing import TYPE_CHECKING, Protocol
 
-import coverage
+if TYPE_CHECKING:
+    from collections.abc import Iterable
 
-from skippy_cov.config_handler import get_config
+    import coverage
 
-DEFAULT_GLOB_PATTERN = "test_*.py"
+    # imported when used, the pytest plugin imports `skippy_cov` in every session
+    from skippy_cov.collection_scope import CollectionScope
+    from skippy_cov.config_handler import ConfigHandler
+    from skippy_cov.diff_handler import SourceChanges
+
+logger = logging.getLogger(__name__)
+
+_scope: CollectionScope | None = None
+_scope_config: ConfigHandler | None = None
 
 
 class FilterCandidatesError(ValueError):
@@ -40,28 +51,45 @@ class FileTestCandidate:
         return tests
 
 
-def is_test_file(file_path: Path) -> bool:
+def get_collection_scope() -> CollectionScope:
     """
-    Checks if a file is a test file based on its name.
-
-    Checks if a config file is present. If so, tries to use the `python_files` key
-    from the config file.
-    Otherwise uses the default glob pattern. (test_*.py)
+    The `CollectionScope` of the current pytest configuration, compiled once
     """
+    from skippy_cov.collection_scope import CollectionScope
+    from skippy_cov.config_handler import get_config
 
-    # TODO: consider pytest flags such as `ignore`, `addopts`, etc...
-    # config_handler.ConfigHandler should already handle it,
-    #   but I want to have something working before sinking more hours into this
-    # SEE: https://docs.pytest.org/en/stable/example/pythoncollection.html#changing-naming-conventions
+    global _scope, _scope_config
     cfg = get_config()
-    if (
-        bool(cfg)
-        and (patterns := cfg.get_value("python_files"))
-        and isinstance(patterns, str)
-    ):
-        return any(fnmatch(file_path.name, pattern) for pattern in patterns.split(" "))
+    if _scope is None or cfg is not _scope_config:
+        _scope = CollectionScope(cfg)
+        _scope_config = cfg
+    return _scope
+
+
+def is_test_file(file_path: Path) -> bool:
+    """
+    Checks if a file is a test file pytest would collect, according to the
+    `python_files`, `testpaths`, `norecursedirs` and `--ignore` options of its
+    config file (see `CollectionScope`).
+    """
+    return get_collection_scope().is_test_file(file_path)
+
 
-    return fnmatch(file_path.name, DEFAULT_GLOB_PATTERN)
+def split_context(context: str) -> tuple[str | None, str]:
+    """
+    Splits the static context coverage.py puts before the test context when both
+    are set (`[run] context`), used to tag the environment the test ran in. Node
+    ids only have a `|` after their `::`, in the parametrize id.
+
+    >>> split_context("py312-pg|file.py::test_name|run")
+    ('py312-pg', 'file.py::test_name|run')
+    >>> split_context("file.py::test_name[a|b]|run")
+    (None, 'file.py::test_name[a|b]|run')
+    """
+    env, separator, rest = context.partition("|")
+    if separator and "::" not in env and "::" in rest:
+        return (env, rest)
+    return (None, context)
 
 
 def _fix_test_name(test_name: str) -> tuple[str, str]:
@@ -76,11 +104,90 @@ def _fix_test_name(test_name: str) -> tuple[str, str]:
     ('file.py', 'test_name')
     >>> _fix_test_name("file.py::class_name::test_name")
     ('file.py', 'class_name::test_name')
+    >>> _fix_test_name("py312-pg|file.py::test_name|phase_name")
+    ('file.py', 'test_name')
     """
+    _, test_name = split_context(test_name)
     rhs, lhs = test_name.rsplit("|", 1)[0].split("::", 1)
     return (rhs, lhs)
 
 
+def split_parameters(test: str) -> tuple[str, str | None]:
+    """
+    Splits the parametrize id of a test from its name
+
+    >>> split_parameters("TestA::test_x[case-17]")
+    ('TestA::test_x', 'case-17')
+    >>> split_parameters("test_x")
+    ('test_x', None)
+    """
+    name, bracket, parameters = test.partition("[")
+    if not bracket:
+        return (test, None)
+    return (name, parameters[:-1])
+
+
+def collapse_parametrized(
+    candidates: list[FileTestCandidate], node_ids: Iterable[str]
+) -> list[FileTestCandidate]:
+    """
+    Coverage is recorded per parametrized case, so only the affected cases of a
+    test are selected. They are collapsed back into the test itself when every
+    case known in `node_ids` (the tests of the coverage map) is selected, and
+    dropped when the test itself is selected anyway (e.g. its file changed).
+    """
+    known_cases: defaultdict[str, set[str]] = defaultdict(set)
+    for node_id in node_ids:
+        function, parameters = split_parameters(node_id)
+        if parameters is not None:
+            known_cases[function].add(node_id)
+
+    selected: defaultdict[Path, set[str]] = defaultdict(set)
+    for candidate in candidates:
+        selected[candidate.path] |= candidate.tests
+    selected_cases: defaultdict[str, set[str]] = defaultdict(set)
+    for path, tests in selected.items():
+        for test in tests:
+            function, parameters = split_parameters(test)
+            if parameters is not None:
+                selected_cases[f"{path.as_posix()}::{function}"].add(
+                    f"{path.as_posix()}::{test}"
+                )
+
+    for candidate in candidates:
+        tests = set()
+        for test in candidate.tests:
+            function, parameters = split_parameters(test)
+            node_id = f"{candidate.path.as_posix()}::{function}"
+            if (
+                parameters is not None
+                and function not in selected[candidate.path]
+                and selected_cases[node_id] != known_cases[node_id]
+            ):
+                tests.add(test)
+            else:
+                tests.add(function)
+        candidate.tests = tests
+    return candidates
+
+
+def filter_collected(candidates: list[FileTestCandidate]) -> list[FileTestCandidate]:
+    """
+    Drops the candidates in files pytest doesn't collect, according to its
+    configuration (see `CollectionScope`)
+    """
+    scope = get_collection_scope()
+    collected = []
+    for candidate in candidates:
+        if scope.is_collected(candidate.path):
+            collected.append(candidate)
+        else:
+            logger.debug(
+                f"Skipping tests in '{candidate.path}', pytest doesn't collect it"
+            )
+    return collected
+
+
 def filter_by_path(
     candidates: list[FileTestCandidate],
     from_folders: list[Path],
@@ -118,21 +225,258 @@ def filter_by_path(
     return filtered_candidates
 
 
+class CoverageLookup(Protocol):
+    """
+    What the selection needs from a map: the tests related to a source file
+    """
+
+    def get_tests(self, filepath: Path) -> list[FileTestCandidate]: ...
+
+
+def _alias_pattern(pattern: str) -> re.Pattern[str]:
+    """
+    Compiles a coverage.py `[paths]` pattern: a path prefix, with `*` matching
+    any single directory name, followed by a separator
+
+    >>> _alias_pattern("/builds/*/").match("/builds/123/src/a.py").end()
+    12
+    """
+    parts = re.split(r"[/\\]+", pattern.rstrip("/\\"))
+    regex = r"[/\\]".join(
+        re.escape(part).replace(re.escape("*"), r"[^/\\]*") for part in parts
+    )
+    return re.compile(regex + r"[/\\]")
+
+
+def read_path_aliases(
+    path_prefixes: Iterable[str] = (),
+) -> list[tuple[re.Pattern[str], str]]:
+    """
+    How to turn the paths recorded in a coverage database on another machine into
+    the paths of the project: the `[paths]` section of the coverage.py config
+    (every pattern of an entry is replaced with its first one) and `path_prefixes`,
+    removed from the recorded paths.
+    """
+    from coverage.config import read_coverage_config
+
+    config = read_coverage_config(config_file=True, warn=logger.warning)
+    aliases = [(_alias_pattern(prefix), "") for prefix in path_prefixes]
+    for canonical, *patterns in config.paths.values():
+        aliases.extend((_alias_pattern(pattern), canonical) for pattern in patterns)
+    return aliases
+
+
+def canonical_path(
+    path: str, aliases: list[tuple[re.Pattern[str], str]], root: Path
+) -> str:
+    """
+    The path of a recorded file relative to the project `root` (as the changed
+    files of a diff are), if it's inside it
+
+    >>> canonical_path("/builds/1/src/a.py", [(_alias_pattern("/builds/*"), "")], Path("/p"))
+    'src/a.py'
+    """
+    for pattern, canonical in aliases:
+        if match := pattern.match(path):
+            path = str(Path(canonical, path[match.end() :]))
+            break
+    file_path = Path(path)
+    if file_path.is_absolute() and root in file_path.parents:
+        file_path = file_path.relative_to(root)
+    return file_path.as_posix()
+
+
+def load_coverage_map(
+    filepath: Path, path_prefixes: Iterable[str] = (), env: str | None = None
+) -> CoverageLookup:
+    """
+    Loads either a coverage.py database or a skippy-cov compact map,
+    depending on the contents of `filepath`. `path_prefixes` and `env` only
+    apply to coverage.py databases (see `CoverageMap`).
+    """
+    try:
+        with filepath.open("rb") as f:
+            header = f.read(1)
+    except OSError:
+        header = b""
+    if header == b"{":
+        from skippy_cov.compact_map import CompactMap
+
+        if env is not None:
+            logger.warning("Environments aren't supported with skippy-cov maps")
+        return CompactMap(filepath)
+    return CoverageMap(filepath, path_prefixes, env)
+
+
 class CoverageMap:
+    """
+    A coverage.py database collected with test contexts.
+
+    The database may have been recorded on another machine (e.g. in CI, with
+    absolute paths like `/builds/123/src/app.py`), so the recorded paths are
+    indexed once by their path relative to the current directory, after applying
+    the `[paths]` aliases of the coverage.py config and `path_prefixes` (see
+    `read_path_aliases`).
+
+    A database can hold the coverage of several environments (python versions,
+    database backends, ...): each one collected with its name as static context
+    (`[run] context`) and combined with `coverage combine`. With an `env`, only
+    the tests run in that environment are selected, otherwise the union of all.
+    """
+
     db: coverage.CoverageData
 
-    def __init__(self, filepath: Path):
-        self.db = coverage.CoverageData(filepath.name)
+    def __init__(
+        self,
+        filepath: Path,
+        path_prefixes: Iterable[str] = (),
+        env: str | None = None,
+    ):
+        import coverage  # heavy, only loaded when a map is actually needed
+
+        self.filepath = filepath
+        self.env = env
+        self.db = coverage.CoverageData(str(filepath))
         self.db.read()
+        if env is not None:
+            environments = self.environments()
+            if env not in environments:
+                logger.warning(
+                    f"No coverage recorded for environment '{env}' in '{filepath}' "
+                    f"(found: {', '.join(sorted(environments)) or 'none'})"
+                )
+            self.db.set_query_contexts([f"^{re.escape(env)}\\|"])
+        aliases = read_path_aliases(path_prefixes)
+        root = Path.cwd().resolve()
+        # recorded path -> project path, and back: databases combined from
+        # several machines record the same file under several paths
+        self.canonical_paths = {
+            measured: canonical_path(measured, aliases, root)
+            for measured in self.db.measured_files()
+        }
+        self.measured_paths: defaultdict[str, list[str]] = defaultdict(list)
+        for measured, canonical in self.canonical_paths.items():
+            self.measured_paths[canonical].append(measured)
+
+    def _measured_paths(self, filepath: Path) -> list[str]:
+        path = filepath.as_posix()
+        return self.measured_paths.get(path) or [path]
+
+    def in_env(self, context: str) -> bool:
+        """
+        Whether the test context was recorded in the selected environment, if any
+        """
+        return self.env is None or split_context(context)[0] == self.env
+
+    def environments(self) -> set[str]:
+        return {
+            env
+            for env, _ in map(split_context, self.db.measured_contexts())
+            if env is not None
+        }
+
+    def node_ids(self) -> set[str]:
+        return {
+            "::".join(_fix_test_name(context))
+            for context in self.db.measured_contexts()
+            if "::" in context and self.in_env(context)
+        }
 
     def get_tests(self, filepath: Path) -> list[FileTestCandidate]:
+        """
+        The tests that ran any line of the project file `filepath`. A database
+        combined from several machines records it under several paths (see
+        `canonical_path`), the tests of all of them are merged. A file the
+        database doesn't know is looked up as is.
+        """
         found_tests: defaultdict[Path, set[str]] = defaultdict(set)
-        for line_tests in self.db.contexts_by_lineno(filepath.as_posix()).values():
-            for test in line_tests:
-                if test:
-                    src, test = _fix_test_name(test)
-                    found_tests[Path(src)].add(test)
+        for measured in self._measured_paths(filepath):
+            for line_tests in self.db.contexts_by_lineno(measured).values():
+                for test in line_tests:
+                    # code run outside of the tests (e.g. imports during the
+                    # collection) has no test context, or only the static one
+                    if "::" in test:
+                        src, test = _fix_test_name(test)
+                        found_tests[Path(src)].add(test)
         return [
             FileTestCandidate(path=filepath, tests=tests)
             for (filepath, tests) in found_tests.items()
         ]
+
+    def get_arc_tests(
+        self, filepath: Path, changes: SourceChanges
+    ) -> list[FileTestCandidate] | None:
+        """
+        The tests that ran the changed code of `filepath`, according to the arcs
+        (jumps between lines) recorded with branch coverage: the ones that ran a
+        removed line, or went through the spot where lines were added. A line added
+        inside one branch of an `if` only selects the tests that took that branch,
+        not all the tests that evaluated the condition.
+
+        Returns None if the coverage was collected without branch coverage.
+        """
+        import sqlite3
+
+        if not self.db.has_arcs():
+            return None
+        measured = self._measured_paths(filepath)
+        placeholders = ", ".join("?" * len(measured))
+        query = (
+            "SELECT context.context, arc.fromno, arc.tono FROM arc "  # noqa: S608 only placeholders
+            "JOIN file ON file.id = arc.file_id "
+            "JOIN context ON context.id = arc.context_id "
+            f"WHERE file.path IN ({placeholders})"
+        )
+        with sqlite3.connect(f"file:{self.filepath}?mode=ro", uri=True) as connection:
+            arcs = connection.execute(query, measured).fetchall()
+        # negative line numbers are the entry and exit of a code object
+        lines = {abs(line) for _, start, end in arcs for line in (start, end)}
+        # non executable lines (comments, continuation lines) changed are handled
+        # as changes between the executable lines around them
+        gaps = [
+            (
+                max((line for line in lines if line <= gap), default=None),
+                min((line for line in lines if line > gap), default=None),
+            )
+            for gap in changes.inserted_after | (changes.removed - lines)
+        ]
+
+        # lines jumping to more than one place (`if`, `for`, `while`, ...)
+        destinations: defaultdict[int, set[int]] = defaultdict(set)
+        for _, start, end in arcs:
+            destinations[start].add(end)
+        branches = {line for line, ends in destinations.items() if len(ends) > 1}
+
+        found_tests: defaultdict[Path, set[str]] = defaultdict(set)
+        for context, start, end in arcs:
+            if "::" not in context or not self.in_env(context):
+                continue
+            if (
+                abs(start) in changes.removed
+                or abs(end) in changes.removed
+                or any(_goes_through(start, end, *gap, branches) for gap in gaps)
+            ):
+                src, test = _fix_test_name(context)
+                found_tests[Path(src)].add(test)
+        return [
+            FileTestCandidate(path=filepath, tests=tests)
+            for (filepath, tests) in found_tests.items()
+        ]
+
+
+def _goes_through(
+    start: int, end: int, before: int | None, after: int | None, branches: set[int]
+) -> bool:
+    """
+    Whether the arc `start` -> `end` passes between the consecutive executable
+    lines `before` and `after`: it arrives at `after` (wherever it comes from, the
+    lines in between may start a block, like an `else:`), or it leaves `before`.
+    When `before` is in `branches` the lines in between are the start of one of
+    its branches, so only the arcs leaving it without skipping them count:
+    returning from the code object, or jumping back to the start of a loop.
+    """
+    if end == after:
+        return True
+    if before is None or abs(start) != before:
+        return False
+    return before not in branches or end < 0 or end <= before
@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import argparse
+import contextlib
+import difflib
+import logging
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from skippy_cov import select_tests_to_run
+from skippy_cov.compact_map import CompactMap
+from skippy_cov.dependencies import is_dependency_file
+from skippy_cov.diff_handler import DiffHandler
+from skippy_cov.server import CoverageMapCache
+from skippy_cov.utils import CoverageLookup, CoverageMap, is_test_file
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 0.5
+
+
+def mapped_files(coverage_map: CoverageLookup) -> set[Path]:
+    """
+    The project files the coverage map knows about: the files its tests ran,
+    opened or imported, and the test files themselves
+    """
+    paths: set[str] = set()
+    if isinstance(coverage_map, CompactMap):
+        paths.update(coverage_map.files, coverage_map.data_files, coverage_map.imports)
+    elif isinstance(coverage_map, CoverageMap):
+        paths.update(coverage_map.measured_paths)
+    if isinstance(coverage_map, (CompactMap, CoverageMap)):
+        paths.update(node_id.split("::")[0] for node_id in coverage_map.node_ids())
+    return {Path(path) for path in paths if not Path(path).is_absolute()}
+
+
+def dependency_files(root: Path) -> set[Path]:
+    """
+    The requirements, `pyproject.toml` and lockfiles at the top of `root`
+    """
+    candidates = [*root.glob("*"), *root.glob("requirements/*")]
+    return {
+        path.relative_to(root)
+        for path in candidates
+        if is_dependency_file(path) and path.is_file()
+    }
+
+
+def make_file_diff(path: Path, old: str | None, new: str | None) -> str:
+    """
+    Builds a unified diff for a single file between two states of its contents.
+    `None` means the file didn't exist in that state.
+    """
+    return "\n".join(
+        difflib.unified_diff(
+            (old or "").splitlines(),
+            (new or "").splitlines(),
+            fromfile=f"a/{path.as_posix()}" if old is not None else "/dev/null",
+            tofile=f"b/{path.as_posix()}" if new is not None else "/dev/null",
+            lineterm="",
+        )
+    )
+
+
+class Watcher:
+    """
+    Polls the files the coverage map knows about (and the dependency files) and,
+    for every batch of saved files, selects the tests impacted by the changes
+    since the previous batch.
+
+    The coverage map is kept in memory (and reloaded when the coverage file
+    changes) and only the modification times of the watched files are kept: a
+    changed file is diffed against its committed version the first time, and
+    against its last seen contents afterwards. New test files are found by
+    listing the directories of the known ones.
+    """
+
+    def __init__(self, root: Path, coverage_file: Path):
+        self.root = root
+        self.cache = CoverageMapCache(coverage_file)
+        self.stamps: dict[Path, tuple[int, int] | None] = {}
+        # only the files changed since the watcher started
+        self.contents: dict[Path, str | None] = {}
+        self.test_dirs: set[Path] = {Path()}
+        self.ignored: set[Path] = set()
+        self._coverage_map: CoverageLookup | None = None
+        self._watch(dependency_files(root))
+        self._refresh()
+
+    def _stat(self, path: Path) -> tuple[int, int] | None:
+        try:
+            stat = (self.root / path).stat()
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _read(self, path: Path) -> str | None:
+        try:
+            return (self.root / path).read_text(errors="replace")
+        except OSError:
+            return None
+
+    def _baseline(self, path: Path) -> str | None:
+        if path in self.contents:
+            return self.contents[path]
+        try:
+            return subprocess.check_output(
+                ["git", "show", f"HEAD:{path.as_posix()}"],
+                cwd=self.root,
+                stderr=subprocess.DEVNULL,
+                text=True,
+                errors="replace",
+            )
+        except (OSError, subprocess.CalledProcessError):
+            # not a git repository, or an untracked file
+            return None
+
+    def _watch(self, paths: Iterable[Path], new: bool = False) -> None:
+        for path in paths:
+            if path not in self.stamps:
+                self.stamps[path] = None if new else self._stat(path)
+
+    def _refresh(self) -> None:
+        coverage_map = self.cache.get()
+        if coverage_map is not self._coverage_map:
+            self._coverage_map = coverage_map
+            paths = mapped_files(coverage_map)
+            self._watch(paths)
+            self.test_dirs.update(path.parent for path in paths if is_test_file(path))
+        for directory in self.test_dirs:
+            try:
+                entries = [
+                    directory / entry.name
+                    for entry in os.scandir(self.root / directory)
+                    if entry.is_file()
+                ]
+            except OSError:
+                continue
+            for path in entries:
+                if path in self.stamps or path in self.ignored:
+                    continue
+                if is_test_file(path):
+                    self._watch([path], new=True)
+                else:
+                    self.ignored.add(path)
+
+    def poll(self) -> str:
+        """
+        Returns the diff of every watched file changed since the last poll
+        """
+        self._refresh()
+        diffs = []
+        for path, stamp in self.stamps.items():
+            current = self._stat(path)
+            if current == stamp:
+                continue
+            self.stamps[path] = current
+            old = self._baseline(path)
+            new = self._read(path) if current is not None else None
+            self.contents[path] = new
+            if old != new and (diff := make_file_diff(path, old, new)):
+                diffs.append(diff)
+        return "\n".join(diffs)
+
+    def select(self, diff: str) -> set[str]:
+        selected = set()
+        for candidate in select_tests_to_run(DiffHandler(diff), self.cache.get()):
+            selected |= candidate.as_set()
+        return selected
+
+    def watch(self, pytest_args: list[str], interval: float = DEFAULT_INTERVAL) -> None:
+        logger.info(f"Watching '{self.root}' for changes...")
+        while True:
+            time.sleep(interval)
+            diff = self.poll()
+            if not diff:
+                continue
+            tests = self.select(diff)
+            if not tests:
+                logger.info("No tests impacted by the latest changes.")
+                continue
+            logger.info(f"Running {len(tests)} impacted test(s)...")
+            subprocess.run(
+                [sys.executable, "-m", "pytest", *pytest_args, *sorted(tests)],
+                cwd=self.root,
+            )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="skippy-cov watch",
+        description="Re-run only the tests impacted by each saved file.",
+    )
+    parser.add_argument(
+        "--coverage-file",
+        required=False,
+        help="Path to the coverage file (.coverage sqlite database).",
+        type=Path,
+        default=Path(".coverage"),
+    )
+    parser.add_argument(
+        "--interval",
+        required=False,
+        help="Seconds between polls of the working tree.",
+        type=float,
+        default=DEFAULT_INTERVAL,
+    )
+    parser.add_argument(
+        "--debug", action="store_true", help="Enable debug logging.", default=False
+    )
+    parser.add_argument(
+        "pytest_args",
+        nargs="*",
+        help="Extra arguments for pytest, after `--`.",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO)
+    watcher = Watcher(Path.cwd(), args.coverage_file)
+    with contextlib.suppress(KeyboardInterrupt):
+        watcher.watch(args.pytest_args, args.interval)
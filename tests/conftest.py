@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import subprocess
+from pathlib import Path
+from typing import Callable
+
+import coverage
+import pytest
+
+
+@pytest.fixture
+def workdir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """
+    `tmp_path`, as the current directory
+    """
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def write_coverage() -> Callable[..., Path]:
+    """
+    Writes a `.coverage` database from the lines each context ran, by file:
+
+        write_coverage({"test_foo.py::test_foo|run": {"foo.py": [1, 2]}})
+
+    `path` is relative to the current directory. With `append`, the contexts are
+    added to the existing database instead of replacing it.
+    """
+
+    def write(
+        contexts: dict[str, dict[str, list[int]]],
+        path: Path = Path(".coverage"),
+        append: bool = False,
+    ) -> Path:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        db = coverage.CoverageData(str(path))
+        if append:
+            db.read()
+        for context, lines in contexts.items():
+            db.set_context(context)
+            db.add_lines(lines)
+        db.write()
+        return path
+
+    return write
+
+
+@pytest.fixture
+def git_repo(workdir: Path) -> Path:
+    """
+    `workdir`, as a new git repository
+    """
+    subprocess.run(["git", "init", "-q", "-b", "main"], check=True)
+    return workdir
+
+
+@pytest.fixture
+def commit(git_repo: Path) -> Callable[..., str]:
+    """
+    Commits the given files (name: content) to `git_repo`, returns the commit sha:
+
+        commit("message", **{"foo.py": "x = 1\\n"})
+    """
+
+    def make_commit(message: str, **files: str) -> str:
+        for name, content in files.items():
+            (git_repo / name).write_text(content)
+        if files:
+            subprocess.run(["git", "add", *files], check=True)
+        subprocess.run(
+            ["git", "commit", "-q", "--allow-empty", "-m", message], check=True
+        )
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True).strip()
+
+    return make_commit
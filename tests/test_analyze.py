@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import coverage
+import pytest
+
+from skippy_cov.__main__ import main
+from skippy_cov.compact_map import CompactMap
+
+np = pytest.importorskip("numpy")
+
+from skippy_cov.analyze import CoverageMatrix  # noqa: E402
+
+COVERED_LINES = {
+    "tests/test_a.py::test_small": {"a.py": [1, 2]},
+    "tests/test_a.py::test_big": {"a.py": [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]},
+    "tests/test_a.py::test_big_copy": {"a.py": [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11]},
+    "tests/test_b.py::test_other": {"b.py": [1, 2, 200], "a.py": [1]},
+}
+
+
+@pytest.fixture(params=["lines", "arcs"])
+def coverage_file(tmp_path: Path, request: pytest.FixtureRequest) -> Path:
+    cov_file = tmp_path / ".coverage"
+    db = coverage.CoverageData(str(cov_file))
+    for test, covered in COVERED_LINES.items():
+        for phase in ("setup", "run"):
+            db.set_context(f"{test}|{phase}")
+            if request.param == "lines":
+                db.add_lines(covered)
+            else:
+                db.add_arcs({
+                    path: list(zip([-1, *lines], [*lines, -1]))
+                    for path, lines in covered.items()
+                })
+    db.write()
+    return cov_file
+
+
+def test_from_coverage_db(coverage_file: Path) -> None:
+    matrix = CoverageMatrix.load(coverage_file)
+    assert matrix.tests == list(COVERED_LINES)
+    assert matrix.sizes.tolist() == [2, 10, 11, 4]
+    assert len(matrix.line_counts) == 14
+
+
+def test_strict_subsets(coverage_file: Path) -> None:
+    matrix = CoverageMatrix.load(coverage_file)
+    # the smallest superset is reported
+    assert matrix.strict_subsets() == [(0, 1), (1, 2)]
+
+
+def test_near_duplicates(coverage_file: Path) -> None:
+    matrix = CoverageMatrix.load(coverage_file)
+    assert matrix.near_duplicates(0.9) == [[1, 2]]
+    assert matrix.near_duplicates(0.95) == []
+
+
+def test_hot_lines(coverage_file: Path) -> None:
+    matrix = CoverageMatrix.load(coverage_file)
+    hot_lines = [
+        (matrix.column_label(column), count) for column, count in matrix.hot_lines(2)
+    ]
+    assert hot_lines == [("a.py:1", 4), ("a.py:2", 3)]
+
+
+def test_from_compact_map(tmp_path: Path) -> None:
+    compact_map = CompactMap()
+    compact_map.tests = ["tests/test_a.py::test_1", "tests/test_a.py::test_2"]
+    compact_map.files = {
+        "src/a.py": {"functions": [["foo", 1, 3, [0, 1]], ["bar", 5, 8, [1]]]},
+    }
+    compact_map.save(tmp_path / "map.json")
+    matrix = CoverageMatrix.load(tmp_path / "map.json")
+    assert matrix.strict_subsets() == [(0, 1)]
+    assert matrix.column_label(matrix.hot_lines(1)[0][0]) == "src/a.py:1"
+
+
+def test_analyze_command(
+    coverage_file: Path, capsys: pytest.CaptureFixture[str]
+) -> None:
+    main(["analyze", "--coverage-file", str(coverage_file), "--hot-lines", "1"])
+    output = capsys.readouterr().out
+    assert "4 tests, 14 lines" in output
+    assert "tests/test_a.py::test_small\ttests/test_a.py::test_big\n" in output
+    assert "tests/test_a.py::test_big\ttests/test_a.py::test_big_copy\n" in output
+    assert "a.py:1\t4 tests" in output
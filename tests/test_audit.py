@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+from skippy_cov.__main__ import main
+from skippy_cov.audit import (
+    NOT_IN_MAP,
+    UNEXPLAINED,
+    UNTRACKED_FILE_TYPE,
+    _junit_node_id,
+    audit,
+    read_failures,
+)
+from skippy_cov.diff_handler import DiffHandler
+from skippy_cov.utils import FileTestCandidate
+
+JUNIT_REPORT = """<?xml version="1.0" encoding="utf-8"?>
+<testsuites><testsuite name="pytest" errors="1" failures="1" tests="3">
+<testcase classname="tests.test_foo" name="test_ok" time="0.001" />
+<testcase classname="tests.test_foo" name="test_fails[1]" time="0.001">
+<failure message="assert 1 == 2">assert 1 == 2</failure></testcase>
+<testcase classname="tests.test_bar.TestBar" name="test_error" time="0.001">
+<error message="fixture error">error</error></testcase>
+</testsuite></testsuites>
+"""
+
+
+@pytest.fixture
+def project(workdir: Path, write_coverage: Callable[..., Path]) -> Path:
+    Path("tests").mkdir()
+    Path("tests/test_foo.py").write_text("def test_fails(): ...\n")
+    write_coverage({
+        "tests/test_foo.py::test_foo|run": {"foo.py": [1, 2]},
+        "tests/test_foo.py::test_fails[1]|run": {"bar.py": [1]},
+    })
+    return workdir
+
+
+def test_junit_node_id(project: Path) -> None:
+    assert _junit_node_id("tests.test_foo", "test_x") == "tests/test_foo.py::test_x"
+    # test_bar.py doesn't exist, the test classes tell where the file ends
+    assert (
+        _junit_node_id("tests.test_bar.TestBar", "test_x")
+        == "tests/test_bar.py::TestBar::test_x"
+    )
+
+
+def test_read_failures(project: Path) -> None:
+    Path("report.xml").write_text(JUNIT_REPORT)
+    assert read_failures(Path("report.xml")) == {
+        "tests/test_foo.py::test_fails[1]",
+        "tests/test_bar.py::TestBar::test_error",
+    }
+    Path("lastfailed").write_text(json.dumps({"tests/test_foo.py::test_x": True}))
+    assert read_failures(Path("lastfailed")) == {"tests/test_foo.py::test_x"}
+
+
+def test_audit(project: Path) -> None:
+    diff = "--- a/foo.py\n+++ b/foo.py\n@@ -1,2 +1,2 @@\n-x = 1\n+x = 2\n y = 1\n"
+    failures = {
+        "tests/test_foo.py::test_foo",
+        "tests/test_foo.py::test_fails[1]",
+        "tests/test_new.py::test_new",
+    }
+    selected, escaped = audit(DiffHandler(diff), Path(".coverage"), failures)
+    assert selected == {"tests/test_foo.py::test_foo"}
+    assert escaped == {
+        "tests/test_foo.py::test_fails[1]": UNEXPLAINED,
+        "tests/test_new.py::test_new": NOT_IN_MAP,
+    }
+
+    diff += "--- a/template.html\n+++ b/template.html\n@@ -1 +1 @@\n-a\n+b\n"
+    _, escaped = audit(DiffHandler(diff), Path(".coverage"), failures)
+    assert escaped["tests/test_foo.py::test_fails[1]"] == UNTRACKED_FILE_TYPE
+
+
+def test_audit_command(project: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    Path("report.xml").write_text(JUNIT_REPORT)
+    Path("changes.diff").write_text(
+        "--- a/foo.py\n+++ b/foo.py\n@@ -1,2 +1,2 @@\n-x = 1\n+x = 2\n y = 1\n"
+    )
+    main(["audit", "report.xml", "--diff", "changes.diff", "--json"])
+    assert json.loads(capsys.readouterr().out) == {
+        "failed": 2,
+        "selected": 1,
+        "missed": [
+            {"test": "tests/test_bar.py::TestBar::test_error", "reason": NOT_IN_MAP},
+            {"test": "tests/test_foo.py::test_fails[1]", "reason": UNEXPLAINED},
+        ],
+    }
+
+
+def test_audit_fingerprints_only_when_checked(
+    project: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def select_stale_tests(*args: object) -> list[FileTestCandidate]:
+        return [FileTestCandidate(Path("tests/test_foo.py"), {"test_fails[1]"})]
+
+    monkeypatch.setattr("skippy_cov.audit.select_stale_tests", select_stale_tests)
+    diff = "--- a/foo.py\n+++ b/foo.py\n@@ -1,2 +1,2 @@\n-x = 1\n+x = 2\n y = 1\n"
+    failures = {"tests/test_foo.py::test_fails[1]"}
+    _, escaped = audit(DiffHandler(diff), Path(".coverage"), failures)
+    assert escaped == {"tests/test_foo.py::test_fails[1]": UNEXPLAINED}
+    _, escaped = audit(
+        DiffHandler(diff), Path(".coverage"), failures, check_fingerprints=True
+    )
+    assert escaped == {}
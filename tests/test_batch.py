@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+from skippy_cov.__main__ import main
+from skippy_cov.batch import BatchError, iter_commit_diffs, select_range
+from skippy_cov.utils import FileTestCandidate, load_coverage_map
+
+
+@pytest.fixture
+def repository(
+    commit: Callable[..., str], write_coverage: Callable[..., Path]
+) -> list[str]:
+    write_coverage({
+        "test_foo.py::test_foo|run": {"foo.py": [1, 2]},
+        "test_bar.py::test_bar|run": {"bar.py": [1, 2]},
+    })
+    return [
+        commit("init", **{"foo.py": "def foo():\n    return 1\n", "bar.py": "x = 1\n"}),
+        commit("foo", **{"foo.py": "def foo():\n    return 2\n"}),
+        commit("bar", **{"bar.py": "x = 2\n"}),
+    ]
+
+
+def test_iter_commit_diffs(repository: list[str]) -> None:
+    diffs = list(iter_commit_diffs("HEAD~2..HEAD"))
+    assert [commit for commit, _ in diffs] == repository[1:]
+    assert "+    return 2" in diffs[0][1]
+    assert "+x = 2" in diffs[1][1]
+
+
+def test_iter_commit_diffs_invalid_range(repository: list[str]) -> None:
+    with pytest.raises(BatchError):
+        list(iter_commit_diffs("unknown..HEAD"))
+
+
+def test_select_range(repository: list[str]) -> None:
+    coverage_map = load_coverage_map(Path(".coverage"))
+    assert list(select_range("HEAD~2..HEAD", coverage_map)) == [
+        (repository[1], [FileTestCandidate(Path("test_foo.py"), {"test_foo"})]),
+        (repository[2], [FileTestCandidate(Path("test_bar.py"), {"test_bar"})]),
+    ]
+
+
+def test_select_range_test_files(
+    repository: list[str], commit: Callable[..., str]
+) -> None:
+    first = commit("add test", **{"test_new.py": "def test_one():\n    pass\n"})
+    second = commit("add test", **{"test_new.py": "def test_two():\n    pass\n"})
+    Path("test_new.py").unlink()  # each commit is read from git, not the working tree
+    coverage_map = load_coverage_map(Path(".coverage"))
+    assert list(select_range("HEAD~2..HEAD", coverage_map)) == [
+        (first, [FileTestCandidate(Path("test_new.py"), {"test_one"})]),
+        (second, [FileTestCandidate(Path("test_new.py"), {"test_two"})]),
+    ]
+
+
+def test_select_range_command(
+    repository: list[str], capsys: pytest.CaptureFixture[str]
+) -> None:
+    main(["select-range", "HEAD~2..HEAD"])
+    assert json.loads(capsys.readouterr().out) == {
+        "commits": [
+            {"commit": repository[1], "tests": ["test_foo.py::test_foo"]},
+            {"commit": repository[2], "tests": ["test_bar.py::test_bar"]},
+        ],
+        "tests": ["test_bar.py::test_bar", "test_foo.py::test_foo"],
+    }
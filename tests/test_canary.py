@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from skippy_cov.canary import CanarySampler, covered_files, proximity
+from skippy_cov.compact_map import CompactMap
+from skippy_cov.utils import FileTestCandidate
+
+
+@pytest.fixture
+def compact_map() -> CompactMap:
+    compact_map = CompactMap()
+    compact_map.tests = [f"tests/test_{i}.py::test" for i in range(100)]
+    compact_map.collected = [[100, "abc", 1.0] for _ in compact_map.tests]
+    compact_map.files = {
+        "src/app/models.py": {"functions": [["foo", 1, 3, list(range(10))]]},
+        "src/app/views.py": {"functions": [["bar", 1, 3, list(range(10, 20))]]},
+        "lib/other.py": {"functions": [["baz", 1, 3, list(range(20, 100))]]},
+    }
+    return compact_map
+
+
+def node_ids(candidates: list[FileTestCandidate]) -> set[str]:
+    return {node_id for candidate in candidates for node_id in candidate.as_set()}
+
+
+def test_proximity() -> None:
+    assert proximity("src/app/views.py", [("src", "app")]) == 2
+    assert proximity("src/views.py", [("src", "app")]) == 1
+    assert proximity("lib/other.py", [("src", "app"), ()]) == 0
+
+
+def test_covered_files(compact_map: CompactMap) -> None:
+    assert covered_files(compact_map)["tests/test_15.py::test"] == {"src/app/views.py"}
+
+
+def test_sample_skips_selected_tests(compact_map: CompactMap) -> None:
+    selected = compact_map.get_tests(Path("src/app/models.py"))
+    sampler = CanarySampler(0.5, seed=1)
+    canaries = sampler.sample(compact_map, {Path("src/app/models.py")}, selected)
+    assert len(sampler.sampled) == 45
+    assert node_ids(canaries) == sampler.sampled
+    assert not sampler.sampled & node_ids(selected)
+
+
+def test_sample_is_deterministic(compact_map: CompactMap) -> None:
+    changed = {Path("src/app/models.py")}
+    first = CanarySampler(0.1).sample(compact_map, changed, [])
+    assert CanarySampler(0.1).sample(compact_map, changed, []) == first
+    assert CanarySampler(0.1, seed=7).sample(compact_map, changed, []) != first
+
+
+def test_sample_favours_nearby_tests(compact_map: CompactMap) -> None:
+    """
+    The 20 tests under `src/app` weigh 4 times more than the 80 others
+    """
+    nearby = 0
+    for seed in range(50):
+        sampler = CanarySampler(0.1, seed=seed)
+        sampler.sample(compact_map, {Path("src/app/models.py")}, [])
+        nearby += sum(
+            int(test.split("_")[1].split(".")[0]) < 20 for test in sampler.sampled
+        )
+    # uniform sampling would give 20% of nearby tests
+    assert nearby / (50 * 10) > 0.4
+
+
+def test_sample_caps(compact_map: CompactMap) -> None:
+    changed = {Path("src/app/models.py")}
+    sampler = CanarySampler(0.5, max_tests=3)
+    sampler.sample(compact_map, changed, [])
+    assert len(sampler.sampled) == 3
+
+    sampler = CanarySampler(0.5, max_duration=4.5)
+    sampler.sample(compact_map, changed, [])
+    assert len(sampler.sampled) == 4
+
+
+def test_sample_skips_cases_of_selected_tests() -> None:
+    compact_map = CompactMap()
+    compact_map.tests = [
+        "tests/test_a.py::test_x[1]",
+        "tests/test_a.py::test_x[2]",
+        "tests/test_a.py::test_y[1]",
+        "tests/test_a.py::test_y[2]",
+    ]
+    compact_map.collected = [[100, "abc", 1.0] for _ in compact_map.tests]
+    compact_map.files = {"src/a.py": {"functions": [["foo", 1, 3, [0, 1, 2, 3]]]}}
+    # all the cases of `test_x` are selected, collapsed to its name
+    selected = [FileTestCandidate(Path("tests/test_a.py"), {"test_x", "test_y[1]"})]
+    sampler = CanarySampler(1.0, seed=1)
+    sampler.sample(compact_map, {Path("src/a.py")}, selected)
+    assert sampler.sampled == {"tests/test_a.py::test_y[2]"}
@@ -1,9 +1,14 @@
 import os
 import subprocess
+from pathlib import Path
 
 import pytest
 
-from skippy_cov.__main__ import main
+from skippy_cov import select_tests_to_run
+from skippy_cov.__main__ import Format, display_tests, get_working_tree_diff, main
+from skippy_cov.diff_handler import DiffHandler
+from skippy_cov.plugin import read_selection_file
+from skippy_cov.utils import FileTestCandidate
 
 
 @pytest.fixture
@@ -118,3 +123,103 @@ def test_diff_default_branch(tmp_path, dummy_coverage_file, capsys):
     out = capsys.readouterr()
     assert code == 0, out
     assert "skippy-cov:" not in out.err
+
+
+def test_output_file(tmp_path, dummy_diff_file, dummy_coverage_file, capsys, mocker):
+    mocker.patch(
+        "skippy_cov.__main__.select_tests_to_run",
+        return_value=[
+            FileTestCandidate(path=Path("test_foo.py"), tests={"test_a", "test_b"})
+        ],
+    )
+    output = tmp_path / "selection.txt"
+    main([
+        "--diff",
+        str(dummy_diff_file[0]),
+        "--coverage-file",
+        str(dummy_coverage_file),
+        "--output",
+        str(output),
+    ])
+    assert capsys.readouterr().out == ""
+    assert sorted(output.read_text().splitlines()) == [
+        "test_foo.py::test_a",
+        "test_foo.py::test_b",
+    ]
+    assert read_selection_file(output) == output.read_text().splitlines()
+
+
+def test_display_tests_writes_each_file(tmp_path):
+    output = tmp_path / "selection.txt"
+
+    with output.open("w") as stream:
+
+        def candidates():
+            yield FileTestCandidate(path=Path("test_foo.py"), tests={"test_a"})
+            stream.flush()
+            # written before the next file is processed
+            assert output.read_text() == "test_foo.py::test_a"
+            yield FileTestCandidate(path=Path("test_bar.py"), tests={"test_a", "test_b"})
+            yield FileTestCandidate(path=Path("test_foo.py"), tests={"test_a"})
+
+        tests = display_tests(candidates(), Format.lines, stream)
+    assert output.read_text().splitlines() == [
+        "test_foo.py::test_a",
+        "test_bar.py::test_a",
+        "test_bar.py::test_b",
+    ]
+    assert tests == set(output.read_text().splitlines())
+
+
+def test_working_tree(tmp_path, monkeypatch, mocker):
+    monkeypatch.chdir(tmp_path)
+    subprocess.run(["git", "init", "-q", "-b", "main"], check=True)
+    Path("foo.py").write_text("def foo():\n    return 1\n")
+    Path("bar.py").write_text("def bar():\n    return 1\n")
+    subprocess.run(["git", "add", "foo.py", "bar.py"], check=True)
+    subprocess.run(["git", "commit", "-q", "-m", "init"], check=True)
+    # a staged change, an unstaged change and untracked files
+    Path("foo.py").write_text("def foo():\n    return 2\n")
+    subprocess.run(["git", "add", "foo.py"], check=True)
+    Path("bar.py").write_text("def bar():\n    return 2\n")
+    Path("tests").mkdir()
+    Path("tests/test_new.py").write_text("def test_new():\n    pass\n")
+    Path("new.py").write_text("x = 1\n")
+    read_text = mocker.spy(Path, "read_text")
+
+    diff_handler = DiffHandler(get_working_tree_diff())
+    assert diff_handler.changed_files == {
+        Path("foo.py"),
+        Path("bar.py"),
+        Path("tests/test_new.py"),
+    }
+    # new source files can't have coverage, they aren't read
+    assert Path("new.py") not in [call.args[0] for call in read_text.call_args_list]
+    assert select_tests_to_run(diff_handler, mocker.Mock(get_tests=lambda _: [])) == [
+        FileTestCandidate(path=Path("tests/test_new.py"), tests={"test_new"})
+    ]
+
+
+def test_select_moved_module(mocker):
+    """
+    A moved module is looked up by its original path, and moved test files are
+    selected under their new path
+    """
+    diff_handler = DiffHandler(
+        """diff --git a/pkg/a.py b/new/a.py
+similarity index 100%
+rename from pkg/a.py
+rename to new/a.py
+diff --git a/tests/test_a.py b/tests/new/test_a.py
+similarity index 100%
+rename from tests/test_a.py
+rename to tests/new/test_a.py
+"""
+    )
+    coverage = {
+        Path("pkg/a.py"): [FileTestCandidate(Path("tests/test_a.py"), {"test_a"})]
+    }
+    coverage_map = mocker.Mock(get_tests=lambda path: coverage.get(path, []))
+    assert select_tests_to_run(diff_handler, coverage_map) == [
+        FileTestCandidate(path=Path("tests/new/test_a.py"), tests={"test_a"})
+    ]
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import ast
+from pathlib import Path
+
+import pytest
+
+from skippy_cov.collection_scope import CollectionScope
+from skippy_cov.config_handler import ConfigHandler
+from skippy_cov.tests_finder import ASTTestsFinder
+
+PYPROJECT = """
+[tool.pytest.ini_options]
+python_files = ["check_*.py", "suites/*_suite.py"]
+python_classes = ["Check", "*Suite"]
+python_functions = ["check_"]
+testpaths = ["tests", "suites"]
+norecursedirs = ["fixtures"]
+addopts = "-ra --ignore=tests/slow --ignore-glob='tests/*_broken.py'"
+"""
+
+PYTEST_INI = """[pytest]
+python_files = check_*.py
+addopts = --ignore tests/slow
+"""
+
+
+@pytest.fixture
+def scope(tmp_path: Path) -> CollectionScope:
+    (tmp_path / "pyproject.toml").write_text(PYPROJECT)
+    return CollectionScope(ConfigHandler(tmp_path), base=tmp_path)
+
+
+@pytest.mark.parametrize(
+    ("path", "expected"),
+    [
+        ("tests/check_a.py", True),
+        ("tests/unit/check_a.py", True),
+        ("suites/api_suite.py", True),
+        ("tests/test_a.py", False),
+        ("check_a.py", False),
+        ("other/check_a.py", False),
+        ("tests/slow/check_a.py", False),
+        ("tests/check_broken.py", False),
+        ("tests/fixtures/check_a.py", False),
+    ],
+)
+def test_is_test_file(scope: CollectionScope, path: str, expected: bool) -> None:
+    assert scope.is_test_file(Path(path)) is expected
+
+
+def test_is_test_file_absolute_path(scope: CollectionScope) -> None:
+    assert scope.is_test_file(scope.base / "tests" / "check_a.py")
+
+
+def test_relative_to_subdirectory(tmp_path: Path) -> None:
+    (tmp_path / "pyproject.toml").write_text(PYPROJECT)
+    (tmp_path / "tests").mkdir()
+    scope = CollectionScope(ConfigHandler(tmp_path / "tests"), base=tmp_path / "tests")
+    assert scope.is_test_file(Path("check_a.py"))
+    assert not scope.is_test_file(Path("slow/check_a.py"))
+
+
+def test_ini_values(tmp_path: Path) -> None:
+    (tmp_path / "pytest.ini").write_text(PYTEST_INI)
+    scope = CollectionScope(ConfigHandler(tmp_path), base=tmp_path)
+    assert scope.is_test_file(Path("check_a.py"))
+    assert not scope.is_test_file(Path("tests/slow/check_a.py"))
+    # pytest's defaults
+    assert scope.is_test_class("TestA")
+    assert scope.is_test_function("testa")
+
+
+def test_defaults() -> None:
+    scope = CollectionScope(None)
+    assert scope.is_test_file(Path("tests/test_a.py"))
+    assert scope.is_test_file(Path("tests/a_test.py"))
+    assert not scope.is_test_file(Path(".venv/lib/test_a.py"))
+    assert not scope.is_test_file(Path("tests/conftest.py"))
+
+
+def test_finder_naming(scope: CollectionScope) -> None:
+    tree = ast.parse(
+        """
+def check_a():
+    pass
+
+def test_a():
+    pass
+
+class CheckA:
+    def check_b(self):
+        pass
+
+class ApiSuite:
+    def check_c(self):
+        pass
+
+class TestA:
+    def check_d(self):
+        pass
+"""
+    )
+    finder = ASTTestsFinder(Path("tests/check_a.py"), scope)
+    finder.visit(tree)
+    assert finder.tests == {"check_a", "CheckA::check_b", "ApiSuite::check_c"}
@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from skippy_cov.collector import Collector, OpenedFilesHook, make_tracer
+from skippy_cov.compact_map import CompactMap
+from skippy_cov.rotation import in_slice
+from skippy_cov.utils import FileTestCandidate, load_coverage_map
+
+SOURCE = """
+def used():
+    return 1
+
+
+def unused():
+    return 2
+"""
+
+TESTS = """
+from source import used
+
+
+def test_used():
+    assert used() == 1
+
+
+def test_other():
+    pass
+"""
+
+
+def test_record(tmp_path: Path) -> None:
+    def used() -> int:
+        return 1
+
+    collector = Collector(tmp_path / "map.json", Path(__file__).parent)
+    collector.record("tests/test_foo.py::test_foo", {used.__code__}, duration=0.25)
+    compact_map = collector.build_map()
+    assert compact_map.tests == ["tests/test_foo.py::test_foo"]
+    assert compact_map.collected[0][2] == 0.25
+    [function] = compact_map.files["test_collector.py"]["functions"]
+    assert function[0].endswith("used")
+    assert function[3] == [0]
+
+
+def test_record_ignores_files_outside_rootdir(tmp_path: Path) -> None:
+    collector = Collector(tmp_path / "map.json", tmp_path)
+    collector.record("tests/test_foo.py::test_foo", {os.path.join.__code__})
+    assert collector.build_map().files == {}
+
+
+def test_record_data_files(tmp_path: Path) -> None:
+    collector = Collector(tmp_path / "map.json", tmp_path)
+    opened = {str(tmp_path / "data.json"), str(tmp_path / "source.py"), "/etc/hosts"}
+    collector.record("tests/test_foo.py::test_foo", set(), opened)
+    assert collector.build_map().data_files == {"data.json": [0]}
+
+
+def test_opened_files_hook(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    hook = OpenedFilesHook()
+    # calling the hook directly, audit hooks can't be removed once installed
+    hook._on_event("open", ("ignored.json", "r", 0))
+    hook.start()
+    hook._on_event("open", ("data.json", "r", 0))
+    hook._on_event("open", (3, "r", 0))
+    hook._on_event("os.listdir", (".",))
+    assert hook.stop() == {str(tmp_path / "data.json")}
+
+
+def test_record_distributions(tmp_path: Path) -> None:
+    collector = Collector(tmp_path / "map.json", tmp_path)
+    collector.record("tests/test_foo.py::test_foo", {pytest.approx.__code__})
+    assert collector.build_map().distributions == {"pytest": [0]}
+
+
+@pytest.mark.skipif(
+    sys.version_info < (3, 12) and sys.gettrace() is not None,
+    reason="the settrace fallback can't run alongside another tracer",
+)
+def test_tracer_records_executed_functions() -> None:
+    def used() -> int:
+        return 1
+
+    tracer = make_tracer()
+    tracer.install()
+    try:
+        tracer.start()
+        used()
+        used()
+        executed = tracer.stop()
+    finally:
+        tracer.uninstall()
+    assert used.__code__ in executed
+
+
+def run_collector(cwd: Path, *args: str) -> None:
+    # make sure the inner session isn't measured by pytest-cov
+    env = {k: v for k, v in os.environ.items() if not k.startswith("COV_CORE")}
+    subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "pytest",
+            "-p",
+            "no:cacheprovider",
+            "-p",
+            "no:cov",
+            "--skippy-cov-collect",
+            "map.json",
+            *args,
+        ],
+        cwd=cwd,
+        env=env,
+        check=True,
+        capture_output=True,
+    )
+
+
+def test_collect_plugin(tmp_path: Path) -> None:
+    (tmp_path / "source.py").write_text(SOURCE)
+    (tmp_path / "test_source.py").write_text(TESTS)
+    run_collector(tmp_path, "test_source.py")
+    compact_map = load_coverage_map(tmp_path / "map.json")
+    assert isinstance(compact_map, CompactMap)
+    assert compact_map.get_tests(Path("source.py")) == [
+        FileTestCandidate(path=Path("test_source.py"), tests={"test_used"})
+    ]
+    functions = [function[0] for function in compact_map.files["source.py"]["functions"]]
+    assert functions == ["used"]
+
+
+def test_collect_plugin_slices(tmp_path: Path) -> None:
+    (tmp_path / "source.py").write_text(SOURCE)
+    (tmp_path / "test_source.py").write_text(TESTS)
+    tests = ["test_source.py::test_used", "test_source.py::test_other"]
+
+    run_collector(tmp_path, "--skippy-cov-collect-slice", "0/2")
+    first = CompactMap(tmp_path / "map.json")
+    assert first.tests == [test for test in tests if in_slice(test, (0, 2))]
+    assert len(first.tests) == 1
+
+    run_collector(tmp_path, "--skippy-cov-collect-slice", "1/2")
+    merged = CompactMap(tmp_path / "map.json")
+    assert sorted(merged.tests) == sorted(tests)
+    assert merged.get_tests(Path("source.py")) == [
+        FileTestCandidate(path=Path("test_source.py"), tests={"test_used"})
+    ]
+
+
+def test_collect_plugin_data_files(tmp_path: Path) -> None:
+    (tmp_path / "data.json").write_text("[1, 2]")
+    (tmp_path / "test_data.py").write_text(
+        "import json\n\n\n"
+        "def test_data():\n"
+        "    with open('data.json') as f:\n"
+        "        assert json.load(f) == [1, 2]\n\n\n"
+        "def test_other():\n"
+        "    pass\n"
+    )
+    run_collector(tmp_path, "--skippy-cov-collect-data-files", "test_data.py")
+    compact_map = CompactMap(tmp_path / "map.json")
+    assert compact_map.get_tests(Path("data.json")) == [
+        FileTestCandidate(path=Path("test_data.py"), tests={"test_data"})
+    ]
+
+
+CONSTANTS = """
+from dataclasses import dataclass
+
+LIMIT = 10
+
+
+@dataclass
+class Point:
+    x: int
+"""
+
+
+def test_collect_plugin_import_time_modules(tmp_path: Path) -> None:
+    (tmp_path / "source.py").write_text(SOURCE)
+    (tmp_path / "consts.py").write_text(CONSTANTS)
+    (tmp_path / "test_source.py").write_text("from consts import LIMIT\n" + TESTS)
+    run_collector(tmp_path, "test_source.py")
+    compact_map = load_coverage_map(tmp_path / "map.json")
+    assert isinstance(compact_map, CompactMap)
+    # no pseudo files like `<frozen os>` or `<string>`
+    assert set(compact_map.files) == {"source.py", "test_source.py"}
+    assert set(compact_map.imports) == {"consts.py", "source.py", "test_source.py"}
+    assert compact_map.get_tests(Path("consts.py")) == [
+        FileTestCandidate(path=Path("test_source.py"), tests={"test_used", "test_other"})
+    ]
+    # files executed by the tests keep their precise selection
+    assert compact_map.get_tests(Path("source.py")) == [
+        FileTestCandidate(path=Path("test_source.py"), tests={"test_used"})
+    ]
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from skippy_cov.compact_map import CompactMap, CompactMapError
+from skippy_cov.utils import CoverageMap, FileTestCandidate, load_coverage_map
+
+
+@pytest.fixture
+def compact_map() -> CompactMap:
+    compact_map = CompactMap()
+    compact_map.tests = [
+        "tests/test_a.py::test_1",
+        "tests/test_a.py::TestA::test_2",
+        "tests/test_b.py::test_3",
+    ]
+    compact_map.collected = [[100, "abc"], [100, "abc"], [200, "def"]]
+    compact_map.files = {
+        "src/a.py": {"functions": [["foo", 1, 3, [0, 1]], ["bar", 5, 8, [2]]]},
+        "src/b.py": {"functions": [["baz", 1, 3, [2]]]},
+    }
+    compact_map.distributions = {"requests": [0, 2], "idna": [1]}
+    compact_map.data_files = {"templates/a.html": [1]}
+    return compact_map
+
+
+def test_get_tests(compact_map: CompactMap) -> None:
+    assert sorted(compact_map.get_tests(Path("src/a.py"))) == [
+        FileTestCandidate(
+            path=Path("tests/test_a.py"), tests={"test_1", "TestA::test_2"}
+        ),
+        FileTestCandidate(path=Path("tests/test_b.py"), tests={"test_3"}),
+    ]
+    assert compact_map.get_tests(Path("src/unknown.py")) == []
+
+
+def test_get_tests_data_file(compact_map: CompactMap) -> None:
+    assert compact_map.get_tests(Path("templates/a.html")) == [
+        FileTestCandidate(path=Path("tests/test_a.py"), tests={"TestA::test_2"}),
+    ]
+
+
+def test_get_distribution_tests(compact_map: CompactMap) -> None:
+    assert sorted(compact_map.get_distribution_tests({"idna", "unknown"})) == [
+        FileTestCandidate(path=Path("tests/test_a.py"), tests={"TestA::test_2"}),
+    ]
+
+
+def test_save_and_load(compact_map: CompactMap, tmp_path: Path) -> None:
+    compact_map.save(tmp_path / "map.json")
+    loaded = load_coverage_map(tmp_path / "map.json")
+    assert isinstance(loaded, CompactMap)
+    assert loaded.tests == compact_map.tests
+    assert loaded.files == compact_map.files
+    assert loaded.distributions == compact_map.distributions
+    assert loaded.data_files == compact_map.data_files
+
+
+def test_load_coverage_database(tmp_path: Path) -> None:
+    assert isinstance(load_coverage_map(tmp_path / ".coverage"), CoverageMap)
+
+
+def test_load_invalid_map(tmp_path: Path) -> None:
+    (tmp_path / "map.json").write_text('{"format": "other"}')
+    with pytest.raises(CompactMapError):
+        CompactMap(tmp_path / "map.json")
+
+
+def test_merge(compact_map: CompactMap) -> None:
+    partial = CompactMap()
+    partial.tests = ["tests/test_a.py::test_1", "tests/test_c.py::test_4"]
+    partial.collected = [[300, "ghi"], [300, "ghi"]]
+    partial.files = {"src/b.py": {"sha": "new", "functions": [["baz", 1, 3, [0, 1]]]}}
+    partial.distributions = {"idna": [1]}
+    compact_map.files["src/a.py"]["sha"] = "old"
+    compact_map.merge(partial)
+
+    assert compact_map.tests == [
+        "tests/test_a.py::TestA::test_2",
+        "tests/test_b.py::test_3",
+        "tests/test_a.py::test_1",
+        "tests/test_c.py::test_4",
+    ]
+    assert compact_map.collected[2] == [300, "ghi"]
+    # test_1 no longer runs foo, its old row was replaced
+    assert compact_map.files == {
+        "src/a.py": {
+            "sha": "old",
+            "functions": [["bar", 5, 8, [1]], ["foo", 1, 3, [0]]],
+        },
+        "src/b.py": {"sha": "new", "functions": [["baz", 1, 3, [1, 2, 3]]]},
+    }
+    assert compact_map.distributions == {"idna": [0, 3], "requests": [1]}
+    assert compact_map.data_files == {"templates/a.html": [0]}
+
+
+def test_stale_tests(compact_map: CompactMap) -> None:
+    compact_map.collected[2] = [None, None]
+    assert compact_map.stale_tests(max_age=50, now=160) == [
+        ("tests/test_a.py::test_1", 60),
+        ("tests/test_a.py::TestA::test_2", 60),
+        ("tests/test_b.py::test_3", None),
+    ]
@@ -1,4 +1,3 @@
-from pathlib import Path
 from typing import Callable, Generator
 
 import pytest
@@ -45,14 +44,11 @@ def test_config_handler_precedence(get_config: GetConfigFun, mocker: MockFixture
     """
     Test that .pytest.ini has the highest priority regardless of order
     """
+    existing = {"setup.cfg", "tox.ini", "pyproject.toml", "pytest.ini"}
     mocker.patch(
-        "skippy_cov.config_handler.Path.iterdir",
-        return_value=[
-            Path("setup.cfg"),
-            Path("tox.ini"),
-            Path("pyproject.toml"),
-            Path("pytest.ini"),
-        ],
+        "skippy_cov.config_handler.Path.is_file",
+        autospec=True,
+        side_effect=lambda path: path.name in existing,
     )
     _ = mocker.patch("skippy_cov.config_handler.Path.read_text", return_value="")
     cfg = get_config()
@@ -79,8 +75,9 @@ def test_config_handler_parser(
     request,
 ):
     mocker.patch(
-        "skippy_cov.config_handler.Path.iterdir",
-        return_value=[Path(config_name)],
+        "skippy_cov.config_handler.Path.is_file",
+        autospec=True,
+        side_effect=lambda path: path.name == config_name,
     )
 
     mocker.patch(
@@ -94,10 +91,7 @@ def test_config_handler_parser(
 
 
 def test_config_handler_no_config_found(mocker: MockFixture, get_config: GetConfigFun):
-    mocker.patch(
-        "skippy_cov.config_handler.Path.iterdir",
-        return_value=[],
-    )
+    mocker.patch("skippy_cov.config_handler.Path.is_file", return_value=False)
     mocker.patch("skippy_cov.config_handler.Path.parents", return_value=[])
     cfg = get_config()
     assert not bool(cfg)
@@ -107,10 +101,7 @@ def test_config_handler_no_config_no_value(
     mocker: MockFixture,
     get_config: GetConfigFun,
 ):
-    mocker.patch(
-        "skippy_cov.config_handler.Path.iterdir",
-        return_value=[],
-    )
+    mocker.patch("skippy_cov.config_handler.Path.is_file", return_value=False)
     mocker.patch("skippy_cov.config_handler.Path.parents", return_value=[])
     cfg = get_config()
     assert cfg.get_value("addopts") is None
@@ -6,12 +6,13 @@ from unittest.mock import MagicMock
 import pytest
 from pytest_mock import MockerFixture
 
+from skippy_cov.diff_handler import SourceChanges
 from skippy_cov.utils import CoverageMap, FileTestCandidate
 
 
 @pytest.fixture
 def mocked_coverage(mocker: MockerFixture) -> MagicMock:
-    mock = mocker.patch("skippy_cov.utils.coverage.CoverageData")
+    mock = mocker.patch("coverage.CoverageData")
     coverage_db: MagicMock = mock.return_value
     coverage_db.read.return_value = True
     coverage_db._file_map.keys.return_value = ["source.py"]
@@ -42,3 +43,227 @@ def test_load_coverage_map_nested_folder(mocked_coverage: MagicMock) -> None:
     candidates = coverage_map.get_tests(Path("src/source.py"))
     mocked_coverage.contexts_by_lineno.assert_called_with("src/source.py")
     assert candidates and candidates[0].path == Path("test.py")
+
+
+@pytest.fixture
+def branch_coverage(tmp_path: Path) -> Path:
+    """
+    source.py:
+        1 def check(x):
+        2     if x:
+        3         return 1
+        4     return 0
+    """
+    import coverage
+
+    db = coverage.CoverageData(str(tmp_path / ".coverage"))
+    db.set_context("test.py::test_true|run")
+    db.add_arcs({"source.py": {(-1, 2), (2, 3), (3, -1)}})
+    db.set_context("test.py::test_false|run")
+    db.add_arcs({"source.py": {(-1, 2), (2, 4), (4, -1)}})
+    db.write()
+    return tmp_path / ".coverage"
+
+
+@pytest.mark.parametrize(
+    ("changes", "expected"),
+    [
+        # a line added in the `if` branch, right after the condition
+        (SourceChanges(inserted_after={2}), {"test_true"}),
+        # a line added at the end of the function
+        (SourceChanges(inserted_after={4}), {"test_false"}),
+        # the condition changed
+        (SourceChanges(removed={2}, inserted_after={2}), {"test_true", "test_false"}),
+        # the `return 0` removed
+        (SourceChanges(removed={4}), {"test_false"}),
+        # a non executable line removed after `return 0`
+        (SourceChanges(removed={5}), {"test_false"}),
+        # a line added before the function, run on import
+        (SourceChanges(inserted_after={0}), set()),
+    ],
+)
+def test_get_arc_tests(
+    branch_coverage: Path, changes: SourceChanges, expected: set[str]
+) -> None:
+    coverage_map = CoverageMap(branch_coverage)
+    candidates = coverage_map.get_arc_tests(Path("source.py"), changes)
+    assert {test for candidate in candidates or [] for test in candidate.tests} == (
+        expected
+    )
+
+
+def test_get_arc_tests_without_arcs(tmp_path: Path) -> None:
+    import coverage
+
+    db = coverage.CoverageData(str(tmp_path / ".coverage"))
+    db.set_context("test.py::test_true|run")
+    db.add_lines({"source.py": {2, 3}})
+    db.write()
+    coverage_map = CoverageMap(tmp_path / ".coverage")
+    assert coverage_map.get_arc_tests(Path("source.py"), SourceChanges()) is None
+
+
+def test_node_ids(branch_coverage: Path) -> None:
+    assert CoverageMap(branch_coverage).node_ids() == {
+        "test.py::test_true",
+        "test.py::test_false",
+    }
+
+
+@pytest.fixture
+def ci_coverage(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """
+    Coverage recorded in CI, with absolute paths of the CI checkout
+    """
+    import coverage
+
+    monkeypatch.chdir(tmp_path)
+    db = coverage.CoverageData(str(tmp_path / ".coverage"))
+    db.set_context("tests/test_app.py::test_app|run")
+    db.add_lines({"/builds/123/src/app.py": {1, 2}, f"{tmp_path}/src/local.py": {1}})
+    db.write()
+    return tmp_path / ".coverage"
+
+
+def test_path_prefixes(ci_coverage: Path) -> None:
+    expected = [FileTestCandidate(path=Path("tests/test_app.py"), tests={"test_app"})]
+    assert CoverageMap(ci_coverage).get_tests(Path("src/app.py")) == []
+    coverage_map = CoverageMap(ci_coverage, ["/builds/*/"])
+    assert coverage_map.get_tests(Path("src/app.py")) == expected
+    # paths under the current directory are always relative
+    assert coverage_map.get_tests(Path("src/local.py")) == expected
+
+
+def test_coverage_paths_config(ci_coverage: Path) -> None:
+    Path(".coveragerc").write_text("[paths]\nsource =\n    lib/\n    /builds/*/src/\n")
+    coverage_map = CoverageMap(ci_coverage)
+    assert coverage_map.canonical_paths["/builds/123/src/app.py"] == "lib/app.py"
+    assert coverage_map.get_tests(Path("lib/app.py")) == [
+        FileTestCandidate(path=Path("tests/test_app.py"), tests={"test_app"})
+    ]
+
+
+@pytest.fixture
+def environments_coverage(tmp_path: Path) -> Path:
+    """
+    Two environments combined, tagged with their static context
+    """
+    import coverage
+
+    db = coverage.CoverageData(str(tmp_path / ".coverage"))
+    # code run outside of the tests only gets the static context
+    db.set_context("py311")
+    db.add_lines({"source.py": {1}})
+    db.set_context("py311|test.py::test_a|run")
+    db.add_lines({"source.py": {1, 2}})
+    db.set_context("py312-pg|test.py::test_a|run")
+    db.add_lines({"source.py": {1}})
+    db.set_context("py312-pg|test.py::test_pg|run")
+    db.add_lines({"source.py": {3}, "backends.py": {1}})
+    db.write()
+    return tmp_path / ".coverage"
+
+
+@pytest.mark.parametrize(
+    ("env", "expected"),
+    [
+        ("py311", {"test_a"}),
+        ("py312-pg", {"test_a", "test_pg"}),
+        (None, {"test_a", "test_pg"}),
+    ],
+)
+def test_environments(
+    environments_coverage: Path, env: str | None, expected: set[str]
+) -> None:
+    coverage_map = CoverageMap(environments_coverage, env=env)
+    assert coverage_map.environments() == {"py311", "py312-pg"}
+    assert coverage_map.get_tests(Path("source.py")) == [
+        FileTestCandidate(path=Path("test.py"), tests=expected)
+    ]
+    assert coverage_map.node_ids() == {f"test.py::{test}" for test in expected}
+
+
+def test_unknown_environment(
+    environments_coverage: Path, caplog: pytest.LogCaptureFixture
+) -> None:
+    coverage_map = CoverageMap(environments_coverage, env="py39")
+    assert "found: py311, py312-pg" in caplog.text
+    assert coverage_map.get_tests(Path("source.py")) == []
+
+
+def test_get_arc_tests_else_branch(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    A line added at the start of an `else:` branch, measured with coverage.py
+    """
+    import coverage
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    Path("branches.py").write_text(
+        "def check(x):\n"  # 1
+        "    if x:\n"  # 2
+        "        y = 1\n"  # 3
+        "        return y\n"  # 4
+        "    else:\n"  # 5
+        "        z = 2\n"  # 6
+        "        return z\n"  # 7
+    )
+    cov = coverage.Coverage(data_file=".coverage", branch=True)
+    cov.start()
+    import branches
+
+    for context, value in (
+        ("test.py::test_true|run", True),
+        ("test.py::test_false|run", False),
+    ):
+        cov.switch_context(context)
+        branches.check(value)
+    cov.stop()
+    cov.save()
+
+    coverage_map = CoverageMap(Path(".coverage"))
+    candidates = coverage_map.get_arc_tests(
+        Path("branches.py"), SourceChanges(inserted_after={5})
+    )
+    assert {test for candidate in candidates or [] for test in candidate.tests} >= {
+        "test_false"
+    }
+    # a line added at the start of the `if` branch is still narrowed down
+    candidates = coverage_map.get_arc_tests(
+        Path("branches.py"), SourceChanges(inserted_after={2})
+    )
+    assert {test for candidate in candidates or [] for test in candidate.tests} == {
+        "test_true"
+    }
+
+
+def test_path_prefixes_combined(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    The same file recorded by two runners, combined in one database
+    """
+    import coverage
+
+    from skippy_cov.canary import covered_files
+
+    monkeypatch.chdir(tmp_path)
+    db = coverage.CoverageData(str(tmp_path / ".coverage"))
+    db.set_context("py311|tests/test_a.py::test_a|run")
+    db.add_lines({"/builds/1/src/a.py": {1}})
+    db.set_context("py312|tests/test_a.py::test_b|run")
+    db.add_lines({"/builds/2/src/a.py": {1}})
+    db.write()
+
+    coverage_map = CoverageMap(Path(".coverage"), ["/builds/*/"])
+    assert coverage_map.get_tests(Path("src/a.py")) == [
+        FileTestCandidate(path=Path("tests/test_a.py"), tests={"test_a", "test_b"})
+    ]
+    assert covered_files(coverage_map) == {
+        "tests/test_a.py::test_a": {"src/a.py"},
+        "tests/test_a.py::test_b": {"src/a.py"},
+    }
+    coverage_map = CoverageMap(Path(".coverage"), ["/builds/*/"], env="py312")
+    assert coverage_map.get_tests(Path("src/a.py")) == [
+        FileTestCandidate(path=Path("tests/test_a.py"), tests={"test_b"})
+    ]
@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import subprocess
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+from skippy_cov import select_tests_to_run
+from skippy_cov.compact_map import CompactMap
+from skippy_cov.dependencies import (
+    changed_distributions,
+    is_dependency_file,
+    package_distributions,
+)
+from skippy_cov.diff_handler import DiffHandler
+from skippy_cov.utils import FileTestCandidate
+
+UV_LOCK = """version = 1
+requires-python = ">=3.8"
+
+[[package]]
+name = "idna"
+version = "3.7"
+source = { registry = "https://pypi.org/simple" }
+wheels = [
+    { url = "https://example.com/idna-3.7-py3-none-any.whl" },
+]
+
+[[package]]
+name = "requests"
+version = "2.32.3"
+source = { registry = "https://pypi.org/simple" }
+dependencies = [
+    { name = "idna" },
+]
+sdist = { url = "https://example.com/requests-2.32.3.tar.gz" }
+wheels = [
+    { url = "https://example.com/requests-2.32.3-py3-none-any.whl" },
+]
+
+[package.optional-dependencies]
+socks = [
+    { name = "pysocks" },
+]
+"""
+
+UV_LOCK_DIFF = """diff --git a/uv.lock b/uv.lock
+--- a/uv.lock
++++ b/uv.lock
+@@ -5,3 +5,3 @@ requires-python = ">=3.8"
+ name = "idna"
+-version = "3.6"
++version = "3.7"
+ source = { registry = "https://pypi.org/simple" }
+@@ -20,3 +20,3 @@ sdist = { url = "https://example.com/requests-2.32.3.tar.gz" }
+ wheels = [
+-    { url = "https://example.com/requests-2.32.2-py3-none-any.whl" },
++    { url = "https://example.com/requests-2.32.3-py3-none-any.whl" },
+ ]
+"""
+
+
+@pytest.mark.parametrize(
+    ("path", "expected"),
+    [
+        ("uv.lock", True),
+        ("poetry.lock", True),
+        ("pyproject.toml", True),
+        ("requirements.txt", True),
+        ("requirements-dev.in", True),
+        ("requirements/base.txt", True),
+        ("docs/notes.txt", False),
+        ("src/requirements.py", False),
+    ],
+)
+def test_is_dependency_file(path: str, expected: bool) -> None:
+    assert is_dependency_file(Path(path)) is expected
+
+
+def test_changed_lockfile_packages(tmp_path: Path) -> None:
+    # the second hunk doesn't show the package name, it's found in the lockfile
+    (tmp_path / "uv.lock").write_text(UV_LOCK)
+    changed = changed_distributions(tmp_path / "uv.lock", UV_LOCK_DIFF)
+    assert changed == {"idna", "requests"}
+
+
+def test_changed_lockfile_packages_of_diffed_revision(
+    commit: Callable[..., str],
+) -> None:
+    old_lock = UV_LOCK.replace('version = "3.7"', 'version = "3.6"').replace(
+        "requests-2.32.3-py3", "requests-2.32.2-py3"
+    )
+    base = commit("old lock", **{"uv.lock": old_lock})
+    head = commit("new lock", **{"uv.lock": UV_LOCK})
+    diff = subprocess.check_output(["git", "diff", base, head], text=True)
+    # the working tree has moved on since, the packages are found in the diffed one
+    Path("uv.lock").write_text("")
+    assert changed_distributions(Path("uv.lock"), diff) == {"idna", "requests"}
+
+
+def test_changed_requirements() -> None:
+    diff = """--- a/requirements.txt
++++ b/requirements.txt
+@@ -1,5 +1,5 @@
+ click==8.1.7
+-Typing_Extensions==4.11.0 \\
++Typing_Extensions==4.12.2 \\
+-    --hash=sha256:aaa
++    --hash=sha256:bbb
+-    # via requests
++    # via urllib3
+"""
+    assert changed_distributions(Path("requirements.txt"), diff) == {"typing-extensions"}
+
+
+def test_changed_pyproject_requirements(tmp_path: Path) -> None:
+    (tmp_path / "pyproject.toml").write_text("""[project]
+name = "demo"
+classifiers = [
+    "Programming Language :: Python :: 3",
+]
+dependencies = [
+    "unidiff >=0.7.6",
+    "coverage>=7.6", "baz",
+]
+
+[project.optional-dependencies]
+socks = ["pysocks"]
+
+[dependency-groups]
+dev = ["pytest>=8", {include-group = "lint"}]
+lint = ["ruff"]
+
+[build-system]
+requires = ["hatchling>=1.26"]
+""")
+    diff = """--- a/pyproject.toml
++++ b/pyproject.toml
+@@ -3,7 +3,7 @@ name = "demo"
+ classifiers = [
+-    "Programming Language :: Python",
++    "Programming Language :: Python :: 3",
+ ]
+ dependencies = [
+-    "unidiff >=0.7.5",
++    "unidiff >=0.7.6",
+-    "Foo.Bar[extra]; python_version < '3.11'",
++    "coverage>=7.6", "baz",
+ ]
+@@ -15 +15 @@ socks = ["pysocks"]
+-dev = ["pytest>=7", {include-group = "lint"}]
++dev = ["pytest>=8", {include-group = "lint"}]
+@@ -19 +19 @@ lint = ["ruff"]
+-requires = ["hatchling>=1.25"]
++requires = ["hatchling>=1.26"]
+"""
+    assert changed_distributions(tmp_path / "pyproject.toml", diff) == {
+        "unidiff",
+        "foo-bar",
+        "coverage",
+        "baz",
+        "pytest",
+    }
+
+
+def test_package_distributions() -> None:
+    assert "pytest" in package_distributions()["_pytest"]
+
+
+def test_select_tests_for_changed_dependencies(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "uv.lock").write_text(UV_LOCK)
+    compact_map = CompactMap()
+    compact_map.tests = ["tests/test_a.py::test_1", "tests/test_b.py::test_2"]
+    compact_map.distributions = {"idna": [0], "click": [1]}
+
+    selected = select_tests_to_run(DiffHandler(UV_LOCK_DIFF), compact_map)
+    assert selected == [
+        FileTestCandidate(path=Path("tests/test_a.py"), tests={"test_1"})
+    ]
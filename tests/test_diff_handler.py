@@ -2,7 +2,7 @@ from pathlib import Path
 
 import pytest
 
-from skippy_cov.diff_handler import DiffHandler, DiffHandlerError
+from skippy_cov.diff_handler import DiffHandler, DiffHandlerError, SourceChanges
 
 
 @pytest.fixture
@@ -71,3 +71,59 @@ def test_invalid_hunk(invalid_hunk: str) -> None:
     """
     with pytest.raises(DiffHandlerError):
         DiffHandler(invalid_hunk)
+
+
+def test_source_changes() -> None:
+    diff_handler = DiffHandler(
+        """--- a/foo.py
++++ b/foo.py
+@@ -1,4 +1,5 @@
+ def foo(x):
+     if x:
++        log()
+         return 1
+
+@@ -10,2 +11,2 @@
+-    a = 1
++    a = 2
+ b = 3
+"""
+    )
+    assert diff_handler.source_changes(Path("foo.py")) == SourceChanges(
+        removed={10}, inserted_after={2, 10}
+    )
+
+
+def test_renames() -> None:
+    diff_handler = DiffHandler(
+        """diff --git a/pkg/a.py b/new/a.py
+similarity index 71%
+rename from pkg/a.py
+rename to new/a.py
+index 0198bbd..dd5171f 100644
+--- a/pkg/a.py
++++ b/new/a.py
+@@ -3,4 +3,4 @@ def f():
+
+
+ def g():
+-    return 2
++    return 3
+diff --git a/pkg/b.py b/new/b.py
+similarity index 100%
+rename from pkg/b.py
+rename to new/b.py
+"""
+    )
+    assert diff_handler.changed_files == {Path("new/a.py"), Path("new/b.py")}
+    assert diff_handler.renames == {
+        Path("pkg/a.py"): Path("new/a.py"),
+        Path("pkg/b.py"): Path("new/b.py"),
+    }
+    assert diff_handler.original_path(Path("new/a.py")) == Path("pkg/a.py")
+    assert diff_handler.original_path(Path("other.py")) == Path("other.py")
+    assert diff_handler.new_path(Path("pkg/b.py")) == Path("new/b.py")
+    # the line numbers are the ones of the original file
+    assert diff_handler.source_changes(Path("new/a.py")) == SourceChanges(
+        removed={6}, inserted_after={6}
+    )
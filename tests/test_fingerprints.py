@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import json
+import subprocess
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+from skippy_cov.__main__ import main
+from skippy_cov.compact_map import CompactMap
+from skippy_cov.fingerprints import (
+    blob_sha,
+    find_drifted_files,
+    get_index_fingerprints,
+    load_fingerprints,
+    select_drifted_tests,
+    sidecar_path,
+)
+from skippy_cov.utils import CoverageMap, FileTestCandidate
+
+
+@pytest.fixture
+def coverage_file(workdir: Path, write_coverage: Callable[..., Path]) -> Path:
+    (workdir / "foo.py").write_text("def foo():\n    return 42\n")
+    return write_coverage(
+        {"tests/test_foo.py::test_foo|run": {"foo.py": [1, 2]}}, workdir / ".coverage"
+    )
+
+
+def test_blob_sha(tmp_path: Path) -> None:
+    (tmp_path / "file.py").write_bytes(b"print('hello')\n")
+    expected = subprocess.check_output(
+        ["git", "hash-object", str(tmp_path / "file.py")], text=True
+    ).strip()
+    assert blob_sha(b"print('hello')\n") == expected
+
+
+def test_find_drifted_files() -> None:
+    recorded = {"a.py": "1", "b.py": "2", "deleted.py": "3"}
+    current = {"a.py": "1", "b.py": "changed", "new.py": "4"}
+    assert find_drifted_files(recorded, current) == {Path("b.py")}
+
+
+def test_fingerprints_outside_git(workdir: Path) -> None:
+    assert get_index_fingerprints() == {}
+    assert find_drifted_files({"a.py": "1"}) == set()
+
+
+def test_fingerprint_command(coverage_file: Path) -> None:
+    main(["fingerprint", "--coverage-file", str(coverage_file)])
+
+    sidecar = json.loads(sidecar_path(coverage_file).read_text())
+    assert sidecar["files"] == {"foo.py": blob_sha(b"def foo():\n    return 42\n")}
+    coverage_map = CoverageMap(coverage_file)
+    assert load_fingerprints(coverage_file, coverage_map) == sidecar["files"]
+
+
+def test_load_fingerprints_without_sidecar(coverage_file: Path) -> None:
+    assert load_fingerprints(coverage_file, CoverageMap(coverage_file)) == {}
+
+
+def test_load_fingerprints_compact_map(tmp_path: Path) -> None:
+    compact_map = CompactMap()
+    compact_map.files = {
+        "a.py": {"sha": "1", "functions": []},
+        "b.py": {"functions": []},
+    }
+    assert load_fingerprints(tmp_path / "map.json", compact_map) == {"a.py": "1"}
+
+
+def test_select_drifted_tests(coverage_file: Path) -> None:
+    coverage_map = CoverageMap(coverage_file)
+    assert select_drifted_tests(coverage_map, {Path("foo.py"), Path("bar.py")}) == [
+        FileTestCandidate(path=Path("tests/test_foo.py"), tests={"test_foo"})
+    ]
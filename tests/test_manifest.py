@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Callable
+
+import pytest
+from pytest_mock import MockerFixture
+
+from skippy_cov.compact_map import CompactMap
+from skippy_cov.diff_handler import DiffHandler
+from skippy_cov.fingerprints import sidecar_path
+from skippy_cov.manifest import CoverageManifest, ManifestError, SelectionOptions
+from skippy_cov.utils import FileTestCandidate
+
+MANIFEST = """
+[[coverage]]
+prefix = "packages/billing"
+file = "packages/billing/.coverage"
+root = "packages/billing"
+
+[[coverage]]
+prefix = "packages"
+file = "packages/.coverage"
+
+[[coverage]]
+prefix = "packages/unused"
+file = "packages/unused/.coverage"
+"""
+
+
+def make_diff(*paths: str) -> DiffHandler:
+    return DiffHandler(
+        "\n".join(
+            f"--- a/{path}\n+++ b/{path}\n@@ -1 +1 @@\n-old\n+new" for path in paths
+        )
+    )
+
+
+@pytest.fixture
+def manifest(workdir: Path, write_coverage: Callable[..., Path]) -> CoverageManifest:
+    write_coverage(
+        {"tests/test_billing.py::test_invoice|run": {"billing/invoice.py": [1]}},
+        Path("packages/billing/.coverage"),
+    )
+    write_coverage(
+        {
+            "packages/common/tests/test_common.py::test_util|run": {
+                "packages/common/util.py": [1]
+            }
+        },
+        Path("packages/.coverage"),
+    )
+    (workdir / "skippy-cov.toml").write_text(MANIFEST)
+    return CoverageManifest(workdir / "skippy-cov.toml")
+
+
+def test_route(manifest: CoverageManifest) -> None:
+    billing = manifest.route(Path("packages/billing/billing/invoice.py"))
+    assert billing and billing.prefix == Path("packages/billing")
+    common = manifest.route(Path("packages/common/util.py"))
+    assert common and common.prefix == Path("packages")
+    assert manifest.route(Path("docs/index.md")) is None
+
+
+def test_select_tests(manifest: CoverageManifest) -> None:
+    diff = make_diff(
+        "packages/billing/billing/invoice.py", "packages/common/util.py", "README.md"
+    )
+    assert sorted(manifest.select_tests(diff)) == [
+        FileTestCandidate(
+            path=Path("packages/billing/tests/test_billing.py"), tests={"test_invoice"}
+        ),
+        FileTestCandidate(
+            path=Path("packages/common/tests/test_common.py"), tests={"test_util"}
+        ),
+    ]
+
+
+def test_select_tests_only_loads_needed_maps(
+    manifest: CoverageManifest, mocker: MockerFixture
+) -> None:
+    coverage_map = mocker.patch("skippy_cov.manifest.load_coverage_map")
+    coverage_map.return_value.get_tests.return_value = []
+    manifest.select_tests(make_diff("packages/common/util.py"))
+    coverage_map.assert_called_once_with(
+        manifest.manifest_path.parent / "packages/.coverage", (), None
+    )
+
+
+def test_invalid_manifest(tmp_path: Path) -> None:
+    (tmp_path / "skippy-cov.toml").write_text('[[coverage]]\nprefix = "packages"\n')
+    with pytest.raises(ManifestError):
+        CoverageManifest(tmp_path / "skippy-cov.toml")
+
+
+def test_select_tests_options(
+    manifest: CoverageManifest, tmp_path: Path, write_coverage: Callable[..., Path]
+) -> None:
+    write_coverage(
+        {"py312|tests/test_billing.py::test_invoice|run": {"billing/invoice.py": [1]}},
+        Path("packages/billing/.coverage"),
+    )
+    # the fingerprints are relative to the root of the entry
+    sidecar_path(tmp_path / "packages/billing/.coverage").write_text(
+        json.dumps({"files": {"billing/invoice.py": "1"}})
+    )
+    current = {"packages/billing/billing/invoice.py": "2"}
+    options = SelectionOptions(env="py312", current_fingerprints=current)
+    # the drifted file is selected even if it isn't in the diff
+    assert manifest.select_tests(make_diff("README.md"), options=options) == [
+        FileTestCandidate(
+            path=Path("packages/billing/tests/test_billing.py"), tests={"test_invoice"}
+        )
+    ]
+    options = SelectionOptions(env="py311")
+    diff = make_diff("packages/billing/billing/invoice.py")
+    assert manifest.select_tests(diff, options=options) == []
+
+
+def test_select_tests_collection_scope(
+    manifest: CoverageManifest, tmp_path: Path
+) -> None:
+    (tmp_path / "pytest.ini").write_text(
+        "[pytest]\naddopts = --ignore=packages/billing\n"
+    )
+    diff = make_diff("packages/billing/billing/invoice.py", "packages/common/util.py")
+    assert manifest.select_tests(diff) == [
+        FileTestCandidate(
+            path=Path("packages/common/tests/test_common.py"), tests={"test_util"}
+        ),
+    ]
+
+
+def test_select_tests_dependencies(manifest: CoverageManifest) -> None:
+    compact_map = CompactMap()
+    compact_map.tests = ["tests/test_billing.py::test_http"]
+    compact_map.collected = [[1, "abc", None]]
+    compact_map.distributions = {"requests": [0]}
+    compact_map.save(Path("packages/billing/.coverage"))
+    diff = DiffHandler(
+        "--- a/requirements.txt\n+++ b/requirements.txt\n@@ -1 +1 @@\n"
+        "-requests==2.31\n+requests==2.32\n"
+    )
+    assert manifest.select_tests(diff) == [
+        FileTestCandidate(
+            path=Path("packages/billing/tests/test_billing.py"), tests={"test_http"}
+        )
+    ]
+
+
+def test_select_tests_changed_parametrized_test(
+    manifest: CoverageManifest, write_coverage: Callable[..., Path]
+) -> None:
+    write_coverage(
+        {
+            "tests/test_billing.py::test_invoice[1]|run": {"billing/invoice.py": [1]},
+            "tests/test_billing.py::test_invoice[2]|run": {"billing/other.py": [1]},
+        },
+        Path("packages/billing/.coverage"),
+    )
+    Path("packages/billing/tests").mkdir(parents=True)
+    Path("packages/billing/tests/test_billing.py").write_text(
+        "def test_invoice(case):\n    pass\n"
+    )
+    diff = make_diff(
+        "packages/billing/billing/invoice.py", "packages/billing/tests/test_billing.py"
+    )
+    # the selected case is dropped, the whole test runs anyway
+    assert {
+        node_id
+        for candidate in manifest.select_tests(diff)
+        for node_id in candidate.as_set()
+    } == {"packages/billing/tests/test_billing.py::test_invoice"}
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from skippy_cov.__main__ import process_selection
+from skippy_cov.node_index import DEFAULT_INDEX_FILE, NodeIndex
+from skippy_cov.utils import FileTestCandidate
+
+TESTS = """
+import pytest
+
+from base import BaseTests
+from helpers import test_shared
+
+
+def test_kept():
+    pass
+
+
+@pytest.mark.parametrize("value", [1, 2])
+def test_parametrized(value):
+    pass
+
+
+class TestMoved:
+    def test_moved(self):
+        pass
+
+    test_alias = test_moved
+
+
+class TestInherited(BaseTests):
+    pass
+"""
+
+
+@pytest.fixture
+def project(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "test_a.py").write_text(TESTS)
+    return tmp_path
+
+
+def test_validate(project: Path) -> None:
+    candidates = [
+        FileTestCandidate(
+            path=Path("test_a.py"),
+            tests={
+                "test_kept",
+                "test_parametrized[2]",
+                "test_moved",
+                "TestInherited::test_base",
+                "test_removed",
+                "test_shared",
+                "TestMoved::test_alias",
+            },
+        ),
+        FileTestCandidate(path=Path("test_removed.py"), tests={"test_x"}),
+    ]
+    assert NodeIndex().validate(candidates) == [
+        FileTestCandidate(
+            path=Path("test_a.py"),
+            tests={
+                "test_kept",
+                "test_parametrized[2]",
+                "TestMoved::test_moved",
+                "TestInherited::test_base",
+                "test_shared",
+                "TestMoved::test_alias",
+            },
+        )
+    ]
+
+
+def test_validate_star_import(project: Path) -> None:
+    (project / "test_a.py").write_text("from helpers import *\n")
+    candidates = [FileTestCandidate(path=Path("test_a.py"), tests={"test_x"})]
+    assert NodeIndex().validate(candidates) == candidates
+
+
+def test_validate_unparsable_file(project: Path) -> None:
+    (project / "test_a.py").write_text("def test_broken(:\n")
+    candidates = [FileTestCandidate(path=Path("test_a.py"), tests={"test_x"})]
+    assert NodeIndex().validate(candidates) == candidates
+
+
+def test_index_cache(project: Path) -> None:
+    index = NodeIndex()
+    index.validate([FileTestCandidate(path=Path("test_a.py"), tests={"test_kept"})])
+    assert DEFAULT_INDEX_FILE.exists()
+
+    cached = NodeIndex()
+    assert cached.files == index.files
+    # the cached entry is used until the file changes
+    cached.files["test_a.py"]["tests"].append("test_cached")
+    assert "test_cached" in cached.get(Path("test_a.py"))["tests"]
+    (project / "test_a.py").write_text("def test_new():\n    pass\n")
+    assert cached.get(Path("test_a.py"))["tests"] == ["test_new"]
+
+
+def test_process_selection_validate(project: Path) -> None:
+    candidates = [
+        FileTestCandidate(path=Path("test_a.py"), tests={"test_kept", "test_removed"})
+    ]
+    assert process_selection(candidates, None, True, validate=True) == {
+        "test_a.py::test_kept"
+    }
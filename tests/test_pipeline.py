@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import json
+import subprocess
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+from skippy_cov.fingerprints import sidecar_path
+from skippy_cov.pipeline import select_tests_pipelined, split_file_diffs
+from skippy_cov.utils import FileTestCandidate
+
+DIFF = """diff --git a/source.py b/source.py
+--- a/source.py
++++ b/source.py
+@@ -1,2 +1,2 @@
+ def foo():
+-    return 1
++    return 2
+diff --git a/test_other.py b/test_other.py
+--- a/test_other.py
++++ b/test_other.py
+@@ -1,2 +1,2 @@
+ def test_other():
+-    pass
++    assert True
+"""
+
+
+@pytest.fixture
+def project(workdir: Path, write_coverage: Callable[..., Path]) -> Path:
+    (workdir / "test_other.py").write_text("def test_other():\n    assert True\n")
+    (workdir / "changes.diff").write_text(DIFF)
+    write_coverage({"test_source.py::test_foo|run": {"source.py": [1, 2]}})
+    return workdir
+
+
+def test_split_file_diffs() -> None:
+    chunks = list(split_file_diffs(DIFF.splitlines(keepends=True)))
+    assert len(chunks) == 2
+    assert chunks[0].startswith("diff --git a/source.py")
+    assert chunks[1].startswith("diff --git a/test_other.py")
+    assert "".join(chunks) == DIFF
+
+
+def test_select_tests_pipelined_from_file(project: Path) -> None:
+    assert sorted(select_tests_pipelined("changes.diff", Path(".coverage"))) == [
+        FileTestCandidate(path=Path("test_other.py"), tests={"test_other"}),
+        FileTestCandidate(path=Path("test_source.py"), tests={"test_foo"}),
+    ]
+
+
+def test_select_tests_pipelined_from_git(
+    project: Path, commit: Callable[..., str]
+) -> None:
+    commit("init", **{"source.py": "def foo():\n    return 1\n"})
+    (project / "source.py").write_text("def foo():\n    return 2\n")
+    assert select_tests_pipelined("HEAD", Path(".coverage")) == [
+        FileTestCandidate(path=Path("test_source.py"), tests={"test_foo"}),
+    ]
+
+
+def test_select_tests_pipelined_check_fingerprints(
+    project: Path, git_repo: Path, write_coverage: Callable[..., Path]
+) -> None:
+    (project / "drifted.py").write_text("VALUE = 2\n")
+    subprocess.run(["git", "add", "drifted.py"], check=True)
+    write_coverage({"test_drifted.py::test_value|run": {"drifted.py": [1]}})
+    sidecar_path(Path(".coverage")).write_text(
+        json.dumps({"files": {"drifted.py": "0" * 40}})
+    )
+    selected = select_tests_pipelined(
+        "changes.diff", Path(".coverage"), check_fingerprints=True
+    )
+    assert (
+        FileTestCandidate(path=Path("test_drifted.py"), tests={"test_value"}) in selected
+    )
+
+
+def test_select_tests_pipelined_collection_scope(
+    project: Path, write_coverage: Callable[..., Path]
+) -> None:
+    (project / "pytest.ini").write_text("[pytest]\naddopts = --ignore=slow\n")
+    write_coverage(
+        {"slow/test_slow.py::test_foo|run": {"source.py": [1, 2]}}, append=True
+    )
+    # the same selection as `select_tests_to_run`, without the ignored tests
+    assert sorted(select_tests_pipelined("changes.diff", Path(".coverage"))) == [
+        FileTestCandidate(path=Path("test_other.py"), tests={"test_other"}),
+        FileTestCandidate(path=Path("test_source.py"), tests={"test_foo"}),
+    ]
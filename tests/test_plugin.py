@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+import subprocess
+import sys
+
+HEAVY_MODULES = [
+    "coverage",
+    "unidiff",
+    "sqlite3",
+    "tomllib",
+    "skippy_cov.__main__",
+    "skippy_cov.diff_handler",
+    "skippy_cov.compact_map",
+    "skippy_cov.dependencies",
+    "skippy_cov.collection_scope",
+    "skippy_cov.config_handler",
+]
+
+
+def test_plugin_import_is_lightweight() -> None:
+    """
+    The plugin is loaded in every pytest session, even when skippy-cov isn't enabled,
+    so importing it must not pull the selection machinery
+    """
+    script = (
+        "import sys, pytest, skippy_cov.plugin;"
+        f"print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    output = subprocess.check_output([sys.executable, "-c", script], text=True)
+    assert output.split() == []
@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+from skippy_cov.rotation import SliceError, in_slice, main, parse_slice
+
+
+@pytest.mark.parametrize(
+    "value,expected", [("0/4", (0, 4)), ("5/4", (1, 4)), ("3/1", (0, 1))]
+)
+def test_parse_slice(value: str, expected: tuple[int, int]) -> None:
+    assert parse_slice(value) == expected
+
+
+@pytest.mark.parametrize("value", ["4", "a/4", "1/0", "1/2/3"])
+def test_parse_invalid_slice(value: str) -> None:
+    with pytest.raises(SliceError):
+        parse_slice(value)
+
+
+def test_every_test_is_in_exactly_one_slice() -> None:
+    tests = [f"tests/test_foo.py::test_{i}" for i in range(100)]
+    slices = [[test for test in tests if in_slice(test, (i, 4))] for i in range(4)]
+    assert sorted(test for slice_ in slices for test in slice_) == sorted(tests)
+    assert all(slices)
+
+
+def test_stale_not_a_map(
+    workdir: Path,
+    write_coverage: Callable[..., Path],
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    write_coverage({"test_foo.py::test_foo|run": {"foo.py": [1]}})
+    with pytest.raises(SystemExit) as exc_info:
+        main(["--coverage-file", ".coverage"])
+    assert exc_info.value.code == 1
+    assert capsys.readouterr().err.startswith(
+        "skippy-cov: '.coverage' is not a skippy-cov map"
+    )
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import types
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+import skippy_cov
+from skippy_cov.diff_handler import DiffHandler
+from skippy_cov.selector import Selector
+
+DIFF = """--- a/source.py
++++ b/source.py
+@@ -1,2 +1,1 @@
+ def foo():
+-    return 1
+--- a/tests/test_other.py
++++ b/tests/test_other.py
+@@ -1,2 +1,2 @@
+ def test_b():
+-    pass
++    assert True"""
+
+
+@pytest.fixture
+def selector(workdir: Path, write_coverage: Callable[..., Path]) -> Selector:
+    write_coverage({
+        "tests/test_source.py::test_foo|run": {"source.py": [1, 2]},
+        "tests/test_a.py::test_a|run": {"source.py": [1, 2]},
+    })
+    Path("tests").mkdir()
+    Path("tests/test_other.py").write_text("def test_b():\n    assert True\n")
+    return Selector(Path(".coverage"))
+
+
+def test_select(selector: Selector) -> None:
+    selected = selector.select(DIFF)
+    assert isinstance(selected, types.GeneratorType)
+    assert list(selected) == [
+        "tests/test_a.py::test_a",
+        "tests/test_other.py::test_b",
+        "tests/test_source.py::test_foo",
+    ]
+    # the changed test file was parsed once, and it's reused
+    assert "tests/test_other.py" in selector.index.files
+    assert list(selector.select(DiffHandler(DIFF), [Path("tests/test_other.py")])) == [
+        "tests/test_other.py::test_b"
+    ]
+
+
+def test_select_validate(selector: Selector) -> None:
+    selector.validate = True
+    assert list(selector.select(DIFF)) == ["tests/test_other.py::test_b"]
+
+
+def test_lazy_export() -> None:
+    assert skippy_cov.Selector is Selector
+    with pytest.raises(AttributeError):
+        skippy_cov.Unknown  # noqa: B018
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import threading
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+from skippy_cov.server import CoverageMapCache, SelectionServer, query_server
+from skippy_cov.utils import FileTestCandidate
+
+DIFF = """--- a/source.py
++++ b/source.py
+@@ -1,2 +1,1 @@
+ def foo():
+-    return 1"""
+
+
+@pytest.fixture
+def coverage_file(tmp_path: Path, write_coverage: Callable[..., Path]) -> Path:
+    return write_coverage(
+        {"test_source.py::test_foo|run": {"source.py": [1, 2]}}, tmp_path / ".coverage"
+    )
+
+
+@pytest.fixture
+def server(workdir: Path, coverage_file: Path):
+    server = SelectionServer(Path("skippy.sock"), coverage_file)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_query_server(server: SelectionServer, coverage_file: Path) -> None:
+    assert query_server(server.socket_path, DIFF, coverage_file) == [
+        FileTestCandidate(path=Path("test_source.py"), tests={"test_foo"})
+    ]
+
+
+def test_query_server_other_coverage_file(
+    server: SelectionServer, tmp_path: Path
+) -> None:
+    """
+    A server loaded with another coverage file must not answer for this one
+    """
+    assert query_server(server.socket_path, DIFF, tmp_path / "other") is None
+
+
+def test_query_server_not_running(tmp_path: Path, coverage_file: Path) -> None:
+    assert query_server(tmp_path / "missing.sock", DIFF, coverage_file) is None
+
+
+def test_coverage_map_cache_reloads(
+    workdir: Path, coverage_file: Path, write_coverage: Callable[..., Path]
+) -> None:
+    cache = CoverageMapCache(coverage_file)
+    first = cache.get()
+    assert cache.get() is first
+
+    coverage_file.unlink()
+    write_coverage({"test_source.py::test_bar|run": {"source.py": [1]}}, coverage_file)
+    reloaded = cache.get()
+    assert reloaded is not first
+    assert reloaded.get_tests(Path("source.py")) == [
+        FileTestCandidate(path=Path("test_source.py"), tests={"test_bar"})
+    ]
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+from skippy_cov.__main__ import main
+from skippy_cov.fingerprints import sidecar_path
+from skippy_cov.store import (
+    DirectoryStore,
+    MapStore,
+    StoreError,
+    find_nearest_commit,
+    open_store,
+    resolve_coverage,
+)
+
+
+@pytest.fixture
+def repository(commit: Callable[..., str]) -> list[str]:
+    return [commit("first"), commit("second"), commit("third")]
+
+
+def test_open_store(tmp_path: Path) -> None:
+    assert isinstance(open_store(str(tmp_path)), DirectoryStore)
+    assert open_store(f"file://{tmp_path}").root == tmp_path  # type: ignore[attr-defined]
+    with pytest.raises(StoreError):
+        open_store("s3://bucket/maps")
+
+
+def test_directory_store(tmp_path: Path) -> None:
+    Path(tmp_path / ".coverage").write_text("data")
+    sidecar_path(tmp_path / ".coverage").write_text("{}")
+    store = DirectoryStore(tmp_path / "store")
+    assert not store.has("abc")
+    store.put("abc", tmp_path / ".coverage")
+    assert store.has("abc")
+    map_file = store.fetch("abc")
+    assert map_file.read_text() == "data"
+    assert sidecar_path(map_file).exists()
+
+
+def test_incomplete_store() -> None:
+    class ReadOnlyStore(MapStore):
+        def has(self, commit: str) -> bool:
+            return False
+
+    with pytest.raises(TypeError):
+        ReadOnlyStore()  # type: ignore[abstract]
+
+
+def test_find_nearest_commit(repository: list[str]) -> None:
+    Path("map").write_text("data")
+    store = DirectoryStore(Path("store"))
+    assert find_nearest_commit(store, "HEAD") is None
+    store.put(repository[0], Path("map"))
+    store.put(repository[1], Path("map"))
+    assert find_nearest_commit(store, "HEAD") == repository[1]
+    assert find_nearest_commit(store, repository[0]) == repository[0]
+
+
+def test_resolve_coverage(repository: list[str]) -> None:
+    with pytest.raises(StoreError):
+        resolve_coverage("store")
+    Path("map").write_text("data")
+    main(["store", "store", "--coverage-file", "map", "--commit", "HEAD~2"])
+    assert resolve_coverage("store") == (
+        Path("store", repository[0], "coverage"),
+        f"{repository[0]}...HEAD",
+    )
@@ -7,6 +7,7 @@ from skippy_cov.utils import (
     FileTestCandidate,
     FilterCandidatesError,
     _fix_test_name,
+    collapse_parametrized,
     filter_by_path,
     is_test_file,
 )
@@ -16,14 +17,14 @@ from skippy_cov.utils import (
     "fname,expected", [("test_file.py", True), ("testfile.py", False)]
 )
 def test_noconfig_is_test_file(fname: str, expected: bool, mocker: MockFixture) -> None:
-    mocker.patch("skippy_cov.utils.get_config", return_value=None)
+    mocker.patch("skippy_cov.config_handler.get_config", return_value=None)
     assert is_test_file(Path(fname)) == expected
 
 
 def test_config_is_test_file(mocker: MockFixture) -> None:
     config_mock = mocker.MagicMock()
-    config_mock.get_value.return_value = "check_*.py"
-    mocker.patch("skippy_cov.utils.get_config", return_value=config_mock)
+    config_mock.get_value.side_effect = {"python_files": "check_*.py"}.get
+    mocker.patch("skippy_cov.config_handler.get_config", return_value=config_mock)
     assert is_test_file(Path("check_file.py"))
     assert not is_test_file(Path("test_file.py"))
 
@@ -45,6 +46,10 @@ def test_config_is_test_file(mocker: MockFixture) -> None:
             "test_file.py::test_name[param|param]|phase",
             ("test_file.py", "test_name[param|param]"),
         ),
+        (
+            "py312-pg|test_file.py::test_name[param|param]|phase",
+            ("test_file.py", "test_name[param|param]"),
+        ),
     ],
 )
 def test_fix_test_name(name: str, expected: str) -> None:
@@ -108,3 +113,38 @@ def test_filter_paths_no_prefix_multiple_paths():
 def test_generate_set():
     candidate = FileTestCandidate(path=Path("tests.py"), tests={"test1", "test2"})
     assert candidate.as_set() == {"tests.py::test1", "tests.py::test2"}
+
+
+def test_collapse_parametrized() -> None:
+    node_ids = [
+        *(f"test_a.py::test_x[{case}]" for case in range(3)),
+        *(f"test_a.py::TestA::test_y[{case}]" for case in range(3)),
+        "test_a.py::test_z",
+    ]
+    candidates = [
+        FileTestCandidate(
+            Path("test_a.py"),
+            {"test_x[1]", "TestA::test_y[0]", "TestA::test_y[1]", "test_z"},
+        ),
+        FileTestCandidate(Path("test_a.py"), {"TestA::test_y[2]"}),
+    ]
+    # only some cases of test_x are affected, all the ones of test_y
+    assert collapse_parametrized(candidates, node_ids) == [
+        FileTestCandidate(Path("test_a.py"), {"test_x[1]", "TestA::test_y", "test_z"}),
+        FileTestCandidate(Path("test_a.py"), {"TestA::test_y"}),
+    ]
+
+
+def test_collapse_parametrized_selected_test() -> None:
+    """
+    When the test itself is selected (e.g. its file changed), its cases are redundant
+    """
+    node_ids = [f"test_a.py::test_x[{case}]" for case in range(3)]
+    candidates = [
+        FileTestCandidate(Path("test_a.py"), {"test_x[1]"}),
+        FileTestCandidate(Path("test_a.py"), {"test_x"}),
+    ]
+    assert collapse_parametrized(candidates, node_ids) == [
+        FileTestCandidate(Path("test_a.py"), {"test_x"}),
+        FileTestCandidate(Path("test_a.py"), {"test_x"}),
+    ]
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+from skippy_cov.diff_handler import DiffHandler
+from skippy_cov.watcher import Watcher, make_file_diff
+
+
+@pytest.fixture
+def project(workdir: Path, write_coverage: Callable[..., Path]) -> Path:
+    (workdir / "source.py").write_text("def foo():\n    return 1\n")
+    (workdir / "other.py").write_text("def bar():\n    return 1\n")
+    write_coverage({"test_source.py::test_foo|run": {"source.py": [1, 2]}})
+    return workdir
+
+
+@pytest.mark.parametrize(
+    "old,new,expected",
+    [
+        ("a\nb\n", "a\nc\n", Path("foo.py")),
+        (None, "a\n", Path("foo.py")),
+        ("a\n", None, Path("foo.py")),
+    ],
+)
+def test_make_file_diff(old: str | None, new: str | None, expected: Path) -> None:
+    diff = make_file_diff(Path("foo.py"), old, new)
+    assert DiffHandler(diff).changed_files == {expected}
+
+
+def test_poll_only_reports_new_changes(project: Path) -> None:
+    watcher = Watcher(project, Path(".coverage"))
+    assert watcher.poll() == ""
+
+    (project / "source.py").write_text("def foo():\n    return 42\n")
+    diff = watcher.poll()
+    assert DiffHandler(diff).changed_files == {Path("source.py")}
+    assert watcher.select(diff) == {"test_source.py::test_foo"}
+    assert watcher.poll() == ""
+
+
+def test_poll_only_watches_mapped_files(project: Path) -> None:
+    (project / "requirements.txt").write_text("requests==2.31.0\n")
+    watcher = Watcher(project, Path(".coverage"))
+    assert Path("other.py") not in watcher.stamps
+
+    (project / "other.py").write_text("def bar():\n    return 42\n")
+    (project / "requirements.txt").write_text("requests==2.32.0\n")
+    diff = watcher.poll()
+    assert DiffHandler(diff).changed_files == {Path("requirements.txt")}
+
+
+def test_poll_new_test_file(project: Path) -> None:
+    watcher = Watcher(project, Path(".coverage"))
+    (project / "test_new.py").write_text("def test_new():\n    pass\n")
+    assert watcher.select(watcher.poll()) == {"test_new.py::test_new"}
+
+
+def test_poll_diffs_against_committed_version(
+    project: Path, commit: Callable[..., str]
+) -> None:
+    commit("initial", **{"source.py": "def foo():\n    return 1\n"})
+    watcher = Watcher(project, Path(".coverage"))
+    assert watcher.contents == {}
+
+    (project / "source.py").write_text("def foo():\n    return 42\n")
+    diff = watcher.poll()
+    assert "-    return 1" in diff
+    assert "+    return 42" in diff
+    assert watcher.contents == {Path("source.py"): "def foo():\n    return 42\n"}